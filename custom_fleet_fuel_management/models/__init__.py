@@ -3,6 +3,7 @@ from . import (
     fleet_fuel_card,
     fleet_fuel_expense,
     fleet_fuel_expense_batch,
+    fleet_fuel_kpi_daily,
     fleet_fuel_recharge,
     fleet_fuel_summary,
     res_config_settings,
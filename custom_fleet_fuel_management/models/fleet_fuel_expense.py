@@ -5,6 +5,8 @@ import logging
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
 
+from .fleet_fuel_kpi_daily import KPI_EXPENSE_FIELDS
+
 _logger = logging.getLogger(__name__)
 
 
@@ -186,6 +188,10 @@ class FleetFuelExpense(models.Model):
                     vals.get("liter_qty"),
                 )
         records = super().create(vals_list)
+        validated = records.filtered(lambda e: e.state == "validated")
+        if validated:
+            KPIDaily = self.env["fleet.fuel.kpi.daily"]
+            KPIDaily._refresh_keys(KPIDaily._get_expense_keys(validated))
         for record in records.filtered(lambda e: e.state == "draft"):
             if not record.submitted_by_id:
                 record.submitted_by_id = self.env.user
@@ -198,7 +204,15 @@ class FleetFuelExpense(models.Model):
             for expense in self:
                 if expense.state not in ("draft", "submitted"):
                     raise UserError(_("Impossible de modifier la carte ou le véhicule d'une dépense validée."))
+        KPIDaily = self.env["fleet.fuel.kpi.daily"]
+        refresh_kpi = any(field in vals for field in KPI_EXPENSE_FIELDS)
+        if refresh_kpi:
+            # Daily rows the validated expenses are about to leave
+            kpi_keys = KPIDaily._get_expense_keys(self.filtered(lambda e: e.state == "validated"))
         res = super().write(vals)
+        if refresh_kpi:
+            kpi_keys |= KPIDaily._get_expense_keys(self.filtered(lambda e: e.state == "validated"))
+            KPIDaily._refresh_keys(kpi_keys)
         watched = {"card_id", "expense_date", "amount", "liter_qty"}
         if watched.intersection(vals):
             for expense in self:
@@ -247,20 +261,26 @@ class FleetFuelExpense(models.Model):
         return True
 
     def action_validate(self):
-        service = self._balance_service()
+        if any(record.state not in ("draft", "submitted") for record in self):
+            raise UserError(_("Seules les dépenses brouillon ou soumises peuvent être validées."))
+        # One locked, aggregated balance update for all the cards of the recordset
+        self._balance_service().spend_expenses(self)
+        # One write for the recordset: one refresh of the daily KPI table
+        self.write({
+            "state": "validated",
+            "validated_by_id": self.env.user.id,
+            "validated_date": fields.Datetime.now(),
+        })
         action = None
         for record in self:
-            if record.state not in ("draft", "submitted"):
-                raise UserError(_("Seules les dépenses brouillon ou soumises peuvent être validées."))
-            service.spend_amount(record.card_id, record.amount)
-            record.state = "validated"
-            record.validated_by_id = self.env.user
-            record.validated_date = fields.Datetime.now()
             record.message_post(body=_("Dépense validée et déduite du solde."))
             
             # Create Purchase Order and get redirect action
             if record.station_partner_id:
                 action = record.action_create_purchase_order()
+
+        # Keep the open monthly summaries up to date without recomputation
+        self.env["fleet.fuel.monthly.summary"]._apply_expense_deltas(self)
         
         # Return the action to redirect to PO form (for last/single expense)
         if action:
@@ -1,10 +1,27 @@
 # -*- coding: utf-8 -*-
+import base64
+import csv
 import logging
+import threading
+import time
+from io import BytesIO, TextIOWrapper
+
+import psycopg2.errors
 
 from odoo import _, api, fields, models
+from odoo.exceptions import UserError, ValidationError
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
 
 _logger = logging.getLogger(__name__)
 
+REQUIRED_COLUMNS = {"card_uid", "expense_date", "amount", "liter_qty"}
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CHUNKS_PER_RUN = 20
+
 
 class FleetFuelExpenseBatch(models.Model):
     _name = "fleet.fuel.expense.batch"
@@ -13,9 +30,12 @@ class FleetFuelExpenseBatch(models.Model):
 
     name = fields.Char(string="Référence", required=True, default="Lot d'import")
     import_filename = fields.Char(string="Fichier")
+    data_file = fields.Binary(string="Fichier importé", attachment=True)
+    auto_validate = fields.Boolean(string="Valider automatiquement", default=True)
     state = fields.Selection(
         [
             ("draft", "Brouillon"),
+            ("queued", "En file d'attente"),
             ("processing", "En cours"),
             ("done", "Terminé"),
             ("error", "En erreur"),
@@ -29,16 +49,45 @@ class FleetFuelExpenseBatch(models.Model):
     line_count = fields.Integer(string="Nombre de lignes", compute="_compute_counts", store=True)
     error_count = fields.Integer(string="Erreurs", compute="_compute_counts", store=True)
     success_count = fields.Integer(string="Succès", compute="_compute_counts", store=True)
+    skipped_count = fields.Integer(string="Ignorées", compute="_compute_counts", store=True)
     log_message = fields.Text(string="Journal")
     started_at = fields.Datetime(string="Début")
     finished_at = fields.Datetime(string="Fin")
+    # Resumable processing
+    cursor_line = fields.Integer(
+        string="Dernière ligne traitée",
+        copy=False,
+        help="Numéro de la dernière ligne du fichier traitée; le traitement reprend après cette ligne.",
+    )
+    total_rows = fields.Integer(string="Lignes du fichier", copy=False)
+    processed_rows = fields.Integer(string="Lignes traitées", copy=False)
+    processing_time = fields.Float(string="Durée de traitement (s)", copy=False, digits=(12, 2))
+    rows_per_second = fields.Float(string="Débit (lignes/s)", copy=False, digits=(12, 1))
+    progress = fields.Float(string="Progression", compute="_compute_progress")
 
     @api.depends("line_ids.state")
     def _compute_counts(self):
+        counts = {}
+        if self.ids:
+            for group in self.env["fleet.fuel.expense.batch.line"].read_group(
+                [("batch_id", "in", self.ids)], ["batch_id", "state"], ["batch_id", "state"], lazy=False,
+            ):
+                counts[(group["batch_id"][0], group["state"])] = group["__count"]
         for batch in self:
-            batch.line_count = len(batch.line_ids)
-            batch.error_count = len(batch.line_ids.filtered(lambda l: l.state == "error"))
-            batch.success_count = len(batch.line_ids.filtered(lambda l: l.state == "done"))
+            batch.error_count = counts.get((batch.id, "error"), 0)
+            batch.success_count = counts.get((batch.id, "done"), 0)
+            batch.skipped_count = counts.get((batch.id, "skipped"), 0)
+            batch.line_count = batch.error_count + batch.success_count + batch.skipped_count
+
+    @api.depends("processed_rows", "total_rows", "state")
+    def _compute_progress(self):
+        for batch in self:
+            if batch.state == "done":
+                batch.progress = 100.0
+            elif batch.total_rows:
+                batch.progress = min(batch.processed_rows * 100.0 / batch.total_rows, 100.0)
+            else:
+                batch.progress = 0.0
 
     def action_view_expenses(self):
         self.ensure_one()
@@ -63,13 +112,481 @@ class FleetFuelExpenseBatch(models.Model):
         defaults.update(vals)
         return self.env["fleet.fuel.expense.batch.line"].create(defaults)
 
+    def log_lines(self, vals_list):
+        """Create several import lines with a single create, numbered after the existing ones."""
+        self.ensure_one()
+        if not vals_list:
+            return self.env["fleet.fuel.expense.batch.line"]
+        Line = self.env["fleet.fuel.expense.batch.line"]
+        sequence = Line.search_count([("batch_id", "=", self.id)])
+        for vals in vals_list:
+            sequence += 1
+            vals.setdefault("batch_id", self.id)
+            vals.setdefault("sequence", sequence)
+        return Line.create(vals_list)
+
+    def _try_claim(self):
+        """Lock the batch row for the current transaction, without waiting.
+
+        The lock is released by each commit, so the worker claims the batch
+        again after every committed chunk. A batch updated and committed by
+        another worker since the start of this transaction raises a
+        serialization failure (REPEATABLE READ): it is rolled back to a
+        savepoint and treated as already being processed, so the caller can
+        go on with its other batches.
+
+        Returns:
+            bool: False if another transaction is processing (or has just
+                  processed) the batch
+        """
+        self.ensure_one()
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute(
+                    "SELECT id FROM fleet_fuel_expense_batch WHERE id = %s FOR UPDATE SKIP LOCKED",
+                    (self.id,),
+                )
+                return bool(self.env.cr.fetchone())
+        except psycopg2.errors.SerializationFailure:
+            return False
+
     def set_processing(self):
-        self.write({"state": "processing", "started_at": fields.Datetime.now()})
+        for batch in self:
+            batch.write({"state": "processing", "started_at": batch.started_at or fields.Datetime.now()})
 
     def set_finished(self, has_error=False):
         state = "error" if has_error else "done"
         self.write({"state": state, "finished_at": fields.Datetime.now()})
 
+    # -------------------------------------------------------------------------
+    # BACKGROUND PROCESSING
+    # -------------------------------------------------------------------------
+    def action_queue(self):
+        """Queue the batch for the import worker (also resumes a stopped batch)."""
+        for batch in self:
+            if not batch.data_file:
+                raise UserError(_("Aucun fichier à traiter pour le lot %s.") % batch.name)
+            if batch.state == "done":
+                continue
+            if not batch.total_rows:
+                batch.total_rows = batch._count_rows()
+            batch.state = "queued"
+        cron = self.env.ref("custom_fleet_fuel_management.cron_fleet_fuel_import_batches", raise_if_not_found=False)
+        if cron:
+            cron._trigger()
+        return True
+
+    def _count_rows(self):
+        """Count the data rows of the file (also checks the required columns)."""
+        self.ensure_one()
+        return sum(1 for _row in self._iter_rows())
+
+    @api.model
+    def cron_process_import_batches(self):
+        """Cron worker processing queued (or interrupted) import batches.
+
+        Each run processes at most fleet_fuel.import_chunks_per_run chunks per
+        batch and re-triggers itself while work remains.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        max_chunks = max(int(ICP.get_param("fleet_fuel.import_chunks_per_run", DEFAULT_CHUNKS_PER_RUN)), 1)
+        batches = self.search([("state", "in", ("queued", "processing"))], order="create_date asc")
+        remaining = False
+        for batch in batches:
+            if not batch._try_claim():
+                _logger.info("Fuel import batch %s is already being processed, skipped", batch.name)
+                continue
+            try:
+                finished = batch._process_import(max_chunks=max_chunks)
+            except Exception as exc:  # pylint: disable=broad-except
+                _logger.exception("Fuel import batch %s failed at line %s", batch.name, batch.cursor_line)
+                self.env.cr.rollback()
+                if not batch._try_claim():
+                    continue
+                batch.write({
+                    "state": "error",
+                    "log_message": _("Traitement interrompu après la ligne %(line)s : %(msg)s") % {
+                        "line": batch.cursor_line, "msg": str(exc),
+                    },
+                })
+                batch._commit_chunk()
+                continue
+            remaining = remaining or not finished
+        if remaining:
+            self.env.ref("custom_fleet_fuel_management.cron_fleet_fuel_import_batches")._trigger()
+
+    def _process_import(self, max_chunks=None):
+        """Process the batch file from its cursor, chunk by chunk.
+
+        The cursor, counters and throughput are saved and committed after
+        each chunk so that an interrupted batch resumes where it stopped.
+
+        Args:
+            max_chunks: Stop after this many chunks (None = until the end)
+
+        Returns:
+            bool: True if the whole file has been processed, False if stopped
+                early or if another worker holds the batch
+        """
+        self.ensure_one()
+        if not self._try_claim():
+            _logger.info("Fuel import batch %s is already being processed", self.name)
+            return False
+        if self.state != "processing":
+            self.set_processing()
+        seen_hashes = set()
+        chunk_size = self._get_chunk_size()
+        rows = (
+            (line_number, row) for line_number, row in self._iter_rows()
+            if line_number > self.cursor_line
+        )
+        for chunk_index, chunk in enumerate(self._iter_chunks(rows, chunk_size)):
+            if max_chunks is not None and chunk_index >= max_chunks:
+                return False
+            started = time.monotonic()
+            lookups = self._prepare_chunk_lookups([row for _line, row in chunk])
+            self._import_chunk(chunk, lookups, seen_hashes)
+            processing_time = self.processing_time + time.monotonic() - started
+            processed_rows = self.processed_rows + len(chunk)
+            self.write({
+                "cursor_line": chunk[-1][0],
+                "processed_rows": processed_rows,
+                "processing_time": processing_time,
+                "rows_per_second": processed_rows / processing_time if processing_time else 0.0,
+            })
+            self._commit_chunk()
+            _logger.info(
+                "Fuel import %s: %d/%d rows processed (%.1f rows/s)",
+                self.name, processed_rows, self.total_rows, self.rows_per_second,
+            )
+            if not self._try_claim():
+                return False
+        self.set_finished(has_error=bool(self.error_count))
+        self._commit_chunk()
+        return True
+
+    # -------------------------------------------------------------------------
+    # STREAMING PIPELINE
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_chunk_size(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        return max(int(ICP.get_param("fleet_fuel.import_chunk_size", DEFAULT_CHUNK_SIZE)), 1)
+
+    @staticmethod
+    def _iter_chunks(rows, chunk_size):
+        """Group an iterable of rows into lists of at most chunk_size rows."""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _commit_chunk(self):
+        """Commit the processed chunk so progress survives a later failure."""
+        if getattr(threading.current_thread(), "testing", False):
+            return
+        self.env.cr.commit()
+
+    def _prepare_chunk_lookups(self, rows):
+        """Resolve cards, stations and existing import hashes of a chunk.
+
+        One query per kind of lookup instead of one search per row.
+
+        Returns:
+            dict: {"cards": {card_uid: card}, "stations": {name: partner},
+                   "hashes": {import_hash: expense_id}}
+        """
+        company = self.company_id
+        card_uids = {(row.get("card_uid") or "").strip() for row in rows} - {""}
+        station_names = {
+            (row.get("station") or row.get("station_name") or "").strip() for row in rows
+        } - {""}
+
+        cards = {}
+        if card_uids:
+            for card in self.env["fleet.fuel.card"].search(
+                [("card_uid", "in", list(card_uids)), ("company_id", "=", company.id)]
+            ):
+                cards.setdefault(card.card_uid, card)
+
+        stations = {}
+        if station_names:
+            for partner in self.env["res.partner"].search(
+                [("name", "in", list(station_names)), ("company_id", "in", [company.id, False]), ("supplier_rank", ">", 0)]
+            ):
+                stations.setdefault(partner.name, partner)
+
+        expense_model = self.env["fleet.fuel.expense"].with_company(company)
+        candidate_hashes = set()
+        for row in rows:
+            card = cards.get((row.get("card_uid") or "").strip())
+            if not card:
+                continue
+            try:
+                candidate_hashes.add(expense_model._make_import_hash(
+                    card.id,
+                    fields.Date.to_date(row.get("expense_date")),
+                    self._to_float(row.get("amount")),
+                    self._to_float(row.get("liter_qty")),
+                ))
+            except Exception:  # pylint: disable=broad-except
+                continue  # reported by _prepare_expense_vals
+        candidate_hashes.discard(False)
+        hashes = {}
+        if candidate_hashes:
+            for record in expense_model.sudo().search_read(
+                [("import_hash", "in", list(candidate_hashes)), ("company_id", "=", company.id)],
+                ["import_hash"],
+            ):
+                hashes[record["import_hash"]] = record["id"]
+        return {"cards": cards, "stations": stations, "hashes": hashes}
+
+    def _import_chunk(self, chunk, lookups, seen_hashes):
+        """Import a chunk of (line_number, row) with batched creates.
+
+        Expenses are created with one create(vals_list); if it fails, the
+        chunk is retried row by row under savepoints to isolate the faulty
+        lines. Batch lines are logged with one create as well.
+
+        Returns:
+            dict: {"created": int, "skipped": int, "errors": int}
+        """
+        counters = {"created": 0, "skipped": 0, "errors": 0}
+        log_vals = []
+        to_create = []
+        for line_number, row in chunk:
+            try:
+                vals = self._prepare_expense_vals(row, line_number=line_number, lookups=lookups)
+            except Exception as exc:  # pylint: disable=broad-except
+                _logger.warning("Import error on line %d: %s", line_number, exc)
+                log_vals.append((line_number, self._error_log_vals(line_number, exc)))
+                counters["errors"] += 1
+                continue
+            if not vals:
+                log_vals.append((line_number, {
+                    "state": "skipped",
+                    "message": _("Ligne %s ignorée : données insuffisantes") % line_number,
+                }))
+                counters["skipped"] += 1
+                continue
+            import_hash = vals.get("import_hash")
+            if import_hash and (import_hash in lookups["hashes"] or import_hash in seen_hashes):
+                log_vals.append((line_number, {
+                    "state": "skipped",
+                    "import_hash": import_hash,
+                    "expense_id": lookups["hashes"].get(import_hash, False),
+                    "message": _("Ligne %s ignorée : dépense déjà importée") % line_number,
+                }))
+                counters["skipped"] += 1
+                continue
+            if import_hash:
+                seen_hashes.add(import_hash)
+            to_create.append((line_number, vals))
+
+        results = self._create_expenses(to_create)
+        if self.auto_validate:
+            results = self._validate_expenses(results)
+        for line_number, expense, exc in results:
+            if exc:
+                _logger.warning("Import error on line %d: %s", line_number, exc)
+                log_vals.append((line_number, self._error_log_vals(line_number, exc, expense)))
+                counters["errors"] += 1
+            else:
+                log_vals.append((line_number, {
+                    "state": "done",
+                    "expense_id": expense.id,
+                    "import_hash": expense.import_hash,
+                    "message": _("Ligne %s importée avec succès") % line_number,
+                }))
+                counters["created"] += 1
+        log_vals.sort(key=lambda item: item[0])
+        self.log_lines([vals for _line, vals in log_vals])
+        return counters
+
+    def _create_expenses(self, to_create):
+        """Create the expenses of a chunk.
+
+        Args:
+            to_create: list of (line_number, vals)
+
+        Returns:
+            list: (line_number, expense or False, exception or None)
+        """
+        if not to_create:
+            return []
+        expense_model = self.env["fleet.fuel.expense"].sudo()
+        try:
+            with self.env.cr.savepoint():
+                expenses = expense_model.create([vals for _line, vals in to_create])
+            return [(line_number, expense, None) for (line_number, _vals), expense in zip(to_create, expenses)]
+        except Exception:  # pylint: disable=broad-except
+            _logger.info("Chunk create failed, retrying %d lines one by one", len(to_create))
+        results = []
+        for line_number, vals in to_create:
+            try:
+                with self.env.cr.savepoint():
+                    results.append((line_number, expense_model.create(vals), None))
+            except Exception as exc:  # pylint: disable=broad-except
+                results.append((line_number, False, exc))
+        return results
+
+    def _validate_expenses(self, results):
+        """Validate the created expenses of a chunk, isolating failures.
+
+        Returns:
+            list: (line_number, expense or False, exception or None)
+        """
+        expenses = self.env["fleet.fuel.expense"].sudo().browse(
+            [expense.id for _line, expense, exc in results if not exc]
+        )
+        if not expenses:
+            return results
+        try:
+            with self.env.cr.savepoint():
+                expenses.action_validate()
+            return results
+        except Exception:  # pylint: disable=broad-except
+            _logger.info("Chunk validation failed, retrying %d expenses one by one", len(expenses))
+        validated = []
+        for line_number, expense, exc in results:
+            if not exc:
+                try:
+                    with self.env.cr.savepoint():
+                        expense.action_validate()
+                except Exception as validation_exc:  # pylint: disable=broad-except
+                    exc = validation_exc
+            validated.append((line_number, expense, exc))
+        return validated
+
+    def _error_log_vals(self, line_number, exc, expense=False):
+        return {
+            "state": "error",
+            "expense_id": expense.id if expense else False,
+            "message": _("Ligne %(line)s : %(msg)s") % {"line": line_number, "msg": str(exc)},
+        }
+
+    def _iter_rows(self):
+        """Yield (line_number, row_dict) from the uploaded file, lazily.
+
+        Line numbers match the spreadsheet (header is line 1).
+        """
+        raw = base64.b64decode(self.data_file)
+        extension = (self.import_filename or "csv").split(".")[-1].lower()
+        if extension in {"xls", "xlsx", "xlsm"}:
+            if not openpyxl:
+                raise UserError(_("Le module openpyxl n'est pas installé. Veuillez utiliser un fichier CSV."))
+            workbook = openpyxl.load_workbook(BytesIO(raw), read_only=True, data_only=True)
+            rows = workbook.active.iter_rows(values_only=True)
+            header_row = next(rows, None)
+            if header_row is None:
+                raise ValidationError(_("Le fichier Excel est vide."))
+            headers = [str(cell or "").strip().lower() for cell in header_row]
+            missing = REQUIRED_COLUMNS - set(headers)
+            if missing:
+                raise ValidationError(_("Colonnes obligatoires manquantes : %s") % ", ".join(sorted(missing)))
+            for line_number, row in enumerate(rows, start=2):
+                row_dict = {}
+                for idx, header in enumerate(headers):
+                    value = row[idx] if idx < len(row) else None
+                    if value is not None:
+                        row_dict[header] = str(value) if not isinstance(value, str) else value
+                    else:
+                        row_dict[header] = ""
+                yield line_number, row_dict
+            workbook.close()
+        else:
+            reader = csv.DictReader(TextIOWrapper(BytesIO(raw), encoding="utf-8-sig"))
+            missing = REQUIRED_COLUMNS - set(reader.fieldnames or [])
+            if missing:
+                raise ValidationError(_("Colonnes obligatoires manquantes : %s") % ", ".join(sorted(missing)))
+            yield from enumerate(reader, start=2)
+
+    def _prepare_expense_vals(self, row, line_number=0, lookups=None):
+        """Build the expense values of a row.
+
+        lookups (see _prepare_chunk_lookups) avoids the per-row card and
+        station searches when given.
+        """
+        card_uid = (row.get("card_uid") or "").strip()
+        if not card_uid:
+            raise ValidationError(_("Carte manquante"))
+        if lookups is not None:
+            card = lookups["cards"].get(card_uid)
+        else:
+            card = self.env["fleet.fuel.card"].search(
+                [("card_uid", "=", card_uid), ("company_id", "=", self.company_id.id)], limit=1
+            )
+        if not card:
+            raise ValidationError(_("Carte %s introuvable") % card_uid)
+        expense_date = row.get("expense_date")
+        try:
+            expense_date = fields.Date.to_date(expense_date)
+        except Exception as exc:  # pylint: disable=broad-except
+            raise ValidationError(_("Date invalide pour %s") % expense_date) from exc
+        amount = self._to_float(row.get("amount"))
+        liter_qty = self._to_float(row.get("liter_qty"))
+        if not amount:
+            raise ValidationError(_("Montant invalide pour la carte %s") % card_uid)
+        expense_model = self.env["fleet.fuel.expense"].with_company(self.company_id)
+        import_hash = expense_model._make_import_hash(card.id, expense_date, amount, liter_qty)
+        station_name = (row.get("station") or row.get("station_name") or "").strip()
+        station_partner = False
+        if station_name and lookups is not None:
+            station_partner = lookups["stations"].get(station_name, False)
+        elif station_name:
+            station_partner = self.env["res.partner"].search(
+                [("name", "=", station_name), ("company_id", "in", [self.company_id.id, False]), ("supplier_rank", ">", 0)],
+                limit=1,
+            )
+        vals = {
+            "card_id": card.id,
+            "vehicle_id": card.vehicle_id.id,
+            "driver_id": card.driver_id.id,
+            "expense_date": expense_date,
+            "amount": amount,
+            "liter_qty": liter_qty,
+            "company_id": self.company_id.id,
+            "currency_id": card.currency_id.id,
+            "station_partner_id": station_partner.id if station_partner else False,
+            "notes": row.get("notes") or row.get("comment"),
+            "batch_id": self.id,
+            "import_hash": import_hash,
+        }
+        odometer = row.get("odometer")
+        if odometer:
+            vals["odometer"] = self._to_float(odometer)
+        receipt_payload = self._extract_receipt_payload(row, line_number, card_uid, expense_date)
+        vals.update(receipt_payload)
+        return vals
+
+    @staticmethod
+    def _to_float(value):
+        if isinstance(value, (int, float)):
+            return float(value)
+        value = (value or "").strip()
+        if not value:
+            return 0.0
+        normalized = value.replace(" ", "").replace(",", ".")
+        return float(normalized)
+
+    def _extract_receipt_payload(self, row, line_number, card_uid, expense_date):
+        """Extract receipt attachment from row data. Returns empty dict if no receipt provided."""
+        attachment_b64 = row.get("receipt_b64") or row.get("receipt_data")
+        if not attachment_b64:
+            # Receipt is optional - return empty dict, user can add later
+            return {}
+        if attachment_b64.startswith("data:"):
+            attachment_b64 = attachment_b64.split(",", 1)[-1]
+        filename = row.get("receipt_filename")
+        return {
+            "receipt_attachment": attachment_b64,
+            "receipt_filename": filename or f"justificatif_{card_uid}_{expense_date}.bin",
+        }
+
 
 class FleetFuelExpenseBatchLine(models.Model):
     _name = "fleet.fuel.expense.batch.line"
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Expense fields feeding the daily KPI table.
+KPI_EXPENSE_FIELDS = ["company_id", "vehicle_id", "card_id", "expense_date", "amount",
+                      "liter_qty", "odometer", "state"]
+
+# Sequence bumped by each refresh, used as generation of the analytics cache.
+GENERATION_SEQUENCE = "fleet_fuel_kpi_daily_generation_seq"
+
+
+class FleetFuelKPIDaily(models.Model):
+    """Validated fuel expenses aggregated per company/vehicle/card/day.
+
+    The table is maintained by _refresh_keys (expense validation and edition
+    of validated expenses) and caught up by cron_refresh_kpi_daily. Fuel
+    dashboards, monthly summaries and vehicle KPIs read it instead of
+    scanning fleet.fuel.expense. Every refresh bumps the generation keying
+    the fuel analytics ormcache (fleet.fuel.kpi.service), on all workers.
+    """
+
+    _name = "fleet.fuel.kpi.daily"
+    _description = "KPI carburant journaliers"
+    _order = "day desc, vehicle_id, card_id"
+    _rec_name = "day"
+
+    company_id = fields.Many2one("res.company", string="Société", required=True, readonly=True, index=True)
+    vehicle_id = fields.Many2one("fleet.vehicle", string="Véhicule", required=True, readonly=True, index=True)
+    card_id = fields.Many2one("fleet.fuel.card", string="Carte carburant", required=True, readonly=True)
+    day = fields.Date(string="Jour", required=True, readonly=True, index=True)
+    currency_id = fields.Many2one(related="company_id.currency_id", string="Devise")
+    total_amount = fields.Monetary(string="Montant total", readonly=True, currency_field="currency_id")
+    total_liter = fields.Float(string="Litres totaux", readonly=True)
+    expense_count = fields.Integer(string="Nombre de dépenses", readonly=True)
+    odometer_min = fields.Float(string="Odomètre min", readonly=True, aggregator="min")
+    odometer_max = fields.Float(string="Odomètre max", readonly=True, aggregator="max")
+
+    _sql_constraints = [
+        (
+            "fleet_fuel_kpi_daily_unique",
+            "unique(company_id, vehicle_id, card_id, day)",
+            "Une ligne KPI existe déjà pour ce véhicule/carte sur ce jour.",
+        ),
+    ]
+
+    def init(self):
+        """Fill the table on install/upgrade when it is still empty."""
+        super().init()
+        self.env.cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {GENERATION_SEQUENCE}")
+        self.env.cr.execute("SELECT 1 FROM fleet_fuel_kpi_daily LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._refresh_all()
+
+    # -------------------------------------------------------------------------
+    # REFRESH
+    # -------------------------------------------------------------------------
+    def _insert_aggregates(self, join_clause="", where_clause="", params=None):
+        self.env.cr.execute(f"""
+            INSERT INTO fleet_fuel_kpi_daily (
+                company_id, vehicle_id, card_id, day,
+                total_amount, total_liter, expense_count, odometer_min, odometer_max,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT e.company_id, e.vehicle_id, e.card_id, e.expense_date,
+                   SUM(e.amount), SUM(COALESCE(e.liter_qty, 0)), COUNT(*),
+                   MIN(e.odometer) FILTER (WHERE e.odometer > 0),
+                   MAX(e.odometer) FILTER (WHERE e.odometer > 0),
+                   %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+              FROM fleet_fuel_expense e
+              {join_clause}
+             WHERE e.state = 'validated' {where_clause}
+             GROUP BY e.company_id, e.vehicle_id, e.card_id, e.expense_date
+        """, [self.env.uid, self.env.uid] + list(params or []))
+
+    @api.model
+    def _refresh_all(self, company_ids=None):
+        """Rebuild the table (or the rows of some companies) from scratch."""
+        if company_ids:
+            self.env.cr.execute("DELETE FROM fleet_fuel_kpi_daily WHERE company_id IN %s", [tuple(company_ids)])
+            self._insert_aggregates(where_clause="AND e.company_id IN %s", params=[tuple(company_ids)])
+        else:
+            self.env.cr.execute("DELETE FROM fleet_fuel_kpi_daily")
+            self._insert_aggregates()
+        self.env.invalidate_all()
+        self._bump_generation()
+        _logger.info("Fuel KPI daily table rebuilt (companies: %s)", company_ids or "all")
+
+    @api.model
+    def _refresh_keys(self, keys):
+        """Recompute the rows of the given (company, vehicle, card, day) keys.
+
+        One DELETE and one grouped INSERT ... SELECT for all the keys, so
+        validating a whole batch of expenses costs two statements.
+
+        Args:
+            keys: iterable of (company_id, vehicle_id, card_id, day) tuples
+        """
+        keys = sorted({key for key in keys if all(key)})
+        if not keys:
+            return
+        self.env["fleet.fuel.expense"].flush_model(KPI_EXPENSE_FIELDS)
+        params = [value for key in keys for value in key]
+        values = ", ".join(["(%s::int, %s::int, %s::int, %s::date)"] * len(keys))
+        self.env.cr.execute(f"""
+            DELETE FROM fleet_fuel_kpi_daily d
+             USING (VALUES {values}) AS k(company_id, vehicle_id, card_id, day)
+             WHERE d.company_id = k.company_id AND d.vehicle_id = k.vehicle_id
+               AND d.card_id = k.card_id AND d.day = k.day
+        """, params)
+        self._insert_aggregates(
+            join_clause=f"""
+              JOIN (VALUES {values}) AS k(company_id, vehicle_id, card_id, day)
+                ON e.company_id = k.company_id AND e.vehicle_id = k.vehicle_id
+               AND e.card_id = k.card_id AND e.expense_date = k.day
+            """,
+            params=params,
+        )
+        self.invalidate_model()
+        self._bump_generation()
+        _logger.debug("Refreshed %d fuel KPI daily keys", len(keys))
+
+    @api.model
+    def _get_generation(self):
+        """Current generation of the table (one read of the sequence)."""
+        self.env.cr.execute(f"SELECT last_value FROM {GENERATION_SEQUENCE}")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _bump_generation(self):
+        """Move the analytics cache to a new generation.
+
+        A sequence is not transactional: the generation is bumped right away,
+        so that this transaction reads its own changes, and once more after
+        the commit, so that an entry cached by another worker before the
+        commit is never read again.
+        """
+        cr = self.env.cr
+        cr.execute(f"SELECT nextval('{GENERATION_SEQUENCE}')")
+        if not cr.postcommit.data.get(GENERATION_SEQUENCE):
+            cr.postcommit.data[GENERATION_SEQUENCE] = True
+            cr.postcommit.add(lambda: cr.execute(f"SELECT nextval('{GENERATION_SEQUENCE}')"))
+
+    @api.model
+    def _get_expense_keys(self, expenses):
+        return {
+            (expense.company_id.id, expense.vehicle_id.id, expense.card_id.id, expense.expense_date)
+            for expense in expenses
+        }
+
+    @api.model
+    def cron_refresh_kpi_daily(self):
+        """Catch up on the validated expenses changed since the last run.
+
+        Covers writes that bypass the ORM hooks (SQL imports, scripts). The
+        first run rebuilds the whole table.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        last_refresh = ICP.get_param("fleet_fuel.kpi_daily_refreshed_at")
+        now = fields.Datetime.to_string(self.env.cr.now())
+        if not last_refresh:
+            self._refresh_all()
+        else:
+            self.env["fleet.fuel.expense"].flush_model(KPI_EXPENSE_FIELDS + ["write_date"])
+            self.env.cr.execute("""
+                SELECT DISTINCT company_id, vehicle_id, card_id, expense_date
+                  FROM fleet_fuel_expense
+                 WHERE state = 'validated' AND write_date >= %s
+            """, [last_refresh])
+            self._refresh_keys(self.env.cr.fetchall())
+        ICP.set_param("fleet_fuel.kpi_daily_refreshed_at", now)
+        return True
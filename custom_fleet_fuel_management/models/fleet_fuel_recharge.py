@@ -62,12 +62,11 @@ class FleetFuelRecharge(models.Model):
         return super().create(vals_list)
 
     def action_submit(self):
-        for record in self:
-            if record.state != "draft":
-                continue
+        to_submit = self.filtered(lambda r: r.state == "draft")
+        for record in to_submit:
             record.state = "submitted"
             record.message_post(body=_("Recharge soumise"))
-            self._balance_service().reserve_amount(record.card_id, record.amount)
+        self._balance_service().reserve_recharges(to_submit)
         return True
 
     def action_approve(self):
@@ -81,24 +80,24 @@ class FleetFuelRecharge(models.Model):
         return True
 
     def action_post(self):
+        if any(record.state not in ("approved",) for record in self):
+            raise UserError(_("La recharge doit être approuvée avant publication."))
+        self._balance_service().post_recharges(self)
         for record in self:
-            if record.state not in ("approved",):
-                raise UserError(_("La recharge doit être approuvée avant publication."))
             record.state = "posted"
             record.posting_date = fields.Datetime.now()
             record.posted_by_id = self.env.user
-            service = self._balance_service()
-            service.release_amount(record.card_id, record.amount)
-            service.apply_delta(record.card_id, record.amount)
             record.message_post(body=_("Recharge comptabilisée"))
+        self.env["fleet.fuel.monthly.summary"]._apply_recharge_deltas(self)
         return True
 
     def action_cancel(self):
+        if any(record.state == "posted" for record in self):
+            raise UserError(_("Impossible d'annuler une recharge comptabilisée."))
+        self._balance_service().release_recharges(
+            self.filtered(lambda r: r.state in ("submitted", "approved"))
+        )
         for record in self:
-            if record.state == "posted":
-                raise UserError(_("Impossible d'annuler une recharge comptabilisée."))
-            if record.state in ("submitted", "approved"):
-                self._balance_service().release_amount(record.card_id, record.amount)
             record.state = "cancelled"
             record.message_post(body=_("Recharge annulée"))
         return True
\ No newline at end of file
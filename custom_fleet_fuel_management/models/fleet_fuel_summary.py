@@ -1,11 +1,23 @@
 # -*- coding: utf-8 -*-
 import logging
+from collections import defaultdict
 
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
+from odoo.tools import float_compare
 
 _logger = logging.getLogger(__name__)
 
+# Stored totals maintained by _compute_consumption_totals and by the
+# incremental deltas pushed on expense validation / recharge posting.
+CONSUMPTION_TOTAL_FIELDS = [
+    "total_amount",
+    "total_liter",
+    "expense_count",
+    "total_recharge_amount",
+    "recharge_count",
+]
+
 
 class FleetFuelMonthlySummary(models.Model):
     """Monthly fuel consumption summary per vehicle/card.
@@ -207,6 +219,19 @@ class FleetFuelMonthlySummary(models.Model):
         tracking=True,
         help="OK: écart < seuil; Warning: écart entre seuil et 2x seuil; Critical: > 2x seuil",
     )
+    alert_notified_level = fields.Selection(
+        [
+            ("warning", "Attention"),
+            ("critical", "Critique"),
+        ],
+        string="Dernière alerte envoyée",
+        compute="_compute_alert_notified_level",
+        store=True,
+        readonly=False,
+        copy=False,
+        help="Niveau d'alerte déjà notifié : une synthèse n'est renotifiée que si son niveau change. "
+             "Remis à zéro quand la synthèse revient à OK.",
+    )
 
     # -------------------------------------------------------------------------
     # STATUS
@@ -269,92 +294,180 @@ class FleetFuelMonthlySummary(models.Model):
     # -------------------------------------------------------------------------
     # COMPUTED FIELDS
     # -------------------------------------------------------------------------
+    def _group_by_period(self):
+        """Split the recordset by (company, period).
+
+        Returns:
+            dict: {(company_id, period_start, period_end): summaries}
+                  Summaries missing one of these keys are left out.
+        """
+        groups = defaultdict(list)
+        for summary in self:
+            if summary.period_start and summary.period_end and summary.company_id:
+                key = (summary.company_id.id, summary.period_start, summary.period_end)
+                groups[key].append(summary.id)
+        return {key: self.browse(ids) for key, ids in groups.items()}
+
+    def _get_period_domains(self):
+        """Expense and recharge domains covering every summary of the recordset.
+
+        The recordset must share the same company and period (see
+        _group_by_period). Vehicle/card filters are only added when every
+        summary has one, since a summary without vehicle (or card) covers
+        all of them.
+
+        Returns:
+            tuple: (expense_domain, recharge_domain)
+        """
+        summary = self[:1]
+        expense_domain = [
+            ("expense_date", ">=", summary.period_start),
+            ("expense_date", "<=", summary.period_end),
+            ("state", "=", "validated"),
+            ("company_id", "=", summary.company_id.id),
+        ]
+        recharge_domain = [
+            ("recharge_date", ">=", summary.period_start),
+            ("recharge_date", "<=", summary.period_end),
+            ("state", "=", "posted"),
+            ("company_id", "=", summary.company_id.id),
+        ]
+        if all(summary.vehicle_id for summary in self):
+            expense_domain.append(("vehicle_id", "in", self.vehicle_id.ids))
+        if all(summary.card_id for summary in self):
+            expense_domain.append(("card_id", "in", self.card_id.ids))
+            recharge_domain.append(("card_id", "in", self.card_id.ids))
+        return expense_domain, recharge_domain
+
+    def _get_kpi_daily_domain(self):
+        """Domain on fleet.fuel.kpi.daily covering the recordset.
+
+        Same scope as the expense domain of _get_period_domains.
+        """
+        summary = self[:1]
+        domain = [
+            ("day", ">=", summary.period_start),
+            ("day", "<=", summary.period_end),
+            ("company_id", "=", summary.company_id.id),
+        ]
+        if all(summary.vehicle_id for summary in self):
+            domain.append(("vehicle_id", "in", self.vehicle_id.ids))
+        if all(summary.card_id for summary in self):
+            domain.append(("card_id", "in", self.card_id.ids))
+        return domain
+
+    def _match_vehicle_card(self, vehicle_id, card_id):
+        """Whether an expense of (vehicle_id, card_id) belongs to this summary."""
+        self.ensure_one()
+        return (
+            (not self.vehicle_id or self.vehicle_id.id == vehicle_id)
+            and (not self.card_id or self.card_id.id == card_id)
+        )
+
     def _compute_linked_records(self):
-        """Compute linked expenses and recharges for the period."""
+        """Compute linked expenses and recharges for the period.
+
+        One expense search and one recharge search per (company, period),
+        whatever the number of summaries in the batch.
+        """
+        self.expense_ids = False
+        self.recharge_ids = False
         Expense = self.env["fleet.fuel.expense"]
         Recharge = self.env["fleet.fuel.recharge"]
-        for summary in self:
-            domain = [
-                ("expense_date", ">=", summary.period_start),
-                ("expense_date", "<=", summary.period_end),
-                ("state", "=", "validated"),
-                ("company_id", "=", summary.company_id.id),
-            ]
-            if summary.vehicle_id:
-                domain.append(("vehicle_id", "=", summary.vehicle_id.id))
-            if summary.card_id:
-                domain.append(("card_id", "=", summary.card_id.id))
-            summary.expense_ids = Expense.search(domain)
-
-            recharge_domain = [
-                ("recharge_date", ">=", summary.period_start),
-                ("recharge_date", "<=", summary.period_end),
-                ("state", "=", "posted"),
-                ("company_id", "=", summary.company_id.id),
-            ]
-            if summary.card_id:
-                recharge_domain.append(("card_id", "=", summary.card_id.id))
-            summary.recharge_ids = Recharge.search(recharge_domain)
+        for summaries in self._group_by_period().values():
+            expense_domain, recharge_domain = summaries._get_period_domains()
+            expense_ids = defaultdict(list)
+            for expense in Expense.search(expense_domain):
+                expense_ids[(expense.vehicle_id.id, expense.card_id.id)].append(expense.id)
+            recharge_ids = defaultdict(list)
+            for recharge in Recharge.search(recharge_domain):
+                recharge_ids[recharge.card_id.id].append(recharge.id)
+
+            for summary in summaries:
+                summary.expense_ids = Expense.browse([
+                    expense_id
+                    for (vehicle_id, card_id), ids in expense_ids.items()
+                    if summary._match_vehicle_card(vehicle_id, card_id)
+                    for expense_id in ids
+                ])
+                summary.recharge_ids = Recharge.browse([
+                    recharge_id
+                    for card_id, ids in recharge_ids.items()
+                    if not summary.card_id or summary.card_id.id == card_id
+                    for recharge_id in ids
+                ])
+
+    def _get_consumption_totals(self):
+        """Compute expense and recharge totals for the whole recordset.
+
+        Summaries are grouped by (company, period) and each group is answered
+        with one grouped query on fleet.fuel.kpi.daily (by vehicle/card) and
+        one on the recharges (by card).
+
+        Returns:
+            dict: {summary_id: {field_name: value}} for the fields of
+                  CONSUMPTION_TOTAL_FIELDS
+        """
+        # Already scoped by company, the table is not readable by every user
+        KPIDaily = self.env["fleet.fuel.kpi.daily"].sudo()
+        Recharge = self.env["fleet.fuel.recharge"]
+        result = {summary.id: dict.fromkeys(CONSUMPTION_TOTAL_FIELDS, 0) for summary in self}
+        for summaries in self._group_by_period().values():
+            _expense_domain, recharge_domain = summaries._get_period_domains()
+            expense_groups = {
+                (
+                    group["vehicle_id"][0] if group["vehicle_id"] else False,
+                    group["card_id"][0] if group["card_id"] else False,
+                ): (group["total_amount"] or 0.0, group["total_liter"] or 0.0, group["expense_count"] or 0)
+                for group in KPIDaily.read_group(
+                    summaries._get_kpi_daily_domain(),
+                    ["total_amount:sum", "total_liter:sum", "expense_count:sum"],
+                    ["vehicle_id", "card_id"],
+                    lazy=False,
+                )
+            }
+            recharge_groups = {
+                group["card_id"][0]: (group["amount"] or 0.0, group["__count"])
+                for group in Recharge.read_group(
+                    recharge_domain,
+                    ["amount:sum"],
+                    ["card_id"],
+                    lazy=False,
+                )
+                if group["card_id"]
+            }
+
+            for summary in summaries:
+                if summary.vehicle_id and summary.card_id:
+                    key = (summary.vehicle_id.id, summary.card_id.id)
+                    matching = [expense_groups[key]] if key in expense_groups else []
+                else:
+                    matching = [
+                        totals for (vehicle_id, card_id), totals in expense_groups.items()
+                        if summary._match_vehicle_card(vehicle_id, card_id)
+                    ]
+                if summary.card_id:
+                    recharges = [recharge_groups.get(summary.card_id.id, (0.0, 0))]
+                else:
+                    recharges = list(recharge_groups.values())
+                result[summary.id] = {
+                    "total_amount": sum(totals[0] for totals in matching),
+                    "total_liter": sum(totals[1] for totals in matching),
+                    "expense_count": sum(totals[2] for totals in matching),
+                    "total_recharge_amount": sum(totals[0] for totals in recharges),
+                    "recharge_count": sum(totals[1] for totals in recharges),
+                }
+        return result
 
     @api.depends("period_start", "period_end", "vehicle_id", "card_id", "company_id")
     def _compute_consumption_totals(self):
-        """Calculate expense and recharge totals from linked records."""
-        Expense = self.env["fleet.fuel.expense"]
-        Recharge = self.env["fleet.fuel.recharge"]
-        for summary in self:
-            if not (summary.period_start and summary.period_end and summary.company_id):
-                summary.total_amount = 0.0
-                summary.total_liter = 0.0
-                summary.expense_count = 0
-                summary.total_recharge_amount = 0.0
-                summary.recharge_count = 0
-                continue
+        """Calculate expense and recharge totals from linked records.
 
-            # Build expense domain
-            expense_domain = [
-                ("expense_date", ">=", summary.period_start),
-                ("expense_date", "<=", summary.period_end),
-                ("state", "=", "validated"),
-                ("company_id", "=", summary.company_id.id),
-            ]
-            if summary.vehicle_id:
-                expense_domain.append(("vehicle_id", "=", summary.vehicle_id.id))
-            if summary.card_id:
-                expense_domain.append(("card_id", "=", summary.card_id.id))
-
-            expense_data = Expense.read_group(
-                expense_domain,
-                ["amount:sum", "liter_qty:sum"],
-                [],
-            )
-            if expense_data:
-                summary.total_amount = expense_data[0].get("amount", 0.0) or 0.0
-                summary.total_liter = expense_data[0].get("liter_qty", 0.0) or 0.0
-            else:
-                summary.total_amount = 0.0
-                summary.total_liter = 0.0
-            summary.expense_count = Expense.search_count(expense_domain)
-
-            # Build recharge domain
-            recharge_domain = [
-                ("recharge_date", ">=", summary.period_start),
-                ("recharge_date", "<=", summary.period_end),
-                ("state", "=", "posted"),
-                ("company_id", "=", summary.company_id.id),
-            ]
-            if summary.card_id:
-                recharge_domain.append(("card_id", "=", summary.card_id.id))
-
-            recharge_data = Recharge.read_group(
-                recharge_domain,
-                ["amount:sum"],
-                [],
-            )
-            if recharge_data:
-                summary.total_recharge_amount = recharge_data[0].get("amount", 0.0) or 0.0
-            else:
-                summary.total_recharge_amount = 0.0
-            summary.recharge_count = Recharge.search_count(recharge_domain)
+        Batch compute, see _get_consumption_totals.
+        """
+        totals = self._get_consumption_totals()
+        for summary in self:
+            summary.update(totals[summary.id])
 
     @api.depends("odometer_start", "odometer_end", "total_liter")
     def _compute_distance_kpi(self):
@@ -411,6 +524,15 @@ class FleetFuelMonthlySummary(models.Model):
             else:
                 summary.alert_level = "critical"
 
+    @api.depends("alert_level")
+    def _compute_alert_notified_level(self):
+        """Forget the notified level once the summary is back to OK, so that a
+        later warning is notified again. Other levels keep the value written
+        by send_alert_notifications."""
+        for summary in self:
+            if summary.alert_level == "ok":
+                summary.alert_notified_level = False
+
     # -------------------------------------------------------------------------
     # CRUD OVERRIDES
     # -------------------------------------------------------------------------
@@ -476,44 +598,173 @@ class FleetFuelMonthlySummary(models.Model):
         return True
 
     def action_recalculate(self):
-        """Force recalculation of all computed fields."""
+        """Force recalculation of the totals from the expenses and recharges.
+
+        Only the summaries whose stored totals differ from a full
+        recomputation are rewritten (see _check_consumption_totals).
+        """
+        for summary, differences in self._check_consumption_totals().items():
+            summary.write({fname: expected for fname, (_stored, expected) in differences.items()})
         for summary in self:
-            # Trigger recomputation by invalidating cache
-            summary.invalidate_recordset(["total_amount", "total_liter", "expense_count",
-                                          "total_recharge_amount", "recharge_count",
-                                          "avg_consumption_per_100km", "avg_price_per_liter",
-                                          "budget_variance", "variance_pct", "alert_level",
-                                          "distance_traveled"])
-            # Re-read to trigger compute
-            summary.read(["total_amount", "total_liter", "expense_count",
-                          "total_recharge_amount", "recharge_count"])
             summary.message_post(body=_("Synthèse recalculée"))
         return True
 
     def action_auto_fill_odometer(self):
-        """Auto-fill odometer values from expenses in the period."""
+        """Auto-fill odometer values from the daily KPI table of the period."""
+        KPIDaily = self.env["fleet.fuel.kpi.daily"].sudo()
         for summary in self:
             if not summary.vehicle_id:
                 continue
-            Expense = self.env["fleet.fuel.expense"]
-            domain = [
-                ("expense_date", ">=", summary.period_start),
-                ("expense_date", "<=", summary.period_end),
-                ("state", "=", "validated"),
-                ("vehicle_id", "=", summary.vehicle_id.id),
-                ("odometer", ">", 0),
-            ]
-            expenses = Expense.search(domain, order="expense_date asc, odometer asc")
-            if expenses:
-                first_odo = expenses[0].odometer
-                last_odo = expenses[-1].odometer
+            data = KPIDaily.read_group(
+                [
+                    ("day", ">=", summary.period_start),
+                    ("day", "<=", summary.period_end),
+                    ("vehicle_id", "=", summary.vehicle_id.id),
+                    ("odometer_max", ">", 0),
+                ],
+                ["odometer_min:min", "odometer_max:max"],
+                [],
+                lazy=False,
+            )
+            if data and data[0]["__count"]:
                 summary.write({
-                    "odometer_start": first_odo,
-                    "odometer_end": last_odo,
+                    "odometer_start": data[0]["odometer_min"],
+                    "odometer_end": data[0]["odometer_max"],
                 })
                 summary.message_post(body=_("Odomètres renseignés automatiquement depuis les dépenses."))
         return True
 
+    # -------------------------------------------------------------------------
+    # INCREMENTAL MAINTENANCE
+    # -------------------------------------------------------------------------
+    @api.model
+    def _get_open_summaries(self, company_ids, date_from, date_to,
+                            vehicle_ids=None, card_ids=None):
+        """Search the non-closed summaries overlapping [date_from, date_to].
+
+        Summaries without vehicle (or card) are included since they cover
+        every vehicle (or card) of the company.
+        """
+        domain = [
+            ("company_id", "in", company_ids),
+            ("period_start", "<=", date_to),
+            ("period_end", ">=", date_from),
+            ("state", "!=", "closed"),
+        ]
+        if vehicle_ids is not None:
+            domain += ["|", ("vehicle_id", "in", vehicle_ids), ("vehicle_id", "=", False)]
+        if card_ids is not None:
+            domain += ["|", ("card_id", "in", card_ids), ("card_id", "=", False)]
+        return self.search(domain)
+
+    @api.model
+    def _apply_expense_deltas(self, expenses):
+        """Push the amount/liters of newly validated expenses into the open summaries."""
+        if not expenses:
+            return
+        summaries = self._get_open_summaries(
+            expenses.company_id.ids,
+            min(expenses.mapped("expense_date")),
+            max(expenses.mapped("expense_date")),
+            vehicle_ids=expenses.vehicle_id.ids,
+            card_ids=expenses.card_id.ids,
+        )
+        deltas = defaultdict(lambda: dict.fromkeys(CONSUMPTION_TOTAL_FIELDS, 0))
+        for expense in expenses:
+            for summary in summaries:
+                if (
+                    summary.company_id == expense.company_id
+                    and summary.period_start <= expense.expense_date <= summary.period_end
+                    and summary._match_vehicle_card(expense.vehicle_id.id, expense.card_id.id)
+                ):
+                    delta = deltas[summary.id]
+                    delta["total_amount"] += expense.amount
+                    delta["total_liter"] += expense.liter_qty
+                    delta["expense_count"] += 1
+        self._increment_totals(deltas)
+
+    @api.model
+    def _apply_recharge_deltas(self, recharges):
+        """Push the amount of newly posted recharges into the open summaries."""
+        if not recharges:
+            return
+        summaries = self._get_open_summaries(
+            recharges.company_id.ids,
+            min(recharges.mapped("recharge_date")),
+            max(recharges.mapped("recharge_date")),
+            card_ids=recharges.card_id.ids,
+        )
+        deltas = defaultdict(lambda: dict.fromkeys(CONSUMPTION_TOTAL_FIELDS, 0))
+        for recharge in recharges:
+            for summary in summaries:
+                if (
+                    summary.company_id == recharge.company_id
+                    and summary.period_start <= recharge.recharge_date <= summary.period_end
+                    and (not summary.card_id or summary.card_id == recharge.card_id)
+                ):
+                    delta = deltas[summary.id]
+                    delta["total_recharge_amount"] += recharge.amount
+                    delta["recharge_count"] += 1
+        self._increment_totals(deltas)
+
+    @api.model
+    def _increment_totals(self, deltas):
+        """Add deltas to the stored totals with a single UPDATE.
+
+        The increment is done in SQL (total = total + delta) so concurrent
+        validations cannot lose each other's update; the dependent KPIs
+        (average price, budget variance, alert level) are then marked for
+        recomputation. The tracked totals are logged in the chatter at
+        commit, as their recomputation used to be.
+
+        Args:
+            deltas: {summary_id: {field_name: delta}} on CONSUMPTION_TOTAL_FIELDS
+        """
+        if not deltas:
+            return
+        summaries = self.browse(list(deltas))
+        summaries.flush_recordset(CONSUMPTION_TOTAL_FIELDS)
+        if not self.env.context.get("tracking_disable"):
+            summaries._track_prepare(CONSUMPTION_TOTAL_FIELDS)
+        params = []
+        for summary_id, delta in deltas.items():
+            params.append(summary_id)
+            params.extend(delta[fname] for fname in CONSUMPTION_TOTAL_FIELDS)
+        placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(deltas))
+        set_clause = ", ".join(
+            f"{fname} = COALESCE(s.{fname}, 0) + v.{fname}" for fname in CONSUMPTION_TOTAL_FIELDS
+        )
+        self.env.cr.execute(f"""
+            UPDATE fleet_fuel_monthly_summary AS s
+               SET {set_clause},
+                   write_uid = %s,
+                   write_date = %s
+              FROM (VALUES {placeholders}) AS v(id, {", ".join(CONSUMPTION_TOTAL_FIELDS)})
+             WHERE s.id = v.id
+        """, params + [self.env.uid, self.env.cr.now()])
+        summaries.invalidate_recordset(CONSUMPTION_TOTAL_FIELDS + ["write_uid", "write_date"])
+        summaries.modified(CONSUMPTION_TOTAL_FIELDS)
+        _logger.debug("Incremented fuel totals of summaries %s", summaries.ids)
+
+    def _check_consumption_totals(self):
+        """Compare the stored totals with a full recomputation.
+
+        Returns:
+            dict: {summary: {field_name: (stored, expected)}} for the
+                  summaries whose stored totals are inconsistent
+        """
+        expected_totals = self._get_consumption_totals()
+        inconsistent = {}
+        for summary in self:
+            differences = {}
+            for fname, expected in expected_totals[summary.id].items():
+                stored = summary[fname]
+                if float_compare(stored or 0.0, expected or 0.0, precision_digits=2):
+                    differences[fname] = (stored, expected)
+            if differences:
+                inconsistent[summary] = differences
+        return inconsistent
+
     # -------------------------------------------------------------------------
     # CRON METHODS
     # -------------------------------------------------------------------------
@@ -557,4 +808,21 @@ class FleetFuelMonthlySummary(models.Model):
         try:
             kpi_service.send_alert_notifications()
         except Exception as e:
-            _logger.exception("Error sending fuel alerts: %s", e)
\ No newline at end of file
+            _logger.exception("Error sending fuel alerts: %s", e)
+
+    @api.model
+    def cron_check_summary_consistency(self):
+        """Cron job comparing the open summaries with a full recomputation.
+
+        Summaries drifting from their expenses/recharges (e.g. expenses
+        edited in SQL or validated before the summary existed) are logged
+        and fixed.
+        """
+        summaries = self.search([("state", "!=", "closed")])
+        inconsistent = summaries._check_consumption_totals()
+        for summary, differences in inconsistent.items():
+            _logger.warning("Fuel summary %s inconsistent totals: %s", summary.name, differences)
+            summary.write({fname: expected for fname, (_stored, expected) in differences.items()})
+        _logger.info(
+            "Checked %d fuel summaries, %d fixed", len(summaries), len(inconsistent)
+        )
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 import logging
+from collections import defaultdict
 
 from odoo import _, models
 from odoo.exceptions import ValidationError
 
 _logger = logging.getLogger(__name__)
 
+# Card fields maintained by the balance ledger.
+BALANCE_FIELDS = ["balance_amount", "pending_amount"]
+
 
 class FleetFuelBalanceService(models.AbstractModel):
     _name = "fleet.fuel.balance.service"
@@ -16,30 +20,156 @@ class FleetFuelBalanceService(models.AbstractModel):
             raise ValidationError(_("Carte carburant introuvable."))
         return card.sudo()
 
+    # -------------------------------------------------------------------------
+    # LEDGER
+    # -------------------------------------------------------------------------
+    def _lock_cards(self, card_ids):
+        """Lock the card rows with SELECT ... FOR UPDATE.
+
+        Cards are locked in id order so that concurrent validations touching
+        the same cards always acquire the locks in the same order (no
+        deadlock), and the second one waits for the first to commit.
+
+        Returns:
+            dict: {card_id: (balance_amount, pending_amount)} as stored in the
+                  database once locked
+        """
+        Card = self.env["fleet.fuel.card"].sudo()
+        Card.flush_model(BALANCE_FIELDS)
+        self.env.cr.execute("""
+            SELECT id, COALESCE(balance_amount, 0), COALESCE(pending_amount, 0)
+              FROM fleet_fuel_card
+             WHERE id IN %s
+             ORDER BY id
+               FOR UPDATE
+        """, [tuple(sorted(card_ids))])
+        return {card_id: (balance, pending) for card_id, balance, pending in self.env.cr.fetchall()}
+
+    def apply_ledger(self, balance_deltas=None, pending_deltas=None, check_available=False):
+        """Apply net balance/pending deltas to several cards at once.
+
+        The cards are locked (see _lock_cards), checked, then updated with a
+        single UPDATE. Pending amounts never go below zero. The UPDATE sets
+        write_date/write_uid and the balance changes are tracked in the card
+        chatter as a regular write would.
+
+        Args:
+            balance_deltas: {card_id: delta} added to balance_amount
+            pending_deltas: {card_id: delta} added to pending_amount
+            check_available: If True, refuse any card whose available amount
+                             (balance - pending) would become negative
+
+        Raises:
+            ValidationError: insufficient balance (check_available=True)
+        """
+        balance_deltas = {card_id: delta for card_id, delta in (balance_deltas or {}).items() if delta}
+        pending_deltas = {card_id: delta for card_id, delta in (pending_deltas or {}).items() if delta}
+        card_ids = set(balance_deltas) | set(pending_deltas)
+        if not card_ids:
+            return
+        locked = self._lock_cards(card_ids)
+        missing = card_ids - set(locked)
+        if missing:
+            raise ValidationError(_("Carte carburant introuvable."))
+
+        Card = self.env["fleet.fuel.card"].sudo()
+        for card_id in sorted(card_ids):
+            balance, pending = locked[card_id]
+            new_balance = balance + balance_deltas.get(card_id, 0.0)
+            new_pending = max(pending + pending_deltas.get(card_id, 0.0), 0.0)
+            if check_available and balance_deltas.get(card_id, 0.0) < 0 and new_balance - new_pending < 0:
+                raise ValidationError(_("Solde insuffisant pour la carte %s") % Card.browse(card_id).name)
+            if new_balance < 0:
+                # Same rule as fleet.fuel.card._check_balance, bypassed by the SQL update
+                raise ValidationError(_("Le solde d'une carte ne peut pas être négatif."))
+
+        cards = Card.browse(sorted(card_ids))
+        if not self.env.context.get("tracking_disable"):
+            # Initial values (the locked ones), logged with the new values at commit
+            cards._track_prepare(BALANCE_FIELDS)
+
+        params = []
+        for card_id in sorted(card_ids):
+            params.extend([card_id, balance_deltas.get(card_id, 0.0), pending_deltas.get(card_id, 0.0)])
+        placeholders = ", ".join(["(%s, %s, %s)"] * len(card_ids))
+        self.env.cr.execute(f"""
+            UPDATE fleet_fuel_card AS c
+               SET balance_amount = COALESCE(c.balance_amount, 0) + v.balance_delta,
+                   pending_amount = GREATEST(COALESCE(c.pending_amount, 0) + v.pending_delta, 0),
+                   write_uid = %s,
+                   write_date = %s
+              FROM (VALUES {placeholders}) AS v(id, balance_delta, pending_delta)
+             WHERE c.id = v.id
+        """, params + [self.env.uid, self.env.cr.now()])
+        cards.invalidate_recordset(BALANCE_FIELDS + ["write_uid", "write_date"])
+        cards.modified(BALANCE_FIELDS)
+        _logger.debug("Applied ledger on cards %s: balance %s, pending %s", cards.ids, balance_deltas, pending_deltas)
+
+    def spend_expenses(self, expenses):
+        """Deduct a whole recordset of expenses from their cards.
+
+        Amounts are aggregated per card and applied with apply_ledger: one
+        lock and one UPDATE for the whole recordset.
+        """
+        deltas = defaultdict(float)
+        for expense in expenses:
+            if expense.amount > 0:
+                self._ensure_card(expense.card_id)
+                deltas[expense.card_id.id] -= expense.amount
+        self.apply_ledger(balance_deltas=deltas, check_available=True)
+
+    def reserve_recharges(self, recharges):
+        """Reserve the amount of submitted recharges on their cards."""
+        deltas = defaultdict(float)
+        for recharge in recharges:
+            if recharge.amount > 0:
+                deltas[self._ensure_card(recharge.card_id).id] += recharge.amount
+        self.apply_ledger(pending_deltas=deltas)
+
+    def release_recharges(self, recharges):
+        """Release the reserved amount of recharges (cancelled)."""
+        deltas = defaultdict(float)
+        for recharge in recharges:
+            if recharge.amount > 0:
+                deltas[self._ensure_card(recharge.card_id).id] -= recharge.amount
+        self.apply_ledger(pending_deltas=deltas)
+
+    def post_recharges(self, recharges):
+        """Move the reserved amount of posted recharges into the balance."""
+        balance_deltas = defaultdict(float)
+        pending_deltas = defaultdict(float)
+        for recharge in recharges:
+            card_id = self._ensure_card(recharge.card_id).id
+            balance_deltas[card_id] += recharge.amount
+            if recharge.amount > 0:
+                pending_deltas[card_id] -= recharge.amount
+        self.apply_ledger(balance_deltas=balance_deltas, pending_deltas=pending_deltas)
+
+    # -------------------------------------------------------------------------
+    # SINGLE CARD HELPERS
+    # -------------------------------------------------------------------------
     def reserve_amount(self, card, amount):
         card = self._ensure_card(card)
         if amount <= 0:
             return
-        card.pending_amount += amount
+        self.apply_ledger(pending_deltas={card.id: amount})
         _logger.debug("Reserve %.2f on card %s", amount, card.name)
 
     def release_amount(self, card, amount):
         card = self._ensure_card(card)
         if amount <= 0:
             return
-        card.pending_amount = max(card.pending_amount - amount, 0.0)
+        self.apply_ledger(pending_deltas={card.id: -amount})
         _logger.debug("Release %.2f on card %s", amount, card.name)
 
     def apply_delta(self, card, amount):
         card = self._ensure_card(card)
-        card.balance_amount += amount
+        self.apply_ledger(balance_deltas={card.id: amount})
         _logger.debug("Apply delta %.2f on card %s", amount, card.name)
 
     def spend_amount(self, card, amount):
         card = self._ensure_card(card)
         if amount <= 0:
             return
-        if card.available_amount < amount:
-            raise ValidationError(_("Solde insuffisant pour la carte %s") % card.name)
-        card.balance_amount -= amount
-        _logger.debug("Spend %.2f on card %s", amount, card.name)
\ No newline at end of file
+        self.apply_ledger(balance_deltas={card.id: -amount}, check_available=True)
+        _logger.debug("Spend %.2f on card %s", amount, card.name)
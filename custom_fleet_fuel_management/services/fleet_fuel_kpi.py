@@ -10,10 +10,11 @@ AbstractModel service for calculating fuel consumption KPIs:
 Per REQ-005/TASK-009 of feature-fuel-management-1.md.
 """
 import logging
+from collections import defaultdict
 from datetime import date, timedelta
 
 from dateutil.relativedelta import relativedelta
-from odoo import _, api, fields, models
+from odoo import _, api, fields, models, tools
 from odoo.exceptions import UserError
 
 _logger = logging.getLogger(__name__)
@@ -143,7 +144,7 @@ class FleetFuelKPIService(models.AbstractModel):
     @api.model
     def generate_monthly_summaries(self, period_start=None, period_end=None,
                                     vehicle_ids=None, card_ids=None,
-                                    company_id=None, force=False):
+                                    company_id=None, force=False, bulk=False):
         """Generate monthly fuel summaries for the given period.
 
         This method creates or updates fleet.fuel.monthly.summary records
@@ -156,6 +157,8 @@ class FleetFuelKPIService(models.AbstractModel):
             card_ids: List of card IDs to process (None = all)
             company_id: Company ID (defaults to current company)
             force: If True, regenerate even if summary exists
+            bulk: If True, use the set-based engine
+                  (see _generate_monthly_summaries_bulk)
 
         Returns:
             recordset: Created/updated fleet.fuel.monthly.summary records
@@ -176,6 +179,12 @@ class FleetFuelKPIService(models.AbstractModel):
             period_start, period_end, company_id
         )
 
+        if bulk:
+            return self._generate_monthly_summaries_bulk(
+                period_start, period_end, company_id,
+                vehicle_ids=vehicle_ids, card_ids=card_ids, force=force,
+            )
+
         # Find all unique (vehicle, card) combinations with expenses
         expense_domain = [
             ("expense_date", ">=", period_start),
@@ -257,6 +266,195 @@ class FleetFuelKPIService(models.AbstractModel):
         _logger.info("Generated %d fuel summaries", len(created_summaries))
         return created_summaries
 
+    @api.model
+    def _aggregate_period_totals(self, company_id, period_start, period_end,
+                                 vehicle_ids=None, card_ids=None):
+        """Aggregate expense and recharge totals of a period in one pass.
+
+        One grouped query is issued for the expenses (by vehicle/card/driver),
+        one for the recharges (by card) and one on fleet.fuel.kpi.daily for
+        the odometer bounds (by vehicle), whatever the number of cards in the
+        company.
+
+        Args:
+            company_id: Company ID
+            period_start: Start date
+            period_end: End date
+            vehicle_ids: Optional list of vehicle IDs
+            card_ids: Optional list of card IDs
+
+        Returns:
+            dict: {
+                "expenses": {(vehicle_id, card_id): {
+                    "total_amount", "total_liter", "expense_count", "driver_id"}},
+                "recharges": {card_id: {"total_recharge_amount", "recharge_count"}},
+                "odometers": {vehicle_id: (odometer_min, odometer_max)},
+            }
+        """
+        Expense = self.env["fleet.fuel.expense"]
+        Recharge = self.env["fleet.fuel.recharge"]
+
+        expense_domain = [
+            ("expense_date", ">=", period_start),
+            ("expense_date", "<=", period_end),
+            ("state", "=", "validated"),
+            ("company_id", "=", company_id),
+        ]
+        if vehicle_ids:
+            expense_domain.append(("vehicle_id", "in", vehicle_ids))
+        if card_ids:
+            expense_domain.append(("card_id", "in", card_ids))
+
+        expenses = {}
+        driver_counts = {}
+        for group in Expense.read_group(
+            expense_domain,
+            ["amount:sum", "liter_qty:sum"],
+            ["vehicle_id", "card_id", "driver_id"],
+            lazy=False,
+        ):
+            vehicle_id = group["vehicle_id"][0] if group["vehicle_id"] else False
+            card_id = group["card_id"][0] if group["card_id"] else False
+            driver_id = group["driver_id"][0] if group["driver_id"] else False
+            key = (vehicle_id, card_id)
+            totals = expenses.setdefault(key, {
+                "total_amount": 0.0,
+                "total_liter": 0.0,
+                "expense_count": 0,
+                "driver_id": False,
+            })
+            totals["total_amount"] += group["amount"] or 0.0
+            totals["total_liter"] += group["liter_qty"] or 0.0
+            totals["expense_count"] += group["__count"]
+            # Main driver = driver with the most expenses on the period
+            if driver_id and group["__count"] > driver_counts.get(key, 0):
+                driver_counts[key] = group["__count"]
+                totals["driver_id"] = driver_id
+
+        recharge_domain = [
+            ("recharge_date", ">=", period_start),
+            ("recharge_date", "<=", period_end),
+            ("state", "=", "posted"),
+            ("company_id", "=", company_id),
+        ]
+        if card_ids:
+            recharge_domain.append(("card_id", "in", card_ids))
+        recharges = {
+            group["card_id"][0]: {
+                "total_recharge_amount": group["amount"] or 0.0,
+                "recharge_count": group["__count"],
+            }
+            for group in Recharge.read_group(
+                recharge_domain, ["amount:sum"], ["card_id"], lazy=False,
+            )
+            if group["card_id"]
+        }
+
+        odometers = {}
+        vehicle_keys = {vehicle_id for vehicle_id, _card_id in expenses if vehicle_id}
+        if vehicle_keys:
+            # Same scope as action_auto_fill_odometer (vehicle only)
+            for group in self.env["fleet.fuel.kpi.daily"].sudo().read_group(
+                [
+                    ("day", ">=", period_start),
+                    ("day", "<=", period_end),
+                    ("vehicle_id", "in", list(vehicle_keys)),
+                    ("odometer_max", ">", 0),
+                ],
+                ["odometer_min:min", "odometer_max:max"],
+                ["vehicle_id"],
+                lazy=False,
+            ):
+                odometers[group["vehicle_id"][0]] = (
+                    group["odometer_min"] or 0.0,
+                    group["odometer_max"] or 0.0,
+                )
+
+        return {
+            "expenses": expenses,
+            "recharges": recharges,
+            "odometers": odometers,
+        }
+
+    @api.model
+    def _generate_monthly_summaries_bulk(self, period_start, period_end, company_id,
+                                         vehicle_ids=None, card_ids=None, force=False):
+        """Set-based variant of generate_monthly_summaries.
+
+        All totals of the company/period are computed by
+        _aggregate_period_totals, the existing summaries are preloaded with a
+        single search, then new summaries are created with one
+        create(vals_list) and existing ones (force=True) are updated in the
+        same flush. Totals are passed explicitly so the per-record
+        _compute_consumption_totals queries are not triggered: the number of
+        queries does not depend on the number of cards.
+
+        Returns:
+            recordset: Created/updated fleet.fuel.monthly.summary records
+        """
+        Summary = self.env["fleet.fuel.monthly.summary"]
+        company = self.env["res.company"].browse(company_id)
+        data = self._aggregate_period_totals(
+            company_id, period_start, period_end,
+            vehicle_ids=vehicle_ids, card_ids=card_ids,
+        )
+        no_recharge = {"total_recharge_amount": 0.0, "recharge_count": 0}
+
+        existing_summaries = {
+            (summary.vehicle_id.id, summary.card_id.id): summary
+            for summary in Summary.search([
+                ("period_start", "=", period_start),
+                ("period_end", "=", period_end),
+                ("company_id", "=", company_id),
+            ])
+        }
+
+        vals_list = []
+        to_update = []
+        kept_summaries = Summary
+        for (vehicle_id, card_id), totals in data["expenses"].items():
+            if not vehicle_id and not card_id:
+                continue
+            vals = {
+                "driver_id": totals["driver_id"],
+                "total_amount": totals["total_amount"],
+                "total_liter": totals["total_liter"],
+                "expense_count": totals["expense_count"],
+                **data["recharges"].get(card_id, no_recharge),
+            }
+            existing = existing_summaries.get((vehicle_id, card_id))
+            if existing:
+                if force:
+                    to_update.append((existing, vals))
+                else:
+                    kept_summaries |= existing
+                continue
+            if vehicle_id in data["odometers"]:
+                vals["odometer_start"], vals["odometer_end"] = data["odometers"][vehicle_id]
+            vals.update({
+                "period_start": period_start,
+                "period_end": period_end,
+                "vehicle_id": vehicle_id,
+                "card_id": card_id,
+                "company_id": company_id,
+                "currency_id": company.currency_id.id,
+            })
+            vals_list.append(vals)
+
+        created_summaries = Summary.create(vals_list) if vals_list else Summary
+        updated_summaries = Summary
+        for summary, vals in to_update:
+            # Buffered in the ORM cache, flushed as one batched UPDATE
+            summary.write(vals)
+            updated_summaries |= summary
+        Summary.flush_model()
+
+        _logger.info(
+            "Bulk fuel summaries for company %s: %d created, %d updated, %d kept",
+            company_id, len(created_summaries), len(updated_summaries), len(kept_summaries),
+        )
+        return created_summaries | updated_summaries | kept_summaries
+
     @api.model
     def generate_summaries_for_all_companies(self, period_start=None, period_end=None):
         """Generate summaries for all companies (cron job entry point).
@@ -276,6 +474,7 @@ class FleetFuelKPIService(models.AbstractModel):
                 period_start=period_start,
                 period_end=period_end,
                 company_id=company.id,
+                bulk=True,
             )
             all_summaries |= summaries
 
@@ -303,17 +502,36 @@ class FleetFuelKPIService(models.AbstractModel):
             ("state", "!=", "closed"),
         ])
 
+    @api.model
+    def _get_alert_recipients(self, company):
+        """Partners receiving the fuel alert digest of a company."""
+        group = self.env.ref("custom_fleet_fuel_management.group_fleet_fuel_manager", raise_if_not_found=False)
+        if not group:
+            return self.env["res.partner"]
+        users = group.sudo().user_ids.filtered(lambda user: company in user.company_ids and user.email)
+        return users.partner_id
+
     @api.model
     def send_alert_notifications(self):
-        """Send email notifications for critical summaries.
+        """Queue one alert digest per recipient for critical summaries.
+
+        This is called by cron job. The summaries are rendered with one
+        _generate_template call of
+        'custom_fleet_fuel_management.mail_template_fleet_fuel_summary_alert',
+        grouped per recipient and queued as mail.mail (sent by the mail
+        queue cron). A summary is only notified again when its alert level
+        changes (see alert_notified_level).
 
-        This is called by cron job. Uses mail template
-        'custom_fleet_fuel_management.mail_template_fleet_fuel_summary_alert'.
+        Returns:
+            recordset: queued mail.mail
         """
-        critical_summaries = self.detect_critical_summaries()
-        if not critical_summaries:
+        Mail = self.env["mail.mail"].sudo()
+        summaries = self.detect_critical_summaries().filtered(
+            lambda summary: summary.alert_notified_level != summary.alert_level
+        )
+        if not summaries:
             _logger.info("No critical fuel summaries to notify")
-            return
+            return Mail
 
         template = self.env.ref(
             "custom_fleet_fuel_management.mail_template_fleet_fuel_summary_alert",
@@ -321,22 +539,132 @@ class FleetFuelKPIService(models.AbstractModel):
         )
         if not template:
             _logger.warning("Mail template 'mail_template_fleet_fuel_summary_alert' not found")
-            return
+            return Mail
+
+        rendered = template._generate_template(summaries.ids, ["body_html"])
+        recipients = {company: self._get_alert_recipients(company) for company in summaries.company_id}
+        digests = defaultdict(lambda: self.env["fleet.fuel.monthly.summary"])
+        for summary in summaries:
+            for partner in recipients[summary.company_id]:
+                digests[(summary.company_id, partner)] |= summary
+
+        mail_values = []
+        for (company, partner), partner_summaries in digests.items():
+            critical_count = len(partner_summaries.filtered(lambda summary: summary.alert_level == "critical"))
+            mail_values.append({
+                "subject": _(
+                    "Alertes carburant - %(count)s synthèse(s) dont %(critical)s critique(s)",
+                    count=len(partner_summaries),
+                    critical=critical_count,
+                ),
+                "body_html": "".join(rendered[summary.id]["body_html"] or "" for summary in partner_summaries),
+                "email_from": company.email_formatted or self.env.user.email_formatted,
+                "recipient_ids": [(4, partner.id)],
+                "auto_delete": True,
+            })
+        mails = Mail.create(mail_values)
 
-        for summary in critical_summaries:
-            try:
-                template.send_mail(summary.id, force_send=True)
-                _logger.info("Sent alert for summary %s", summary.name)
-            except Exception as e:
-                _logger.exception("Failed to send alert for summary %s: %s", summary.name, e)
+        # Summaries without recipient stay pending for the next run
+        notified = self.env["fleet.fuel.monthly.summary"].union(*digests.values())
+        for level in ("warning", "critical"):
+            notified.filtered(lambda summary: summary.alert_level == level).write({
+                "alert_notified_level": level,
+            })
+        _logger.info("Queued %d fuel alert digests for %d summaries", len(mails), len(notified))
+        return mails
 
     # -------------------------------------------------------------------------
     # REPORTING HELPERS
     # -------------------------------------------------------------------------
+    @api.model
+    def _get_analytics_generation(self):
+        """Generation of the daily KPI table, part of the analytics cache keys.
+
+        Bumped by every refresh of fleet.fuel.kpi.daily, so cached entries
+        are left behind (and evicted by the LRU) without clearing the other
+        caches of the registry.
+        """
+        return self.env["fleet.fuel.kpi.daily"]._get_generation()
+
+    @api.model
+    def _get_analytics_domain(self, company_id, date_from=None, date_to=None,
+                              vehicle_ids=None, card_ids=None):
+        """Domain on fleet.fuel.kpi.daily (validated expenses only)."""
+        domain = [("company_id", "=", company_id)]
+        if date_from:
+            domain.append(("day", ">=", date_from))
+        if date_to:
+            domain.append(("day", "<=", date_to))
+        if vehicle_ids:
+            domain.append(("vehicle_id", "in", list(vehicle_ids)))
+        if card_ids:
+            domain.append(("card_id", "in", list(card_ids)))
+        return domain
+
+    @api.model
+    @tools.ormcache("self.env.uid", "self.env.su", "company_id", "generation", "date_from",
+                    "date_to", "vehicle_ids", "card_ids")
+    def _read_consumption_stats(self, company_id, generation, date_from, date_to,
+                                vehicle_ids, card_ids):
+        domain = self._get_analytics_domain(company_id, date_from, date_to, vehicle_ids, card_ids)
+        data = self.env["fleet.fuel.kpi.daily"].read_group(
+            domain, ["total_amount:sum", "total_liter:sum", "expense_count:sum"], [], lazy=False,
+        )
+        if not data:
+            return (0.0, 0.0, 0)
+        return (data[0]["total_amount"] or 0.0, data[0]["total_liter"] or 0.0, data[0]["expense_count"] or 0)
+
+    @api.model
+    @tools.ormcache("self.env.uid", "self.env.su", "company_id", "generation", "date_from",
+                    "date_to", "vehicle_ids", "card_ids", "group_by")
+    def _read_trend_series(self, company_id, generation, date_from, date_to,
+                           vehicle_ids, card_ids, group_by):
+        """Monthly totals of [date_from, date_to] from one grouped query.
+
+        Returns:
+            tuple: ((key, month_start, amount, liters, count), ...) where key
+                   is the group_by record id (False without group_by)
+        """
+        domain = self._get_analytics_domain(company_id, date_from, date_to, vehicle_ids, card_ids)
+        groupby = ["day:month"] + ([group_by] if group_by else [])
+        rows = []
+        for group in self.env["fleet.fuel.kpi.daily"].read_group(
+            domain, ["total_amount:sum", "total_liter:sum", "expense_count:sum"], groupby, lazy=False,
+        ):
+            month_start = fields.Date.to_date(group["__range"]["day:month"]["from"][:10])
+            key = group[group_by][0] if group_by and group[group_by] else False
+            rows.append((
+                key, month_start, group["total_amount"] or 0.0,
+                group["total_liter"] or 0.0, group["expense_count"] or 0,
+            ))
+        return tuple(rows)
+
+    @api.model
+    @tools.ormcache("self.env.uid", "self.env.su", "company_id", "generation", "date_from",
+                    "date_to", "card_ids", "limit")
+    def _read_top_consuming_vehicles(self, company_id, generation, date_from, date_to,
+                                     card_ids, limit):
+        domain = self._get_analytics_domain(company_id, date_from, date_to, card_ids=card_ids)
+        return tuple(
+            (
+                g["vehicle_id"][0], g["vehicle_id"][1], g["total_amount"] or 0.0,
+                g["total_liter"] or 0.0, g["expense_count"] or 0,
+            )
+            for g in self.env["fleet.fuel.kpi.daily"].read_group(
+                domain,
+                ["total_amount:sum", "total_liter:sum", "expense_count:sum"],
+                ["vehicle_id"],
+                orderby="total_amount desc",
+                limit=limit,
+                lazy=False,
+            )
+            if g["vehicle_id"]
+        )
+
     @api.model
     def get_consumption_stats(self, vehicle_id=None, card_id=None,
                                period_start=None, period_end=None,
-                               company_id=None):
+                               company_id=None, vehicle_ids=None, card_ids=None):
         """Get aggregated consumption statistics.
 
         Args:
@@ -345,42 +673,29 @@ class FleetFuelKPIService(models.AbstractModel):
             period_start: Start date
             period_end: End date
             company_id: Company ID
+            vehicle_ids: Filter by several vehicles
+            card_ids: Filter by several cards
 
         Returns:
             dict: Aggregated statistics
         """
-        Expense = self.env["fleet.fuel.expense"]
-        domain = [("state", "=", "validated")]
-
-        if company_id:
-            domain.append(("company_id", "=", company_id))
-        else:
-            domain.append(("company_id", "=", self.env.company.id))
-        if vehicle_id:
-            domain.append(("vehicle_id", "=", vehicle_id))
-        if card_id:
-            domain.append(("card_id", "=", card_id))
-        if period_start:
-            domain.append(("expense_date", ">=", period_start))
-        if period_end:
-            domain.append(("expense_date", "<=", period_end))
-
-        data = Expense.read_group(domain, ["amount:sum", "liter_qty:sum"], [])
-
-        total_amount = data[0]["amount"] if data else 0.0
-        total_liters = data[0]["liter_qty"] if data else 0.0
-        expense_count = Expense.search_count(domain)
-
+        company_id = company_id or self.env.company.id
+        vehicle_ids = tuple(sorted(set(vehicle_ids or []) | ({vehicle_id} if vehicle_id else set())))
+        card_ids = tuple(sorted(set(card_ids or []) | ({card_id} if card_id else set())))
+        total_amount, total_liters, expense_count = self._read_consumption_stats(
+            company_id, self._get_analytics_generation(), fields.Date.to_date(period_start), fields.Date.to_date(period_end),
+            vehicle_ids, card_ids,
+        )
         return {
-            "total_amount": total_amount or 0.0,
-            "total_liters": total_liters or 0.0,
+            "total_amount": total_amount,
+            "total_liters": total_liters,
             "expense_count": expense_count,
             "avg_price_per_liter": self.compute_avg_price_per_liter(total_amount, total_liters),
         }
 
     @api.model
     def get_top_consuming_vehicles(self, limit=10, period_start=None,
-                                    period_end=None, company_id=None):
+                                    period_end=None, company_id=None, card_ids=None):
         """Get top fuel consuming vehicles.
 
         Args:
@@ -388,41 +703,80 @@ class FleetFuelKPIService(models.AbstractModel):
             period_start: Start date
             period_end: End date
             company_id: Company ID
+            card_ids: Optional card filter
 
         Returns:
             list: List of dicts with vehicle info and consumption
         """
-        Expense = self.env["fleet.fuel.expense"]
-        domain = [("state", "=", "validated")]
+        company_id = company_id or self.env.company.id
+        rows = self._read_top_consuming_vehicles(
+            company_id, self._get_analytics_generation(), fields.Date.to_date(period_start), fields.Date.to_date(period_end),
+            tuple(sorted(card_ids or [])), limit,
+        )
+        return [
+            {
+                "vehicle_id": vehicle_id,
+                "vehicle_name": vehicle_name,
+                "total_amount": total_amount,
+                "total_liters": total_liters,
+                "expense_count": expense_count,
+            }
+            for vehicle_id, vehicle_name, total_amount, total_liters, expense_count in rows
+        ]
 
-        if company_id:
-            domain.append(("company_id", "=", company_id))
-        else:
-            domain.append(("company_id", "=", self.env.company.id))
-        if period_start:
-            domain.append(("expense_date", ">=", period_start))
-        if period_end:
-            domain.append(("expense_date", "<=", period_end))
-
-        grouped = Expense.read_group(
-            domain,
-            ["vehicle_id", "amount:sum", "liter_qty:sum"],
-            ["vehicle_id"],
-            orderby="amount desc",
-            limit=limit,
+    @api.model
+    def get_trend_series(self, months=12, vehicle_ids=None, card_ids=None,
+                         company_id=None, group_by=None):
+        """Get the monthly consumption trend as dense series.
+
+        The whole period is read with one grouped query on the daily KPI
+        table by month (cached until the daily KPI table changes, see
+        _get_analytics_generation).
+
+        Args:
+            months: Number of months to look back (current month included)
+            vehicle_ids: Optional list of vehicle IDs
+            card_ids: Optional list of card IDs
+            company_id: Company ID
+            group_by: None for one series, or "vehicle_id" / "card_id" for
+                      one series per vehicle / card
+
+        Returns:
+            dict: {key: [{"month", "month_label", "total_amount",
+                          "total_liters", "expense_count"}, ...]}
+                  where key is False without group_by
+        """
+        if group_by not in (None, "vehicle_id", "card_id"):
+            raise UserError(_("Regroupement non supporté : %s") % group_by)
+        company_id = company_id or self.env.company.id
+        vehicle_ids = tuple(sorted(vehicle_ids or []))
+        card_ids = tuple(sorted(card_ids or []))
+        today = fields.Date.context_today(self)
+        date_from = (today - relativedelta(months=months - 1)).replace(day=1)
+        rows = self._read_trend_series(
+            company_id, self._get_analytics_generation(), date_from, today, vehicle_ids, card_ids, group_by,
         )
 
-        result = []
-        for g in grouped:
-            if g["vehicle_id"]:
-                result.append({
-                    "vehicle_id": g["vehicle_id"][0],
-                    "vehicle_name": g["vehicle_id"][1],
-                    "total_amount": g["amount"] or 0.0,
-                    "total_liters": g["liter_qty"] or 0.0,
-                    "expense_count": g["vehicle_id_count"],
-                })
-        return result
+        month_starts = [date_from + relativedelta(months=i) for i in range(months)]
+        totals = {(key, month): (amount, liters, count) for key, month, amount, liters, count in rows}
+        if group_by:
+            requested = vehicle_ids if group_by == "vehicle_id" else card_ids
+            keys = list(requested) or sorted({key for key, _month in totals if key})
+        else:
+            keys = [False]
+        return {
+            key: [
+                {
+                    "month": month.strftime("%Y-%m"),
+                    "month_label": month.strftime("%b %Y"),
+                    "total_amount": totals.get((key, month), (0.0, 0.0, 0))[0],
+                    "total_liters": totals.get((key, month), (0.0, 0.0, 0))[1],
+                    "expense_count": totals.get((key, month), (0.0, 0.0, 0))[2],
+                }
+                for month in month_starts
+            ]
+            for key in keys
+        }
 
     @api.model
     def get_monthly_trend(self, vehicle_id=None, months=12, company_id=None):
@@ -436,37 +790,9 @@ class FleetFuelKPIService(models.AbstractModel):
         Returns:
             list: List of dicts with month and consumption data
         """
-        Expense = self.env["fleet.fuel.expense"]
-        today = fields.Date.context_today(self)
-
-        result = []
-        for i in range(months - 1, -1, -1):
-            month_date = today - relativedelta(months=i)
-            period_start = month_date.replace(day=1)
-            if i == 0:
-                period_end = today
-            else:
-                next_month = period_start + relativedelta(months=1)
-                period_end = next_month - timedelta(days=1)
-
-            domain = [
-                ("state", "=", "validated"),
-                ("expense_date", ">=", period_start),
-                ("expense_date", "<=", period_end),
-            ]
-            if company_id:
-                domain.append(("company_id", "=", company_id))
-            else:
-                domain.append(("company_id", "=", self.env.company.id))
-            if vehicle_id:
-                domain.append(("vehicle_id", "=", vehicle_id))
-
-            data = Expense.read_group(domain, ["amount:sum", "liter_qty:sum"], [])
-            result.append({
-                "month": period_start.strftime("%Y-%m"),
-                "month_label": period_start.strftime("%b %Y"),
-                "total_amount": data[0]["amount"] if data else 0.0,
-                "total_liters": data[0]["liter_qty"] if data else 0.0,
-            })
-
-        return result
+        series = self.get_trend_series(
+            months=months,
+            vehicle_ids=[vehicle_id] if vehicle_id else None,
+            company_id=company_id,
+        )
+        return series[False]
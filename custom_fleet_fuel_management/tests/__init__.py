@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from . import (
+    test_fleet_fuel_balance_concurrency,
     test_fleet_fuel_card,
     test_fleet_fuel_expense,
     test_fleet_fuel_recharge,
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""Tests for the fleet.fuel.balance.service ledger.
+
+Test coverage:
+- Aggregated deltas per card for a recordset of expenses
+- Insufficient balance on the aggregated amount
+- Chatter tracking of the balance updated in SQL
+- Card lock held by a concurrent transaction (second spender waits)
+- Spending from two transactions (no overspending, no lost update)
+"""
+import base64
+import logging
+
+import psycopg2.errors
+
+from odoo import SUPERUSER_ID, api, fields
+from odoo.exceptions import ValidationError
+from odoo.sql_db import db_connect
+from odoo.tests import TransactionCase, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestFleetFuelBalanceConcurrency(TransactionCase):
+    """Test cases for the card balance ledger."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Set up cards and vehicles for ledger tests."""
+        super().setUpClass()
+        cls.company = cls.env.ref('base.main_company')
+
+        cls.vehicle_brand = cls.env['fleet.vehicle.model.brand'].create({
+            'name': 'Ledger Test Brand',
+        })
+        cls.vehicle_model = cls.env['fleet.vehicle.model'].create({
+            'name': 'Ledger Test Model',
+            'brand_id': cls.vehicle_brand.id,
+        })
+        cls.vehicle = cls.env['fleet.vehicle'].create({
+            'model_id': cls.vehicle_model.id,
+            'license_plate': 'LEDGER-001',
+            'company_id': cls.company.id,
+        })
+        cls.vehicle_2 = cls.env['fleet.vehicle'].create({
+            'model_id': cls.vehicle_model.id,
+            'license_plate': 'LEDGER-002',
+            'company_id': cls.company.id,
+        })
+
+        cls.card = cls.env['fleet.fuel.card'].create({
+            'card_uid': 'LEDGER-CARD-001',
+            'vehicle_id': cls.vehicle.id,
+            'balance_amount': 250.0,
+            'pending_amount': 0.0,
+            'company_id': cls.company.id,
+        })
+        cls.card_2 = cls.env['fleet.fuel.card'].create({
+            'card_uid': 'LEDGER-CARD-002',
+            'vehicle_id': cls.vehicle_2.id,
+            'balance_amount': 1000.0,
+            'pending_amount': 0.0,
+            'company_id': cls.company.id,
+        })
+        (cls.card | cls.card_2).action_activate()
+
+        cls.dummy_receipt = base64.b64encode(b'Test receipt for ledger tests')
+        cls.Expense = cls.env['fleet.fuel.expense']
+
+    # -------------------------------------------------------------------------
+    # HELPER METHODS
+    # -------------------------------------------------------------------------
+    def _create_expenses(self, card, amounts):
+        """Helper to create draft expenses on a card."""
+        return self.Expense.create([
+            {
+                'card_id': card.id,
+                'vehicle_id': card.vehicle_id.id,
+                'amount': amount,
+                'expense_date': fields.Date.today(),
+                'receipt_attachment': self.dummy_receipt,
+                'company_id': self.company.id,
+            }
+            for amount in amounts
+        ])
+
+    def _new_cursor(self):
+        """Open a real database cursor, independent from the test transaction."""
+        cr = db_connect(self.cr.dbname).cursor()
+        self.addCleanup(cr.close)
+        return cr
+
+    def _create_committed_card(self, balance):
+        """Create and commit a card (and its vehicle) visible to other cursors.
+
+        The test transaction is never committed, so the card the concurrent
+        cursors work on is created in its own transaction and removed by a
+        cleanup.
+
+        Returns:
+            int: card id
+        """
+        with db_connect(self.cr.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            vehicle = env['fleet.vehicle'].create({
+                'model_id': env['fleet.vehicle.model'].create({
+                    'name': 'Ledger Lock Model',
+                    'brand_id': env['fleet.vehicle.model.brand'].create({'name': 'Ledger Lock Brand'}).id,
+                }).id,
+                'license_plate': 'LEDGER-LOCK',
+                'company_id': self.company.id,
+            })
+            card = env['fleet.fuel.card'].create({
+                'card_uid': 'LEDGER-LOCK-CARD',
+                'vehicle_id': vehicle.id,
+                'balance_amount': balance,
+                'pending_amount': 0.0,
+                'company_id': self.company.id,
+            })
+            card.action_activate()
+            env.flush_all()
+            record_ids = (card.id, vehicle.id, vehicle.model_id.id, vehicle.model_id.brand_id.id)
+            cr.commit()
+        self.addCleanup(self._delete_committed_card, *record_ids)
+        return record_ids[0]
+
+    def _delete_committed_card(self, card_id, vehicle_id, model_id, brand_id):
+        with db_connect(self.cr.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['fleet.fuel.card'].browse(card_id).unlink()
+            env['fleet.vehicle'].browse(vehicle_id).unlink()
+            env['fleet.vehicle.model'].browse(model_id).unlink()
+            env['fleet.vehicle.model.brand'].browse(brand_id).unlink()
+            cr.commit()
+
+    def _spend(self, env, card_id, amount):
+        """Spend an amount on a card through spend_expenses (unsaved expense)."""
+        expense = env['fleet.fuel.expense'].new({'card_id': card_id, 'amount': amount})
+        env['fleet.fuel.balance.service'].spend_expenses(expense)
+
+    @staticmethod
+    def _get_balance(cr, card_id):
+        cr.execute("SELECT balance_amount FROM fleet_fuel_card WHERE id = %s", [card_id])
+        return cr.fetchone()[0]
+
+    # -------------------------------------------------------------------------
+    # TEST: AGGREGATED LEDGER
+    # -------------------------------------------------------------------------
+    def test_01_ledger_aggregates_per_card(self):
+        """Validating a recordset applies one net delta per card."""
+        expenses = self._create_expenses(self.card, [50.0, 70.0]) | self._create_expenses(self.card_2, [300.0])
+
+        expenses.action_validate()
+
+        self.assertEqual(set(expenses.mapped('state')), {'validated'})
+        self.assertEqual(self.card.balance_amount, 130.0)
+        self.assertEqual(self.card.available_amount, 130.0)
+        self.assertEqual(self.card_2.balance_amount, 700.0)
+
+    def test_02_ledger_insufficient_aggregated_balance(self):
+        """The aggregated amount of a card is checked against its balance."""
+        expenses = self._create_expenses(self.card, [150.0, 150.0])
+
+        with self.assertRaises(ValidationError):
+            expenses.action_validate()
+
+        self.assertEqual(self.card.balance_amount, 250.0)
+        self.assertEqual(set(expenses.mapped('state')), {'draft'})
+
+    def test_03_ledger_pending_amount_reduces_available(self):
+        """Reserved recharges are kept out of the spendable amount."""
+        self.env['fleet.fuel.balance.service'].apply_ledger(pending_deltas={self.card.id: 200.0})
+        expense = self._create_expenses(self.card, [100.0])
+
+        with self.assertRaises(ValidationError):
+            expense.action_validate()
+
+    def test_04_ledger_tracks_balance_changes(self):
+        """The SQL ledger keeps the chatter tracking of the card balance."""
+        expense = self._create_expenses(self.card, [100.0])
+
+        expense.action_validate()
+        self.env.flush_all()
+        self.env.cr.precommit.run()
+
+        tracking = self.card.message_ids.tracking_value_ids.filtered(
+            lambda value: value.field_id.name == 'balance_amount'
+        )
+        self.assertEqual(len(tracking), 1)
+        self.assertEqual((tracking.old_value_float, tracking.new_value_float), (250.0, 150.0))
+        self.assertEqual(self.card.write_uid, self.env.user)
+
+    # -------------------------------------------------------------------------
+    # TEST: CONCURRENT TRANSACTIONS
+    # -------------------------------------------------------------------------
+    def test_10_card_lock_blocks_concurrent_spend(self):
+        """A spend waits for the card lock held by another transaction."""
+        card_id = self._create_committed_card(250.0)
+        cr_a, cr_b = self._new_cursor(), self._new_cursor()
+        env_a = api.Environment(cr_a, SUPERUSER_ID, {})
+        env_b = api.Environment(cr_b, SUPERUSER_ID, {})
+
+        # Transaction A holds the card lock, as an ongoing validation does
+        env_a['fleet.fuel.balance.service']._lock_cards([card_id])
+        cr_b.execute("SET LOCAL lock_timeout = '200ms'")
+        with self.assertRaises(psycopg2.errors.LockNotAvailable):
+            self._spend(env_b, card_id, 100.0)
+        cr_b.rollback()
+
+        # A spends and commits: B then works on the committed balance
+        self._spend(env_a, card_id, 200.0)
+        cr_a.commit()
+        env_b.invalidate_all()
+        with self.assertRaises(ValidationError):
+            self._spend(env_b, card_id, 100.0)
+        cr_b.rollback()
+
+        self.assertEqual(self._get_balance(cr_b, card_id), 50.0)
+
+    def test_11_spends_from_two_transactions_no_lost_update(self):
+        """Deductions committed by two transactions are all kept."""
+        card_id = self._create_committed_card(1000.0)
+        cr_a, cr_b = self._new_cursor(), self._new_cursor()
+        env_a = api.Environment(cr_a, SUPERUSER_ID, {})
+        env_b = api.Environment(cr_b, SUPERUSER_ID, {})
+
+        # Both transactions have read the card before either one spends
+        self.assertEqual(env_a['fleet.fuel.card'].browse(card_id).balance_amount, 1000.0)
+        self.assertEqual(env_b['fleet.fuel.card'].browse(card_id).balance_amount, 1000.0)
+
+        self._spend(env_a, card_id, 100.0)
+        cr_a.commit()
+        # B's snapshot predates A's commit: the locked update is refused
+        # (and retried by the server) instead of overwriting A's deduction
+        with self.assertRaises(psycopg2.errors.SerializationFailure):
+            self._spend(env_b, card_id, 200.0)
+        cr_b.rollback()
+        env_b.invalidate_all()
+        self._spend(env_b, card_id, 200.0)
+        cr_b.commit()
+
+        self.assertEqual(self._get_balance(cr_a, card_id), 700.0)
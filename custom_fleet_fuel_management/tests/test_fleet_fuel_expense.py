@@ -10,12 +10,14 @@ Test coverage:
 - Receipt attachment constraint
 - Price per liter computation
 - Card/vehicle company constraints
+- Import batches claimed by a single worker
 """
 import base64
 import logging
 
-from odoo import fields
+from odoo import SUPERUSER_ID, api, fields
 from odoo.exceptions import UserError, ValidationError
+from odoo.sql_db import db_connect
 from odoo.tests import TransactionCase, tagged
 
 _logger = logging.getLogger(__name__)
@@ -575,3 +577,173 @@ class TestFleetFuelExpense(TransactionCase):
 
         test_card.invalidate_recordset(['balance_amount'])
         self.assertEqual(test_card.balance_amount, 100.0)  # Unchanged
+
+    # -------------------------------------------------------------------------
+    # TEST: STREAMING IMPORT WIZARD
+    # -------------------------------------------------------------------------
+    def _run_import(self, csv_content, chunk_size='2'):
+        """Helper to run the import wizard on CSV content."""
+        self.env['ir.config_parameter'].sudo().set_param('fleet_fuel.import_chunk_size', chunk_size)
+        wizard = self.env['fleet.fuel.expense.import.wizard'].create({
+            'data_file': base64.b64encode(csv_content.encode()),
+            'filename': 'import.csv',
+            'company_id': self.company.id,
+            'auto_validate': True,
+            'run_in_background': False,
+        })
+        wizard.action_import()
+        return self.env['fleet.fuel.expense.batch'].search([], order='id desc', limit=1)
+
+    def test_42_import_wizard_chunked(self):
+        """Test chunked import creates, skips duplicates and logs errors per line."""
+        today = fields.Date.today().isoformat()
+        csv_content = (
+            "card_uid,expense_date,amount,liter_qty,station\n"
+            f"EXPENSE-CARD-001,{today},100,25,Test Fuel Station\n"
+            f"EXPENSE-CARD-001,{today},120,30,\n"
+            f"EXPENSE-CARD-001,{today},100,25,\n"
+            f"UNKNOWN-CARD,{today},80,20,\n"
+            f"EXPENSE-CARD-LOW,{today},500,100,\n"
+        )
+        batch = self._run_import(csv_content)
+
+        self.assertEqual(batch.state, 'error')
+        self.assertEqual(batch.line_ids.mapped('sequence'), [1, 2, 3, 4, 5])
+        states = {line.message.split(' ')[1]: line.state for line in batch.line_ids}
+        self.assertEqual(states, {'2': 'done', '3': 'done', '4': 'skipped', '5': 'error', '6': 'error'})
+
+        expenses = batch.expense_ids
+        self.assertEqual(len(expenses), 3)
+        validated = expenses.filtered(lambda e: e.state == 'validated')
+        self.assertEqual(sorted(validated.mapped('amount')), [100.0, 120.0])
+        self.assertEqual(validated.filtered(lambda e: e.amount == 100.0).station_partner_id, self.station)
+        # Insufficient balance: expense kept in draft, line in error
+        self.assertEqual(expenses.filtered(lambda e: e.card_id == self.card_low_balance).state, 'draft')
+
+    def test_43_import_wizard_existing_hash(self):
+        """Test rows already imported in a previous run are skipped."""
+        today = fields.Date.today().isoformat()
+        csv_content = (
+            "card_uid,expense_date,amount,liter_qty\n"
+            f"EXPENSE-CARD-001,{today},130,30\n"
+        )
+        self._run_import(csv_content)
+        batch = self._run_import(csv_content)
+
+        self.assertEqual(batch.line_ids.state, 'skipped')
+        self.assertTrue(batch.line_ids.expense_id)
+
+    def test_44_import_batch_background_resume(self):
+        """Test queued batches are processed chunk by chunk and resume from their cursor."""
+        self.env['ir.config_parameter'].sudo().set_param('fleet_fuel.import_chunk_size', '1')
+        today = fields.Date.today().isoformat()
+        csv_content = (
+            "card_uid,expense_date,amount,liter_qty\n"
+            f"EXPENSE-CARD-001,{today},101,25\n"
+            f"EXPENSE-CARD-001,{today},102,25\n"
+            f"EXPENSE-CARD-001,{today},103,25\n"
+        )
+        wizard = self.env['fleet.fuel.expense.import.wizard'].create({
+            'data_file': base64.b64encode(csv_content.encode()),
+            'filename': 'import.csv',
+            'company_id': self.company.id,
+        })
+        action = wizard.action_import()
+        batch = self.env['fleet.fuel.expense.batch'].browse(action['res_id'])
+        self.assertEqual(batch.state, 'queued')
+        self.assertEqual(batch.total_rows, 3)
+
+        # Interrupted after the first chunk
+        self.assertFalse(batch._process_import(max_chunks=1))
+        self.assertEqual(batch.state, 'processing')
+        self.assertEqual(batch.cursor_line, 2)
+        self.assertEqual(batch.processed_rows, 1)
+        self.assertAlmostEqual(batch.progress, 100.0 / 3)
+
+        # The worker resumes after the cursor, without re-importing line 2
+        batch.cron_process_import_batches()
+        self.assertEqual(batch.state, 'done')
+        self.assertEqual(batch.cursor_line, 4)
+        self.assertEqual(batch.success_count, 3)
+        self.assertEqual(batch.skipped_count, 0)
+        self.assertEqual(sorted(batch.expense_ids.mapped('amount')), [101.0, 102.0, 103.0])
+        self.assertGreater(batch.rows_per_second, 0.0)
+
+    def test_45_import_batch_claimed_by_another_worker_is_skipped(self):
+        """A batch locked by another transaction is left to that worker."""
+        batch_id = self._create_committed_batch()
+        cr_a, cr_b = self._new_cursor(), self._new_cursor()
+        env_a = api.Environment(cr_a, SUPERUSER_ID, {})
+        env_b = api.Environment(cr_b, SUPERUSER_ID, {})
+
+        # Worker A holds the batch
+        self.assertTrue(env_a['fleet.fuel.expense.batch'].browse(batch_id)._try_claim())
+
+        # Worker B neither waits for it nor processes it
+        batch_b = env_b['fleet.fuel.expense.batch'].browse(batch_id)
+        self.assertFalse(batch_b._try_claim())
+        self.assertFalse(batch_b._process_import())
+        env_b['fleet.fuel.expense.batch'].cron_process_import_batches()
+        self.assertEqual(batch_b.state, 'queued')
+        self.assertFalse(batch_b.line_ids)
+        cr_b.rollback()
+
+        # Once A is done, the batch can be claimed again
+        cr_a.rollback()
+        self.assertTrue(batch_b._try_claim())
+        cr_b.rollback()
+
+    def test_46_import_batch_committed_since_snapshot_is_skipped(self):
+        """A batch changed by another worker after the snapshot is skipped without aborting the run."""
+        batch_id = self._create_committed_batch()
+        cr_a, cr_b = self._new_cursor(), self._new_cursor()
+        env_a = api.Environment(cr_a, SUPERUSER_ID, {})
+        env_b = api.Environment(cr_b, SUPERUSER_ID, {})
+
+        # Worker B has read the batch (its snapshot), then A processes and commits it
+        batch_b = env_b['fleet.fuel.expense.batch'].browse(batch_id)
+        self.assertEqual(batch_b.state, 'queued')
+        env_a['fleet.fuel.expense.batch'].browse(batch_id).write({'state': 'processing'})
+        cr_a.commit()
+
+        # The serialization failure is contained: B goes on with its transaction
+        self.assertFalse(batch_b._try_claim())
+        cr_b.execute("SELECT 1")
+        env_b['fleet.fuel.expense.batch'].cron_process_import_batches()
+        self.assertFalse(batch_b.line_ids)
+        cr_b.rollback()
+
+    def _new_cursor(self):
+        """Open a real database cursor, independent from the test transaction."""
+        cr = db_connect(self.cr.dbname).cursor()
+        self.addCleanup(cr.close)
+        return cr
+
+    def _create_committed_batch(self):
+        """Create and commit a queued batch visible to other cursors.
+
+        Returns:
+            int: batch id
+        """
+        today = fields.Date.today().isoformat()
+        csv_content = (
+            "card_uid,expense_date,amount,liter_qty\n"
+            f"EXPENSE-CARD-001,{today},101,25\n"
+        )
+        with db_connect(self.cr.dbname).cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            batch_id = env['fleet.fuel.expense.batch'].create({
+                'name': 'Lot verrouillé',
+                'data_file': base64.b64encode(csv_content.encode()),
+                'import_filename': 'import.csv',
+                'company_id': self.company.id,
+                'state': 'queued',
+            }).id
+            cr.commit()
+        self.addCleanup(self._delete_committed_batch, batch_id)
+        return batch_id
+
+    def _delete_committed_batch(self, batch_id):
+        with db_connect(self.cr.dbname).cursor() as cr:
+            api.Environment(cr, SUPERUSER_ID, {})['fleet.fuel.expense.batch'].browse(batch_id).unlink()
+            cr.commit()
@@ -697,3 +697,325 @@ class TestFleetFuelSummary(TransactionCase):
         )
 
         self.assertEqual(summary.notes, '<p>Monthly fuel consumption analysis</p>')
+
+    # -------------------------------------------------------------------------
+    # TEST: BULK SUMMARY GENERATION
+    # -------------------------------------------------------------------------
+    def test_53_kpi_service_bulk_generation_totals(self):
+        """Bulk generation stores the same totals as the per-record compute."""
+        self._create_validated_expense(amount=200.0, liter_qty=50.0, odometer=1000.0)
+        self._create_validated_expense(amount=300.0, liter_qty=75.0, odometer=1400.0)
+        self._create_validated_expense(card=self.card_2, vehicle=self.vehicle_2, amount=120.0, liter_qty=30.0)
+        self._create_posted_recharge(amount=500.0)
+
+        summaries = self.KPIService.generate_monthly_summaries(
+            period_start=self.period_start,
+            period_end=self.period_end,
+            company_id=self.company.id,
+            bulk=True,
+        )
+
+        self.assertEqual(len(summaries), 2)
+        summary = summaries.filtered(lambda s: s.card_id == self.card)
+        self.assertEqual(summary.total_amount, 500.0)
+        self.assertEqual(summary.total_liter, 125.0)
+        self.assertEqual(summary.expense_count, 2)
+        self.assertEqual(summary.total_recharge_amount, 500.0)
+        self.assertEqual(summary.recharge_count, 1)
+        self.assertEqual(summary.driver_id, self.driver)
+        self.assertEqual(summary.odometer_start, 1000.0)
+        self.assertEqual(summary.odometer_end, 1400.0)
+        self.assertEqual(summary.distance_traveled, 400.0)
+
+    def test_54_kpi_service_bulk_generation_existing(self):
+        """Bulk generation keeps existing summaries unless force is set."""
+        existing = self._create_summary()
+        self._create_validated_expense(amount=200.0, liter_qty=50.0)
+
+        summaries = self.KPIService.generate_monthly_summaries(
+            period_start=self.period_start,
+            period_end=self.period_end,
+            company_id=self.company.id,
+            bulk=True,
+        )
+        self.assertEqual(summaries, existing)
+
+        existing.write({'total_amount': 0.0})
+        summaries = self.KPIService.generate_monthly_summaries(
+            period_start=self.period_start,
+            period_end=self.period_end,
+            company_id=self.company.id,
+            force=True,
+            bulk=True,
+        )
+        self.assertEqual(summaries, existing)
+        self.assertEqual(existing.total_amount, 200.0)
+        self.assertEqual(existing.expense_count, 1)
+
+    # -------------------------------------------------------------------------
+    # TEST: BATCH COMPUTE QUERY COUNT
+    # -------------------------------------------------------------------------
+    def _count_totals_compute_queries(self, summaries):
+        """Return the number of SQL queries of one totals/linked records compute."""
+        total_fields = [
+            self.Summary._fields[fname]
+            for fname in ('total_amount', 'total_liter', 'expense_count',
+                          'total_recharge_amount', 'recharge_count')
+        ]
+        self.env.invalidate_all()
+        count_before = self.cr.sql_log_count
+        with self.env.protecting(total_fields, summaries):
+            summaries._compute_consumption_totals()
+        summaries._compute_linked_records()
+        return self.cr.sql_log_count - count_before
+
+    def test_55_summary_batch_compute_query_count(self):
+        """Batch computes issue a constant number of queries (1/10/100 summaries)."""
+        vehicles = self.env['fleet.vehicle'].create([
+            {
+                'model_id': self.vehicle_model.id,
+                'license_plate': f'SUMMARY-BATCH-{index:03d}',
+                'company_id': self.company.id,
+            }
+            for index in range(100)
+        ])
+        self._create_validated_expense(amount=200.0, liter_qty=50.0)
+        self._create_posted_recharge(amount=500.0)
+        summaries = self.Summary.create([
+            {
+                'period_start': self.period_start,
+                'period_end': self.period_end,
+                'vehicle_id': vehicle.id,
+                'company_id': self.company.id,
+            }
+            for vehicle in self.vehicle | vehicles[:99]
+        ])
+
+        query_counts = [
+            self._count_totals_compute_queries(summaries[:size])
+            for size in (1, 10, 100)
+        ]
+        _logger.info("Summary batch compute query counts (1/10/100): %s", query_counts)
+        self.assertEqual(len(set(query_counts)), 1, "Query count must not grow with the batch size")
+
+        summary = summaries.filtered(lambda s: s.vehicle_id == self.vehicle)
+        self.assertEqual(summary.total_amount, 200.0)
+        self.assertEqual(summary.expense_count, 1)
+        self.assertEqual(len(summary.expense_ids), 1)
+        # Summaries without card cover every recharge of the company
+        self.assertGreaterEqual(summary.total_recharge_amount, 500.0)
+        self.assertEqual(len(summary.recharge_ids), summary.recharge_count)
+
+    # -------------------------------------------------------------------------
+    # TEST: INCREMENTAL DELTAS
+    # -------------------------------------------------------------------------
+    def test_56_summary_incremental_expense_delta(self):
+        """Validating an expense updates the open summaries in place."""
+        summary = self._create_summary(budget_amount=100.0)
+        self.assertEqual(summary.total_amount, 0.0)
+
+        self._create_validated_expense(amount=200.0, liter_qty=50.0)
+
+        self.assertEqual(summary.total_amount, 200.0)
+        self.assertEqual(summary.total_liter, 50.0)
+        self.assertEqual(summary.expense_count, 1)
+        # Dependent KPIs follow the incremented totals
+        self.assertEqual(summary.avg_price_per_liter, 4.0)
+        self.assertEqual(summary.budget_variance, 100.0)
+        self.assertFalse(summary._check_consumption_totals())
+
+    def test_57_summary_incremental_recharge_delta(self):
+        """Posting a recharge updates the open summaries of the card."""
+        summary = self._create_summary()
+        other_summary = self._create_summary(vehicle=self.vehicle_2, card=self.card_2)
+
+        self._create_posted_recharge(amount=500.0)
+
+        self.assertEqual(summary.total_recharge_amount, 500.0)
+        self.assertEqual(summary.recharge_count, 1)
+        self.assertEqual(other_summary.total_recharge_amount, 0.0)
+
+    def test_58_summary_closed_not_incremented(self):
+        """Closed summaries are not touched by incremental deltas."""
+        summary = self._create_summary()
+        summary.action_confirm()
+        summary.action_close()
+
+        self._create_validated_expense(amount=200.0, liter_qty=50.0)
+
+        self.assertEqual(summary.total_amount, 0.0)
+
+    def test_59_summary_consistency_checker(self):
+        """The consistency checker reports and fixes drifting totals."""
+        self._create_validated_expense(amount=200.0, liter_qty=50.0)
+        summary = self._create_summary()
+        summary.write({'total_amount': 999.0})
+
+        differences = summary._check_consumption_totals()
+        self.assertEqual(differences, {summary: {'total_amount': (999.0, 200.0)}})
+
+        summary.action_recalculate()
+        self.assertEqual(summary.total_amount, 200.0)
+        self.assertFalse(summary._check_consumption_totals())
+
+    # -------------------------------------------------------------------------
+    # TEST: CACHED ANALYTICS
+    # -------------------------------------------------------------------------
+    def test_60_kpi_service_trend_series(self):
+        """Trend series are dense, per vehicle, and follow new validations."""
+        self._create_validated_expense(amount=200.0, liter_qty=50.0)
+        self._create_validated_expense(card=self.card_2, vehicle=self.vehicle_2, amount=80.0, liter_qty=20.0)
+
+        series = self.KPIService.get_trend_series(
+            months=3,
+            vehicle_ids=[self.vehicle.id, self.vehicle_2.id],
+            company_id=self.company.id,
+            group_by='vehicle_id',
+        )
+        self.assertEqual(set(series), {self.vehicle.id, self.vehicle_2.id})
+        self.assertEqual(len(series[self.vehicle.id]), 3)
+        self.assertEqual(series[self.vehicle.id][-1]['total_amount'], 200.0)
+        self.assertEqual(series[self.vehicle.id][0]['total_amount'], 0.0)
+        self.assertEqual(series[self.vehicle_2.id][-1]['total_liters'], 20.0)
+
+        # Validating a new expense invalidates the cached series
+        self._create_validated_expense(amount=100.0, liter_qty=25.0)
+        trend = self.KPIService.get_monthly_trend(vehicle_id=self.vehicle.id, months=3, company_id=self.company.id)
+        self.assertEqual(trend[-1]['total_amount'], 300.0)
+        self.assertEqual(trend[-1]['month'], self.today.strftime('%Y-%m'))
+
+    def test_61_kpi_service_cached_stats_invalidation(self):
+        """Consumption stats are served from cache until validated expenses change."""
+        expense = self._create_validated_expense(amount=200.0, liter_qty=50.0)
+        stats = self.KPIService.get_consumption_stats(vehicle_id=self.vehicle.id, company_id=self.company.id)
+        self.assertEqual(stats['expense_count'], 1)
+
+        with self.assertQueryCount(1):
+            self.KPIService.get_consumption_stats(vehicle_id=self.vehicle.id, company_id=self.company.id)
+
+        self._create_validated_expense(amount=100.0, liter_qty=25.0)
+        stats = self.KPIService.get_consumption_stats(vehicle_id=self.vehicle.id, company_id=self.company.id)
+        self.assertEqual(stats['total_amount'], 300.0)
+        self.assertEqual(stats['expense_count'], 2)
+
+        # Editing a validated expense (same count, same transaction) also invalidates
+        expense.amount = 150.0
+        stats = self.KPIService.get_consumption_stats(vehicle_id=self.vehicle.id, company_id=self.company.id)
+        self.assertEqual(stats['total_amount'], 250.0)
+
+    def test_62_kpi_daily_refreshed_on_validation(self):
+        """Validated expenses are aggregated per vehicle/card/day."""
+        KPIDaily = self.env['fleet.fuel.kpi.daily']
+        expense = self._create_validated_expense(amount=100.0, liter_qty=25.0, odometer=10000.0)
+        self._create_validated_expense(amount=50.0, liter_qty=10.0, odometer=10200.0)
+        draft = self.Expense.create({
+            'card_id': self.card.id,
+            'vehicle_id': self.vehicle.id,
+            'amount': 80.0,
+            'liter_qty': 20.0,
+            'expense_date': self.today,
+            'company_id': self.company.id,
+        })
+
+        row = KPIDaily.search([('vehicle_id', '=', self.vehicle.id), ('day', '=', self.today)])
+        self.assertEqual(len(row), 1)
+        self.assertEqual(row.total_amount, 150.0)
+        self.assertEqual(row.total_liter, 35.0)
+        self.assertEqual(row.expense_count, 2)
+        self.assertEqual((row.odometer_min, row.odometer_max), (10000.0, 10200.0))
+
+        # Editing a validated expense moves it to its new day
+        yesterday = self.today - timedelta(days=1)
+        expense.expense_date = yesterday
+        rows = KPIDaily.search([('vehicle_id', '=', self.vehicle.id)])
+        self.assertEqual(sorted(rows.mapped('total_amount')), [50.0, 100.0])
+
+        # Writes bypassing the ORM are caught up by the cron
+        draft.flush_recordset()
+        self.env.cr.execute("UPDATE fleet_fuel_expense SET state = 'validated' WHERE id = %s", [draft.id])
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fleet_fuel.kpi_daily_refreshed_at', fields.Datetime.to_string(yesterday))
+        KPIDaily.cron_refresh_kpi_daily()
+        row = KPIDaily.search([('vehicle_id', '=', self.vehicle.id), ('day', '=', self.today)])
+        self.assertEqual(row.total_amount, 130.0)
+        self.assertEqual(row.expense_count, 2)
+
+    def test_63_alert_digest_queued_once(self):
+        """Alerts are grouped in one queued digest per recipient, then deduplicated."""
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fleet_fuel.variance_threshold_pct', '10.0'
+        )
+        manager = self.env['res.users'].create({
+            'name': 'Fuel Alert Manager',
+            'login': 'fuel_alert_manager',
+            'email': 'fuel.alert.manager@example.com',
+            'company_id': self.company.id,
+            'company_ids': [(6, 0, [self.company.id])],
+            'group_ids': [(4, self.env.ref('custom_fleet_fuel_management.group_fleet_fuel_manager').id)],
+        })
+        self._create_validated_expense(amount=1300.0, liter_qty=325.0)
+        self._create_validated_expense(card=self.card_2, vehicle=self.vehicle_2, amount=1150.0, liter_qty=300.0)
+        summaries = self._create_summary(budget_amount=1000.0)
+        summaries |= self._create_summary(vehicle=self.vehicle_2, card=self.card_2, budget_amount=1000.0)
+        self.assertEqual(set(summaries.mapped('alert_level')), {'warning', 'critical'})
+
+        mails = self.KPIService.send_alert_notifications()
+        digest = mails.filtered(lambda mail: manager.partner_id in mail.recipient_ids)
+        self.assertEqual(len(digest), 1)
+        self.assertEqual(digest.state, 'outgoing')
+        self.assertIn(self.vehicle.name, digest.body_html)
+        self.assertIn(self.vehicle_2.name, digest.body_html)
+        self.assertEqual(summaries.mapped('alert_notified_level'), summaries.mapped('alert_level'))
+
+        # Same levels: nothing is sent again
+        mails = self.KPIService.send_alert_notifications()
+        self.assertFalse(mails.filtered(lambda mail: manager.partner_id in mail.recipient_ids))
+
+    def test_64_alert_renotified_after_returning_to_ok(self):
+        """A summary going warning -> ok -> warning is notified twice."""
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fleet_fuel.variance_threshold_pct', '10.0'
+        )
+        manager = self.env['res.users'].create({
+            'name': 'Fuel Alert Manager',
+            'login': 'fuel_alert_manager',
+            'email': 'fuel.alert.manager@example.com',
+            'company_id': self.company.id,
+            'company_ids': [(6, 0, [self.company.id])],
+            'group_ids': [(4, self.env.ref('custom_fleet_fuel_management.group_fleet_fuel_manager').id)],
+        })
+        self._create_validated_expense(amount=1150.0, liter_qty=300.0)
+        summary = self._create_summary(budget_amount=1000.0)
+        self.assertEqual(summary.alert_level, 'warning')
+
+        mails = self.KPIService.send_alert_notifications()
+        self.assertTrue(mails.filtered(lambda mail: manager.partner_id in mail.recipient_ids))
+        self.assertEqual(summary.alert_notified_level, 'warning')
+
+        # Back to OK: the notified level is forgotten
+        summary.budget_amount = 1150.0
+        self.assertEqual(summary.alert_level, 'ok')
+        self.assertFalse(summary.alert_notified_level)
+
+        # Warning again: a new digest is queued
+        summary.budget_amount = 1000.0
+        self.assertEqual(summary.alert_level, 'warning')
+        mails = self.KPIService.send_alert_notifications()
+        self.assertTrue(mails.filtered(lambda mail: manager.partner_id in mail.recipient_ids))
+        self.assertEqual(summary.alert_notified_level, 'warning')
+
+    def test_65_summary_incremental_delta_tracked(self):
+        """The SQL increment keeps the chatter tracking of the total amount."""
+        summary = self._create_summary(budget_amount=100.0)
+        self.env.flush_all()
+        self.env.cr.precommit.run()
+
+        self._create_validated_expense(amount=200.0, liter_qty=50.0)
+        self.env.flush_all()
+        self.env.cr.precommit.run()
+
+        tracking = summary.message_ids.tracking_value_ids.filtered(
+            lambda value: value.field_id.name == 'total_amount'
+        )
+        self.assertEqual(len(tracking), 1)
+        self.assertEqual((tracking.old_value_float, tracking.new_value_float), (0.0, 200.0))
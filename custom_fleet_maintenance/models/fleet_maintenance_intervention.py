@@ -57,7 +57,7 @@ class FleetMaintenanceIntervention(models.Model):
         required=True,
         default=lambda self: self.env.company,
     )
-    plan_line_id = fields.Many2one("fleet.maintenance.plan.line", string="Plan preventif")
+    plan_line_id = fields.Many2one("fleet.maintenance.plan.line", string="Plan preventif", index=True)
     request_date = fields.Datetime(string="Date de demande", default=fields.Datetime.now)
     scheduled_start = fields.Datetime(string="Debut planifie")
     scheduled_end = fields.Datetime(string="Fin planifiee")
@@ -119,55 +119,70 @@ class FleetMaintenancePlan(models.Model):
         
         Crée des interventions pour les lignes de plan dont la date ou
         le kilométrage seuil est atteint, et envoie des notifications.
+        Les lignes échues sont sélectionnées en SQL (voir
+        fleet.maintenance.plan.line._get_due_lines) au lieu d'être
+        parcourues une à une.
         """
-        plan_line_model = self.env["fleet.maintenance.plan.line"].sudo()
         config = self.env["ir.config_parameter"].sudo()
         alert_offset = int(config.get_param("custom_fleet_maintenance.alert_offset_days", 30))
         today = fields.Date.context_today(self)
         alert_date = today + timedelta(days=alert_offset)
         
-        domain = [
-            ("plan_id.active", "=", True),
-            ("vehicle_id", "!=", False),
-            "|",
-            ("next_due_date", "!=", False),
-            ("next_due_odometer", "!=", False),
-        ]
-        candidate_lines = plan_line_model.search(domain)
-        
+        interventions = self._generate_preventive_interventions(alert_date=alert_date)
         _logger.info(
-            "Checking %d plan lines for preventive intervention generation (J+%d)",
-            len(candidate_lines), alert_offset
+            "Preventive intervention generation completed (J+%d): %d interventions created",
+            alert_offset, len(interventions)
         )
+
+    @api.model
+    def _generate_preventive_interventions(self, alert_date=None, vehicle_ids=None):
+        """
+        Crée les interventions préventives des lignes échues, en un seul create.
         
-        created_count = 0
-        for line in candidate_lines:
-            if line._has_open_preventive_intervention():
-                continue
-            
-            should_create = False
-            trigger_reason = ""
-            
-            if line.next_due_date and line.next_due_date <= alert_date:
-                should_create = True
-                trigger_reason = _("date seuil atteinte (%s)") % line.next_due_date.strftime('%d/%m/%Y')
-            elif line.next_due_odometer and line.vehicle_id.km_actuel and line.vehicle_id.km_actuel >= line.next_due_odometer:
-                should_create = True
-                trigger_reason = _("kilométrage seuil atteint (%d km)") % line.vehicle_id.km_actuel
+        Args:
+            alert_date: seuil des déclenchements par date (aucun si None)
+            vehicle_ids: limite l'évaluation aux lignes de ces véhicules
             
-            if should_create:
+        Returns:
+            fleet.maintenance.intervention recordset créé
+        """
+        plan_line_model = self.env["fleet.maintenance.plan.line"].sudo()
+        Intervention = self.env["fleet.maintenance.intervention"].sudo()
+        due = plan_line_model._get_due_lines(alert_date=alert_date, vehicle_ids=vehicle_ids)
+        if not due:
+            return Intervention
+        
+        lines = plan_line_model.browse([line_id for line_id, __ in due])
+        trigger_reasons = {}
+        for line, (__, trigger) in zip(lines, due):
+            if trigger == "date":
+                trigger_reasons[line] = _("date seuil atteinte (%s)") % line.next_due_date.strftime('%d/%m/%Y')
+            else:
+                trigger_reasons[line] = _("kilométrage seuil atteint (%d km)") % line.vehicle_id.km_actuel
+        
+        try:
+            with self.env.cr.savepoint():
+                interventions = Intervention.create([line._prepare_intervention_vals() for line in lines])
+                created = list(zip(lines, interventions))
+                for line, intervention in created:
+                    line._link_preventive_intervention(intervention)
+        except Exception as e:
+            _logger.error("Batch creation of %d preventive interventions failed, retrying line by line: %s", len(lines), str(e))
+            created = []
+            for line in lines:
                 try:
-                    intervention = line._create_preventive_intervention()
-                    if intervention:
-                        line._notify_preventive_creation(intervention, trigger_reason)
-                        created_count += 1
+                    with self.env.cr.savepoint():
+                        created.append((line, line._create_preventive_intervention()))
                 except Exception as e:
                     _logger.error(
                         "Error creating preventive intervention for plan line %s (vehicle: %s): %s",
                         line.plan_id.name, line.vehicle_id.name, str(e)
                     )
         
-        _logger.info("Preventive intervention generation completed: %d interventions created", created_count)
+        maintenance_managers = plan_line_model._get_maintenance_managers()
+        for line, intervention in created:
+            line._notify_preventive_creation(intervention, trigger_reasons[line], maintenance_managers)
+        return Intervention.browse([intervention.id for __, intervention in created])
 
 
 class FleetMaintenancePlanLine(models.Model):
@@ -177,9 +192,9 @@ class FleetMaintenancePlanLine(models.Model):
 
     plan_id = fields.Many2one("fleet.maintenance.plan", required=True, ondelete="cascade")
     company_id = fields.Many2one(related="plan_id.company_id", store=True, readonly=True)
-    vehicle_id = fields.Many2one("fleet.vehicle", string="Véhicule", required=True)
+    vehicle_id = fields.Many2one("fleet.vehicle", string="Véhicule", required=True, index=True)
     responsible_id = fields.Many2one("res.users", string="Responsable")
-    next_due_date = fields.Date(string="Prochaine date due")
+    next_due_date = fields.Date(string="Prochaine date due", index=True)
     next_due_odometer = fields.Float(string="Prochain kilométrage")
     last_execution_id = fields.Many2one("fleet.maintenance.intervention", string="Dernière intervention")
     active = fields.Boolean(default=True)
@@ -217,25 +232,71 @@ class FleetMaintenancePlanLine(models.Model):
                 state = "due"
             line.state = state
 
-    def _has_open_preventive_intervention(self):
-        self.ensure_one()
-        return bool(
-            self.env["fleet.maintenance.intervention"].search_count(
-                [
-                    ("plan_line_id", "=", self.id),
-                    ("state", "not in", ["done", "cancelled"]),
-                ],
-                limit=1,
+    @api.model
+    def _get_due_lines(self, alert_date=None, vehicle_ids=None):
+        """
+        Index des lignes échues sans intervention préventive ouverte.
+        
+        - déclenchement par date: une plage sur next_due_date (indexé),
+          seulement si alert_date est fourni;
+        - déclenchement kilométrique: une jointure avec le kilométrage
+          actuel des véhicules;
+        - les lignes ayant une intervention ouverte sont exclues par
+          anti-jointure.
+        Une ligne échue des deux façons est rattachée à la date.
+        
+        Returns:
+            list: [(id ligne, 'date' | 'odometer'), ...] par id croissant
+        """
+        self.flush_model(["plan_id", "vehicle_id", "next_due_date", "next_due_odometer", "active"])
+        self.env["fleet.maintenance.plan"].flush_model(["active"])
+        self.env["fleet.vehicle"].flush_model(["km_actuel"])
+        self.env["fleet.maintenance.intervention"].flush_model(["plan_line_id", "state"])
+        
+        params = {"alert_date": alert_date, "vehicle_ids": tuple(vehicle_ids or ()) or (0,)}
+        vehicle_filter = "AND l.vehicle_id IN %(vehicle_ids)s" if vehicle_ids is not None else ""
+        date_query = f"""
+            SELECT l.id, 'date' AS reason, 1 AS priority
+              FROM fleet_maintenance_plan_line l
+             WHERE l.active AND l.next_due_date <= %(alert_date)s {vehicle_filter}
+            UNION ALL
+        """ if alert_date else ""
+        self.env.cr.execute(f"""
+            WITH due AS (
+                {date_query}
+                SELECT l.id, 'odometer' AS reason, 2 AS priority
+                  FROM fleet_maintenance_plan_line l
+                  JOIN fleet_vehicle v ON v.id = l.vehicle_id
+                 WHERE l.active AND l.next_due_odometer <> 0
+                   AND v.km_actuel > 0 AND v.km_actuel >= l.next_due_odometer {vehicle_filter}
             )
-        )
+            SELECT DISTINCT ON (due.id) due.id, due.reason
+              FROM due
+              JOIN fleet_maintenance_plan_line l ON l.id = due.id
+              JOIN fleet_maintenance_plan p ON p.id = l.plan_id
+             WHERE p.active
+               AND NOT EXISTS (
+                   SELECT 1
+                     FROM fleet_maintenance_intervention i
+                    WHERE i.plan_line_id = due.id
+                      AND i.state NOT IN ('done', 'cancelled')
+               )
+             ORDER BY due.id, due.priority
+        """, params)
+        return self.env.cr.fetchall()
 
     def _create_preventive_intervention(self):
         self.ensure_one()
         vals = self._prepare_intervention_vals()
         intervention = self.env["fleet.maintenance.intervention"].sudo().create(vals)
+        self._link_preventive_intervention(intervention)
+        return intervention
+
+    def _link_preventive_intervention(self, intervention):
+        """Rattache l'intervention créée à la ligne et avance le prochain seuil."""
+        self.ensure_one()
         self.last_execution_id = intervention
         self._compute_next_threshold()
-        return intervention
 
     def _prepare_intervention_vals(self):
         self.ensure_one()
@@ -271,27 +332,33 @@ class FleetMaintenancePlanLine(models.Model):
         if self.plan_id.odometer_interval:
             self.next_due_odometer = (self.next_due_odometer or self.vehicle_id.km_actuel or 0.0) + self.plan_id.odometer_interval
     
-    def _notify_preventive_creation(self, intervention, trigger_reason):
+    @api.model
+    def _get_maintenance_managers(self):
+        manager_group = self.env.ref(
+            'custom_fleet_maintenance.group_fleet_maintenance_manager',
+            raise_if_not_found=False
+        )
+        if not manager_group:
+            return self.env['res.users']
+        return self.env['res.users'].search([
+            ('group_ids', 'in', manager_group.ids),
+            ('active', '=', True),
+        ])
+
+    def _notify_preventive_creation(self, intervention, trigger_reason, maintenance_managers=None):
         """
         Send notifications when a preventive intervention is auto-created.
         
         Args:
             intervention: The created fleet.maintenance.intervention record
             trigger_reason: Description of why the intervention was triggered
+            maintenance_managers: res.users to notify (searched when not given)
         """
         self.ensure_one()
         
         # Get maintenance managers
-        manager_group = self.env.ref(
-            'custom_fleet_maintenance.group_fleet_maintenance_manager',
-            raise_if_not_found=False
-        )
-        maintenance_managers = self.env['res.users']
-        if manager_group:
-            maintenance_managers = self.env['res.users'].search([
-                ('group_ids', 'in', manager_group.ids),
-                ('active', '=', True),
-            ])
+        if maintenance_managers is None:
+            maintenance_managers = self._get_maintenance_managers()
         
         # Get intervention type label
         type_labels = dict(self.plan_id._fields['preventive_intervention_type'].selection)
@@ -5,61 +5,108 @@ from odoo.exceptions import ValidationError
 class FleetVehicle(models.Model):
     _inherit = "fleet.vehicle"
 
-    # Field to check if vehicle is on mission (for button visibility)
-    # This field may also be defined in custom_fleet_management if installed
+    # Availability flags, also defined in custom_fleet_management when installed:
+    # both modules share _compute_is_available and extend _get_availability_data
     is_on_mission = fields.Boolean(
         string="En mission",
-        compute="_compute_is_on_mission",
-        store=False,
+        compute="_compute_is_available",
+        search="_search_is_on_mission",
         help="Indique si le vehicule est actuellement en mission.",
     )
 
-    @api.depends_context('uid')
-    def _compute_is_on_mission(self):
-        """Check if vehicle has active missions. Safe fallback if fleet.mission doesn't exist."""
-        for vehicle in self:
-            vehicle.is_on_mission = False
-            # Check if fleet.mission model exists (custom_fleet_management installed)
-            if 'fleet.mission' in self.env:
-                active_mission = self.env['fleet.mission'].search([
-                    ('vehicle_id', '=', vehicle.id),
-                    ('state', 'in', ['confirmed', 'in_progress']),
-                ], limit=1)
-                vehicle.is_on_mission = bool(active_mission)
-
-    # Add is_available field for this module (may be overridden if custom_fleet_management is installed)
     is_available = fields.Boolean(
         string='Disponible',
         compute='_compute_is_available',
-        store=True,
+        search='_search_is_available',
         help="Indique si le véhicule est disponible (pas en mission ni en maintenance)"
     )
 
-    @api.depends('maintenance_state', 'maintenance_history_ids.state')
+    @api.depends('active', 'maintenance_state', 'maintenance_history_ids.state')
     def _compute_is_available(self):
         """
-        Compute vehicle availability based on maintenance state.
-        If custom_fleet_management is installed, this extends its logic.
+        Compute availability flags for the whole recordset from
+        _get_availability_data (one grouped query per module).
         """
+        availability = self._get_availability_data()
+        has_current_mission = 'current_mission_id' in self._fields
         for vehicle in self:
-            # Check if super() method exists (custom_fleet_management installed)
-            # and call it first
-            if hasattr(super(FleetVehicle, vehicle), '_compute_is_available'):
-                super(FleetVehicle, vehicle)._compute_is_available()
-            else:
-                # Default: vehicle is available if active
-                vehicle.is_available = vehicle.active if hasattr(vehicle, 'active') else True
-            
-            # Additional check: if maintenance_state is not operational, vehicle is not available
-            if vehicle.maintenance_state != 'operational':
-                vehicle.is_available = False
-            
-            # Also check for any in-progress interventions (submitted doesn't block vehicle)
-            in_progress_interventions = vehicle.maintenance_history_ids.filtered(
-                lambda i: i.state == 'in_progress'
-            )
-            if in_progress_interventions:
-                vehicle.is_available = False
+            data = availability[vehicle._origin.id]
+            vehicle.is_available = data['is_available']
+            vehicle.is_on_mission = data['is_on_mission']
+            if has_current_mission:
+                vehicle.current_mission_id = data['current_mission_id']
+
+    def _get_availability_data(self):
+        """
+        Extend availability with maintenance: a vehicle which is not
+        operational or has an in-progress intervention (submitted doesn't
+        block it) is not available. One grouped query on interventions.
+        """
+        parent = super()
+        if hasattr(parent, '_get_availability_data'):
+            availability = parent._get_availability_data()
+        else:
+            availability = {
+                vehicle._origin.id: {
+                    'is_available': vehicle.active,
+                    'is_on_mission': False,
+                    'current_mission_id': False,
+                }
+                for vehicle in self
+            }
+
+        busy_ids = set()
+        vehicle_ids = tuple(self._origin.ids)
+        if vehicle_ids:
+            self.env["fleet.maintenance.intervention"].flush_model(["vehicle_id", "state"])
+            self.env.cr.execute("""
+                SELECT vehicle_id
+                  FROM fleet_maintenance_intervention
+                 WHERE vehicle_id IN %s AND state = 'in_progress'
+                 GROUP BY vehicle_id
+            """, [vehicle_ids])
+            busy_ids = {row[0] for row in self.env.cr.fetchall()}
+        for vehicle in self:
+            if vehicle.maintenance_state != 'operational' or vehicle._origin.id in busy_ids:
+                availability[vehicle._origin.id]['is_available'] = False
+        return availability
+
+    @api.model
+    def _get_unavailable_vehicle_ids(self):
+        """Ids of vehicles made unavailable by maintenance (same rule as _get_availability_data)."""
+        parent = super()
+        unavailable_ids = set(parent._get_unavailable_vehicle_ids()) if hasattr(parent, '_get_unavailable_vehicle_ids') else set()
+        self.flush_model(['maintenance_state'])
+        self.env["fleet.maintenance.intervention"].flush_model(["vehicle_id", "state"])
+        self.env.cr.execute("""
+            SELECT id FROM fleet_vehicle WHERE maintenance_state IS DISTINCT FROM 'operational'
+            UNION
+            SELECT vehicle_id FROM fleet_maintenance_intervention
+             WHERE state = 'in_progress' AND vehicle_id IS NOT NULL
+        """)
+        unavailable_ids.update(row[0] for row in self.env.cr.fetchall())
+        return unavailable_ids
+
+    def _search_is_available(self, operator, value):
+        """Search vehicles by availability without loading missions or interventions."""
+        if operator not in ('=', '!='):
+            raise ValueError("Unsupported operator for is_available search")
+
+        unavailable_ids = list(self._get_unavailable_vehicle_ids())
+        if (operator == '=' and value) or (operator == '!=' and not value):
+            return [('active', '=', True), ('id', 'not in', unavailable_ids)]
+        return ['|', ('active', '=', False), ('id', 'in', unavailable_ids)]
+
+    def _search_is_on_mission(self, operator, value):
+        """Search vehicles on mission; none without custom_fleet_management."""
+        parent = super()
+        if hasattr(parent, '_search_is_on_mission'):
+            return parent._search_is_on_mission(operator, value)
+        if operator not in ('=', '!='):
+            raise ValueError("Unsupported operator for is_on_mission search")
+        if (operator == '=' and value) or (operator == '!=' and not value):
+            return [('id', 'in', [])]
+        return [('id', 'not in', [])]
 
     maintenance_state = fields.Selection(
         selection=[
@@ -147,6 +194,13 @@ class FleetVehicle(models.Model):
             vehicle.active_intervention_count = active_counters.get(vehicle.id, 0)
             vehicle.preventive_intervention_count = preventive_counters.get(vehicle.id, 0)
 
+    def write(self, vals):
+        res = super().write(vals)
+        if "km_actuel" in vals:
+            # Evaluate the odometer-triggered plan lines of these vehicles right away
+            self.env["fleet.maintenance.plan"].sudo()._generate_preventive_interventions(vehicle_ids=self.ids)
+        return res
+
     @api.constrains("km_actuel")
     def _check_km_actuel(self):
         for vehicle in self:
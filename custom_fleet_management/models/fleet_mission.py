@@ -1,11 +1,26 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
+import logging
 from datetime import date, datetime
 
+import psycopg2
 from dateutil.relativedelta import relativedelta
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import sql
+
+_logger = logging.getLogger(__name__)
+
+# États dans lesquels une mission occupe son véhicule et son conducteur
+CONFLICT_STATES_SQL = "('submitted', 'approved', 'in_progress')"
+# Période d'une mission: intervalle [début, fin[
+MISSION_PERIOD_SQL = "tsrange(date_start, date_end, '[)')"
+# Contraintes d'exclusion optionnelles (paramètre fleet.mission_exclusion_constraints)
+MISSION_EXCLUSION_CONSTRAINTS = {
+    'fleet_mission_vehicle_no_overlap': 'vehicle_id',
+    'fleet_mission_driver_no_overlap': 'driver_id',
+}
 
 
 class FleetMission(models.Model):
@@ -317,37 +332,157 @@ class FleetMission(models.Model):
         Un conflit existe si:
         - Le véhicule est déjà affecté sur une période qui chevauche
         - Le conducteur a déjà une mission sur une période qui chevauche
+        
+        Une seule requête pour tout le recordset (voir _get_conflicts).
         """
+        conflicts_by_mission = self._get_conflicts()
+        others = self.browse({
+            other_id for conflicts in conflicts_by_mission.values() for other_id, __ in conflicts
+        })
+        others_by_id = {other.id: other for other in others}
+        
         for mission in self:
-            if mission.state in ('cancelled', 'done') or not mission.vehicle_id or not mission.date_start or not mission.date_end:
-                mission.has_conflict = False
-                mission.conflict_details = False
-                continue
-            
             conflicts = []
-            
-            # Cherche missions qui se chevauchent (même véhicule ou même conducteur)
-            overlapping_domain = [
-                ('id', '!=', mission.id),
-                ('state', 'in', ['submitted', 'approved', 'in_progress']),
-                ('date_start', '<', mission.date_end),
-                ('date_end', '>', mission.date_start),
-                '|',
-                ('vehicle_id', '=', mission.vehicle_id.id),
-                ('driver_id', '=', mission.driver_id.id),
-            ]
-            
-            overlapping = self.search(overlapping_domain)
-            
-            for overlap in overlapping:
-                if overlap.vehicle_id == mission.vehicle_id:
+            for other_id, kind in conflicts_by_mission.get(mission, []):
+                overlap = others_by_id[other_id]
+                if kind == 'vehicle':
                     conflicts.append(f"⚠ Véhicule {mission.vehicle_id.name} déjà affecté à la mission {overlap.name} du {overlap.date_start.strftime('%d/%m/%Y %H:%M')} au {overlap.date_end.strftime('%d/%m/%Y %H:%M')}")
-                if overlap.driver_id == mission.driver_id:
+                else:
                     conflicts.append(f"⚠ Conducteur {mission.driver_id.name} déjà affecté à la mission {overlap.name} du {overlap.date_start.strftime('%d/%m/%Y %H:%M')} au {overlap.date_end.strftime('%d/%m/%Y %H:%M')}")
             
             mission.has_conflict = bool(conflicts)
             mission.conflict_details = '\n'.join(conflicts) if conflicts else False
     
+    def _get_conflicts(self):
+        """
+        Recherche en une requête les conflits de toutes les missions de self.
+        
+        Les missions candidates (non annulées/terminées, avec véhicule et
+        dates cohérentes) sont passées en VALUES, ce qui couvre aussi les enregistrements
+        non sauvegardés d'un onchange, puis jointes aux missions actives sur
+        le même véhicule ou le même conducteur dont la période chevauche.
+        La jointure est servie par les index GiST créés dans init().
+        
+        Returns:
+            dict: {mission: [(id mission en conflit, 'vehicle' | 'driver'), ...]}
+        """
+        # Dates inversées (saisie en cours d'un onchange): pas de période,
+        # l'erreur est levée par _check_mission_dates à l'enregistrement
+        candidates = [
+            mission for mission in self
+            if mission.state not in ('cancelled', 'done')
+            and mission.vehicle_id and mission.date_start and mission.date_end
+            and mission.date_start < mission.date_end
+        ]
+        if not candidates:
+            return {}
+        
+        self.flush_model(['vehicle_id', 'driver_id', 'date_start', 'date_end', 'state'])
+        params = []
+        for key, mission in enumerate(candidates):
+            params.extend([
+                key, mission._origin.id or 0, mission.vehicle_id.id, mission.driver_id.id or None,
+                mission.date_start, mission.date_end,
+            ])
+        values = ", ".join(["(%s::int, %s::int, %s::int, %s::int, %s::timestamp, %s::timestamp)"] * len(candidates))
+        self.env.cr.execute(f"""
+            SELECT c.key, o.id, o.vehicle_id = c.vehicle_id, o.driver_id = c.driver_id
+              FROM (VALUES {values}) AS c(key, mission_id, vehicle_id, driver_id, date_start, date_end)
+              JOIN fleet_mission o
+                ON (o.vehicle_id = c.vehicle_id OR o.driver_id = c.driver_id)
+               AND tsrange(o.date_start, o.date_end, '[)') && tsrange(c.date_start, c.date_end, '[)')
+             WHERE o.state IN {CONFLICT_STATES_SQL}
+               AND o.id != c.mission_id
+             ORDER BY c.key, o.date_start, o.id
+        """, params)
+        
+        conflicts_by_mission = {}
+        for key, other_id, same_vehicle, same_driver in self.env.cr.fetchall():
+            conflicts = conflicts_by_mission.setdefault(candidates[key], [])
+            if same_vehicle:
+                conflicts.append((other_id, 'vehicle'))
+            if same_driver:
+                conflicts.append((other_id, 'driver'))
+        return conflicts_by_mission
+    
+    # ========== INDEX & CONTRAINTES D'EXCLUSION ==========
+    
+    def init(self):
+        """Index GiST des périodes de mission actives, par véhicule et par conducteur."""
+        super().init()
+        if self._ensure_btree_gist():
+            for column in ('vehicle_id', 'driver_id'):
+                self.env.cr.execute(f"""
+                    CREATE INDEX IF NOT EXISTS fleet_mission_{column}_period_gist
+                    ON fleet_mission USING gist ({column}, {MISSION_PERIOD_SQL})
+                    WHERE state IN {CONFLICT_STATES_SQL}
+                """)
+        else:
+            self.env.cr.execute(f"""
+                CREATE INDEX IF NOT EXISTS fleet_mission_period_gist
+                ON fleet_mission USING gist ({MISSION_PERIOD_SQL})
+                WHERE state IN {CONFLICT_STATES_SQL}
+            """)
+        try:
+            self._sync_exclusion_constraints()
+        except UserError as e:
+            _logger.warning("Contraintes d'exclusion des missions non appliquées: %s", e)
+    
+    @api.model
+    def _ensure_btree_gist(self):
+        """
+        Active l'extension btree_gist, nécessaire pour combiner un entier
+        (véhicule, conducteur) et une période dans un index GiST.
+        """
+        try:
+            with self.env.cr.savepoint(flush=False):
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except psycopg2.Error:
+            _logger.warning("Extension btree_gist indisponible: index de conflits des missions sur la période seule")
+            return False
+        return True
+    
+    @api.model
+    def _sync_exclusion_constraints(self):
+        """
+        Ajoute ou retire les contraintes d'exclusion selon le paramètre
+        fleet.mission_exclusion_constraints.
+        
+        Activées, elles font refuser par PostgreSQL toute double réservation
+        d'un véhicule ou d'un conducteur entre missions actives, quel que soit
+        le chemin d'écriture (ORM, import, SQL).
+        
+        Raises:
+            UserError: extension btree_gist indisponible ou missions actives
+                se chevauchant déjà
+        """
+        enabled = self.env['ir.config_parameter'].sudo().get_param(
+            'fleet.mission_exclusion_constraints', default='False'
+        ) == 'True'
+        cr = self.env.cr
+        self.flush_model()
+        for name, column in MISSION_EXCLUSION_CONSTRAINTS.items():
+            exists = sql.constraint_definition(cr, self._table, name)
+            if enabled and not exists:
+                if not self._ensure_btree_gist():
+                    raise UserError(_(
+                        "L'extension PostgreSQL btree_gist est requise pour interdire "
+                        "les doubles réservations au niveau de la base de données."
+                    ))
+                try:
+                    sql.add_constraint(
+                        cr, self._table, name,
+                        f"EXCLUDE USING gist ({column} WITH =, {MISSION_PERIOD_SQL} WITH &&) "
+                        f"WHERE (state IN {CONFLICT_STATES_SQL})",
+                    )
+                except Exception:
+                    raise UserError(_(
+                        "Impossible d'interdire les doubles réservations: des missions actives "
+                        "se chevauchent déjà. Résolvez les conflits existants puis réessayez."
+                    ))
+            elif not enabled and exists:
+                sql.drop_constraint(cr, self._table, name)
+    
     # ========== MÉTHODES CRUD ==========
     
     @api.model_create_multi
@@ -367,14 +502,6 @@ class FleetMission(models.Model):
         
         return missions
     
-    def write(self, vals):
-        """Logique lors de la modification."""
-        # Si changement de dates, recalculer les conflits
-        if any(key in vals for key in ['date_start', 'date_end', 'vehicle_id', 'driver_id']):
-            self._compute_has_conflict()
-        
-        return super().write(vals)
-    
     # ========== ACTIONS WORKFLOW ==========
     
     def action_submit(self):
@@ -6,6 +6,7 @@ from datetime import date, datetime, timedelta
 
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError, ValidationError
+from odoo.osv import expression
 
 _logger = logging.getLogger(__name__)
 
@@ -38,18 +39,21 @@ class FleetVehicle(models.Model):
     # ========== ÉCHÉANCES ADMINISTRATIVES ==========
     
     date_prochaine_visite = fields.Date(
+        index=True,
         string='Prochaine Visite Technique',
         tracking=True,
         help="Date de la prochaine visite technique obligatoire"
     )
     
     date_fin_assurance = fields.Date(
+        index=True,
         string='Fin Assurance',
         tracking=True,
         help="Date d'expiration de l'assurance du véhicule"
     )
     
     date_fin_vignette = fields.Date(
+        index=True,
         string='Fin Vignette',
         tracking=True,
         help="Date d'expiration de la vignette/taxe routière"
@@ -129,21 +133,21 @@ class FleetVehicle(models.Model):
     is_available = fields.Boolean(
         string='Disponible',
         compute='_compute_is_available',
-        store=True,
-        help="Indique si le véhicule est actuellement en mission"
+        search='_search_is_available',
+        help="Indique si le véhicule est disponible (aucune mission approuvée ou en cours)"
     )
     
     is_on_mission = fields.Boolean(
         string='En Mission',
-        compute='_compute_is_on_mission',
-        store=True,
+        compute='_compute_is_available',
+        search='_search_is_on_mission',
         help="Indique si le véhicule est actuellement en mission"
     )
     
     current_mission_id = fields.Many2one(
         'fleet.mission',
         string='Mission en Cours',
-        compute='_compute_current_mission',
+        compute='_compute_is_available',
         help="Mission actuellement en cours pour ce véhicule"
     )
     
@@ -205,6 +209,49 @@ class FleetVehicle(models.Model):
             else:
                 vehicle.administrative_state = 'ok'
     
+    # ========== BASCULE QUOTIDIENNE DES DATES ==========
+    
+    @api.model
+    def _get_deadline_rollover_domain(self, last_run=None, today=None):
+        """
+        Véhicules dont une échéance propre a franchi un seuil (J-30, J-0)
+        entre last_run et today; sans last_run, tous les véhicules datés.
+        Les échéances portées par les documents sont propagées par
+        fleet.vehicle.document.cron_date_rollover.
+        """
+        date_fields = ['date_prochaine_visite', 'date_fin_assurance', 'date_fin_vignette']
+        if not last_run:
+            return expression.OR([[(fname, '!=', False)] for fname in date_fields])
+        Document = self.env['fleet.vehicle.document']
+        return expression.OR([
+            Document._get_rollover_domain(fname, last_run, today) for fname in date_fields
+        ])
+    
+    @api.model
+    def _shift_days_to_next_deadline(self, elapsed_days):
+        """
+        Décale days_to_next_deadline des véhicules ayant une échéance.
+        
+        Tant qu'aucun seuil n'est franchi la prochaine échéance reste la même:
+        le compteur diminue simplement du nombre de jours écoulés.
+        """
+        if elapsed_days <= 0:
+            return
+        self.env.cr.execute("""
+            UPDATE fleet_vehicle v
+               SET days_to_next_deadline = v.days_to_next_deadline - %(elapsed)s
+             WHERE v.date_prochaine_visite IS NOT NULL
+                OR v.date_fin_assurance IS NOT NULL
+                OR v.date_fin_vignette IS NOT NULL
+                OR EXISTS (
+                    SELECT 1
+                      FROM fleet_vehicle_document d
+                     WHERE d.vehicle_id = v.id
+                       AND d.expiry_date IS NOT NULL
+                       AND d.state != 'valid'
+                )
+        """, {'elapsed': elapsed_days})
+    
     @api.depends('document_ids.state')
     def _compute_has_expired_document(self):
         """Vérifie si au moins un document est expiré."""
@@ -239,42 +286,103 @@ class FleetVehicle(models.Model):
     @api.depends('mission_ids.state', 'mission_ids.date_start', 'mission_ids.date_end', 'active')
     def _compute_is_available(self):
         """
-        Vérifie si le véhicule est disponible.
+        Calcule is_available, is_on_mission et current_mission_id pour tout
+        le recordset via _get_availability_data, sans charger mission_ids.
         Un véhicule est indisponible s'il a une mission en cours (in_progress)
         ou une mission future approuvée.
         Note: la vérification de l'état maintenance est faite dans custom_fleet_maintenance.
         """
-        today = date.today()
+        availability = self._get_availability_data()
         for vehicle in self:
-            # Véhicule non actif = non disponible
-            if not vehicle.active:
-                vehicle.is_available = False
-                continue
-            
-            # Cherche missions actives ou futures
-            active_missions = vehicle.mission_ids.filtered(
-                lambda m: m.state in ('in_progress', 'approved') and
-                         (not m.date_end or m.date_end.date() >= today)
-            )
-            
-            vehicle.is_available = not active_missions
+            data = availability[vehicle._origin.id]
+            vehicle.is_available = data['is_available']
+            vehicle.is_on_mission = data['is_on_mission']
+            vehicle.current_mission_id = data['current_mission_id']
     
-
-    
-    @api.depends('mission_ids.state')
-    def _compute_current_mission(self):
-        """Trouve la mission actuellement en cours."""
-        for vehicle in self:
-            current = vehicle.mission_ids.filtered(lambda m: m.state == 'in_progress')
-            vehicle.current_mission_id = current[:1] if current else False
+    def _get_availability_data(self):
+        """
+        Disponibilité de tout le recordset en une requête groupée sur les
+        missions approuvées ou en cours.
+        
+        Les autres modules (maintenance) complètent le résultat en surchargeant
+        cette méthode; l'ordre de chargement des modules est indifférent.
+        
+        Returns:
+            dict: {id véhicule: {'is_available', 'is_on_mission', 'current_mission_id'}}
+        """
+        parent = super()
+        if hasattr(parent, '_get_availability_data'):
+            availability = parent._get_availability_data()
+        else:
+            availability = {
+                vehicle._origin.id: {
+                    'is_available': vehicle.active,
+                    'is_on_mission': False,
+                    'current_mission_id': False,
+                }
+                for vehicle in self
+            }
+        
+        vehicle_ids = tuple(self._origin.ids)
+        if not vehicle_ids:
+            return availability
+        self.env['fleet.mission'].flush_model(['vehicle_id', 'state', 'date_start', 'date_end'])
+        self.env.cr.execute("""
+            SELECT vehicle_id,
+                   bool_or(date_end IS NULL OR date_end::date >= %(today)s),
+                   (array_agg(id ORDER BY date_start DESC, id DESC) FILTER (WHERE state = 'in_progress'))[1]
+              FROM fleet_mission
+             WHERE vehicle_id IN %(vehicle_ids)s
+               AND state IN ('approved', 'in_progress')
+             GROUP BY vehicle_id
+        """, {'today': date.today(), 'vehicle_ids': vehicle_ids})
+        for vehicle_id, busy, current_mission_id in self.env.cr.fetchall():
+            data = availability[vehicle_id]
+            data['is_available'] = data['is_available'] and not busy
+            data['is_on_mission'] = bool(current_mission_id)
+            data['current_mission_id'] = current_mission_id or False
+        return availability
     
-    @api.depends('mission_ids.state')
-    def _compute_is_on_mission(self):
-        """Vérifie si le véhicule est actuellement en mission."""
-        for vehicle in self:
-            vehicle.is_on_mission = bool(
-                vehicle.mission_ids.filtered(lambda m: m.state == 'in_progress')
-            )
+    @api.model
+    def _get_unavailable_vehicle_ids(self):
+        """
+        Ids des véhicules rendus indisponibles par une mission approuvée ou
+        en cours (même règle que _get_availability_data); complété par les
+        modules dépendants.
+        """
+        parent = super()
+        unavailable_ids = set(parent._get_unavailable_vehicle_ids()) if hasattr(parent, '_get_unavailable_vehicle_ids') else set()
+        self.env['fleet.mission'].flush_model(['vehicle_id', 'state', 'date_end'])
+        self.env.cr.execute("""
+            SELECT DISTINCT vehicle_id
+              FROM fleet_mission
+             WHERE state IN ('approved', 'in_progress')
+               AND (date_end IS NULL OR date_end::date >= %s)
+        """, [date.today()])
+        unavailable_ids.update(row[0] for row in self.env.cr.fetchall())
+        return unavailable_ids
+    
+    def _search_is_available(self, operator, value):
+        """Recherche par disponibilité, sans charger les missions."""
+        if operator not in ('=', '!='):
+            raise ValueError("Unsupported operator for is_available search")
+        
+        unavailable_ids = list(self._get_unavailable_vehicle_ids())
+        if (operator == '=' and value) or (operator == '!=' and not value):
+            return [('active', '=', True), ('id', 'not in', unavailable_ids)]
+        return ['|', ('active', '=', False), ('id', 'in', unavailable_ids)]
+    
+    def _search_is_on_mission(self, operator, value):
+        """Recherche des véhicules ayant une mission en cours."""
+        if operator not in ('=', '!='):
+            raise ValueError("Unsupported operator for is_on_mission search")
+        
+        self.env['fleet.mission'].flush_model(['vehicle_id', 'state'])
+        self.env.cr.execute("SELECT DISTINCT vehicle_id FROM fleet_mission WHERE state = 'in_progress'")
+        vehicle_ids = [row[0] for row in self.env.cr.fetchall()]
+        if (operator == '=' and value) or (operator == '!=' and not value):
+            return [('id', 'in', vehicle_ids)]
+        return [('id', 'not in', vehicle_ids)]
     
     # ========== MÉTHODES CRUD ==========
     
@@ -6,9 +6,15 @@ from datetime import date, timedelta
 
 from odoo import _, api, fields, models
 from odoo.exceptions import ValidationError
+from odoo.osv import expression
+from odoo.tools import split_every
 
 _logger = logging.getLogger(__name__)
 
+# Seuils (en jours avant l'échéance) qui font changer un état: J-30 et J-0
+ROLLOVER_THRESHOLDS = (30, 0)
+ROLLOVER_BATCH_SIZE = 1000
+
 
 class FleetVehicleDocument(models.Model):
     """
@@ -89,6 +95,7 @@ class FleetVehicleDocument(models.Model):
     
     expiry_date = fields.Date(
         string='Date Expiration',
+        index=True,
         tracking=True,
         help="Date d'expiration du document"
     )
@@ -400,6 +407,93 @@ class FleetVehicleDocument(models.Model):
             },
         }
     
+    # ========== BASCULE QUOTIDIENNE DES DATES ==========
+    
+    @api.model
+    def _get_rollover_domain(self, date_field, last_run, today):
+        """
+        Domaine des enregistrements dont la date `date_field` a franchi un seuil
+        (J-30, J-0) entre `last_run` et `today`.
+        
+        Une date D franchit le seuil J-n quand D - today <= n < D - last_run,
+        soit D dans ]last_run + n, today + n]: une simple plage sur la date,
+        servie par son index.
+        """
+        windows = []
+        for threshold in ROLLOVER_THRESHOLDS:
+            # J-0: expiré dès le lendemain de l'échéance (jours < 0)
+            offset = threshold if threshold else -1
+            windows.append([
+                (date_field, '>', last_run + timedelta(days=offset)),
+                (date_field, '<=', today + timedelta(days=offset)),
+            ])
+        return expression.OR(windows)
+    
+    @api.model
+    def _recompute_rollover(self, records, fnames):
+        """
+        Recalcule par lots les champs calculés dépendant de `fnames`
+        (marquage `modified` puis écriture groupée au flush).
+        """
+        for ids in split_every(ROLLOVER_BATCH_SIZE, records.ids):
+            batch = records.browse(ids)
+            batch.modified(fnames)
+            self.env.flush_all()
+            self.env.invalidate_all()
+    
+    @api.model
+    def cron_date_rollover(self):
+        """
+        Cron: bascule quotidienne des états dépendant de la date du jour.
+        
+        Les champs stockés days_to_expire, state et alert_level (et l'état
+        administratif des véhicules) sont calculés par rapport à la date du
+        jour et deviennent faux chaque nuit. Plutôt que de tout recalculer:
+        - les compteurs de jours sont décalés en SQL,
+        - seuls les documents/véhicules ayant franchi un seuil (J-30, J-0)
+          depuis la dernière exécution sont recalculés via l'ORM, par lots.
+        
+        La date de dernière exécution est conservée dans le paramètre
+        fleet.document_rollover_date. Sans ce paramètre, tous les documents
+        datés sont recalculés une fois.
+        """
+        ConfigParam = self.env['ir.config_parameter'].sudo()
+        today = date.today()
+        last_run = fields.Date.to_date(ConfigParam.get_param('fleet.document_rollover_date'))
+        if last_run and last_run >= today:
+            return False
+        
+        Vehicle = self.env['fleet.vehicle']
+        self.env.flush_all()
+        # Compteurs de jours: exacts pour les documents, décalés pour les véhicules
+        self.env.cr.execute("""
+            UPDATE fleet_vehicle_document
+               SET days_to_expire = expiry_date - %(today)s
+             WHERE expiry_date IS NOT NULL
+               AND days_to_expire IS DISTINCT FROM expiry_date - %(today)s
+        """, {'today': today})
+        if last_run:
+            Vehicle._shift_days_to_next_deadline((today - last_run).days)
+        self.env.invalidate_all()
+        
+        if last_run:
+            documents = self.search(
+                [('state', '!=', 'cancelled')] + self._get_rollover_domain('expiry_date', last_run, today)
+            )
+            vehicles = Vehicle.search(Vehicle._get_deadline_rollover_domain(last_run, today))
+        else:
+            documents = self.search([('state', '!=', 'cancelled'), ('expiry_date', '!=', False)])
+            vehicles = Vehicle.search(Vehicle._get_deadline_rollover_domain())
+        
+        self._recompute_rollover(documents, ['expiry_date'])
+        self._recompute_rollover(vehicles, ['date_prochaine_visite', 'date_fin_assurance', 'date_fin_vignette'])
+        ConfigParam.set_param('fleet.document_rollover_date', fields.Date.to_string(today))
+        _logger.info(
+            "Document date rollover (%s -> %s): %d documents, %d vehicles recomputed",
+            last_run or 'initial', today, len(documents), len(vehicles)
+        )
+        return True
+    
     def action_send_expiry_alerts(self):
         """
         Cron job: Envoi alertes échéances J-30 (tous les jours à 05:00).
@@ -415,6 +509,9 @@ class FleetVehicleDocument(models.Model):
         """
         ConfigParam = self.env['ir.config_parameter'].sudo()
         
+        # États à jour avant de filtrer sur state
+        self.cron_date_rollover()
+        
         # Récupérer le délai d'alerte (par défaut 30 jours)
         alert_offset_days = int(ConfigParam.get_param('fleet.alert_offset_days', '30'))
         alert_date = date.today() + timedelta(days=alert_offset_days)
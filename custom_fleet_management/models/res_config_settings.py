@@ -59,6 +59,14 @@ class ResConfigSettings(models.TransientModel):
         help="Empêcher l'approbation de missions avec conflits d'affectation (véhicule ou conducteur déjà assigné)"
     )
     
+    fleet_mission_exclusion_constraints = fields.Boolean(
+        string='Interdire Doubles Réservations (Base de Données)',
+        default=False,
+        config_parameter='fleet.mission_exclusion_constraints',
+        help="Ajouter des contraintes d'exclusion PostgreSQL refusant tout chevauchement de missions actives "
+             "sur un même véhicule ou un même conducteur, y compris lors des imports"
+    )
+    
     # ========== KILOMÉTRAGE ==========
     
     fleet_odometer_alert_threshold = fields.Integer(
@@ -109,3 +117,6 @@ class ResConfigSettings(models.TransientModel):
         # Sauvegarder les responsables dans ir.config_parameter
         responsible_ids_str = ','.join(str(id) for id in self.fleet_responsible_ids.ids)
         self.env['ir.config_parameter'].sudo().set_param('fleet.responsible_ids', responsible_ids_str)
+        
+        # Appliquer (ou retirer) les contraintes d'exclusion des missions
+        self.env['fleet.mission'].sudo()._sync_exclusion_constraints()
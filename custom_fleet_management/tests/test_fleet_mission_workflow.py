@@ -190,6 +190,43 @@ class TestFleetMissionWorkflow(TransactionCase):
         self.assertTrue(mission2.has_conflict)
         self.assertIn('conducteur', mission2.conflict_details.lower())
 
+    def test_conflict_detection_batch(self):
+        """Test conflicts of a whole recordset are found with one query"""
+        vehicle2 = self.env['fleet.vehicle'].create({
+            'model_id': self.vehicle_model.id,
+            'license_plate': 'MISSION-003',
+            'company_id': self.company.id,
+        })
+        start = datetime.now() + timedelta(days=1)
+        Mission = self.env['fleet.mission']
+        vals = {
+            'driver_id': self.driver.id,
+            'requester_id': self.requester.id,
+            'mission_type': 'course_urbaine',
+            'company_id': self.company.id,
+        }
+        active = Mission.create(dict(vals, vehicle_id=self.vehicle.id, state='approved',
+                                     date_start=start, date_end=start + timedelta(days=2)))
+        overlapping = Mission.create(dict(vals, vehicle_id=self.vehicle.id,
+                                          date_start=start + timedelta(days=1), date_end=start + timedelta(days=3)))
+        same_driver = Mission.create(dict(vals, vehicle_id=vehicle2.id,
+                                          date_start=start, date_end=start + timedelta(hours=4)))
+        later = Mission.create(dict(vals, vehicle_id=self.vehicle.id,
+                                    date_start=start + timedelta(days=2), date_end=start + timedelta(days=3)))
+        missions = active | overlapping | same_driver | later
+        self.env.flush_all()
+
+        queries_before = self.cr.sql_log_count
+        conflicts = missions._get_conflicts()
+        self.assertEqual(self.cr.sql_log_count - queries_before, 1)
+
+        self.assertEqual(conflicts[overlapping], [(active.id, 'vehicle'), (active.id, 'driver')])
+        self.assertEqual(conflicts[same_driver], [(active.id, 'driver')])
+        # Back-to-back missions do not overlap, draft missions do not block others
+        self.assertNotIn(later, conflicts)
+        self.assertNotIn(active, conflicts)
+        self.assertEqual(missions.mapped('has_conflict'), [False, True, True, False])
+
     def test_conflict_strict_blocking(self):
         """Test strict conflict blocking when enabled"""
         # Enable strict blocking
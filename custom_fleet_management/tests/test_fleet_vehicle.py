@@ -154,6 +154,42 @@ class TestFleetVehicle(TransactionCase):
         vehicle._compute_is_available()
         self.assertFalse(vehicle.is_available)
 
+    def test_availability_batch_and_search(self):
+        """Test availability flags are resolved per recordset and searchable"""
+        vehicles = self.env['fleet.vehicle'].create([{
+            'model_id': self.vehicle_model.id,
+            'license_plate': f'TEST-BATCH-{index}',
+            'company_id': self.company.id,
+        } for index in range(3)])
+        free, busy, planned = vehicles
+        mission_vals = {
+            'driver_id': self.driver.id,
+            'requester_id': self.driver.id,
+            'mission_type': 'course_urbaine',
+            'company_id': self.company.id,
+        }
+        mission = self.env['fleet.mission'].create(dict(
+            mission_vals, vehicle_id=busy.id, state='in_progress',
+            date_start=datetime.now(), date_end=datetime.now() + timedelta(days=1),
+        ))
+        self.env['fleet.mission'].create(dict(
+            mission_vals, vehicle_id=planned.id, state='approved',
+            date_start=datetime.now() + timedelta(days=2), date_end=datetime.now() + timedelta(days=3),
+        ))
+        self.env.flush_all()
+        vehicles.invalidate_recordset()
+
+        queries_before = self.cr.sql_log_count
+        self.assertEqual(vehicles.mapped('is_available'), [True, False, False])
+        self.assertEqual(vehicles.mapped('is_on_mission'), [False, True, False])
+        self.assertEqual(busy.current_mission_id, mission)
+        self.assertLessEqual(self.cr.sql_log_count - queries_before, 3)
+
+        Vehicle = self.env['fleet.vehicle']
+        self.assertEqual(Vehicle.search([('id', 'in', vehicles.ids), ('is_available', '=', True)]), free)
+        self.assertEqual(Vehicle.search([('id', 'in', vehicles.ids), ('is_available', '=', False)]), busy | planned)
+        self.assertEqual(Vehicle.search([('id', 'in', vehicles.ids), ('is_on_mission', '=', True)]), busy)
+
     def test_action_view_missions(self):
         """Test action_view_missions returns correct action dict"""
         vehicle = self.env['fleet.vehicle'].create({
@@ -243,3 +279,57 @@ class TestFleetVehicle(TransactionCase):
         # Should not raise exception
         result = vehicle.action_send_weekly_digest()
         self.assertTrue(result)
+
+    def test_date_rollover_recomputes_crossed_thresholds(self):
+        """Test the daily rollover only recomputes documents/vehicles crossing J-30 or J-0"""
+        today = datetime.now().date()
+        vehicle = self.env['fleet.vehicle'].create({
+            'model_id': self.vehicle_model.id,
+            'license_plate': 'TEST-ROLL',
+            'company_id': self.company.id,
+        })
+        crossing = self.env['fleet.vehicle.document'].create({
+            'vehicle_id': vehicle.id,
+            'document_type_id': self.doc_type_assurance.id,
+            'expiry_date': today + timedelta(days=28),
+            'company_id': self.company.id,
+        })
+        expired = self.env['fleet.vehicle.document'].create({
+            'vehicle_id': vehicle.id,
+            'document_type_id': self.doc_type_visite.id,
+            'expiry_date': today - timedelta(days=1),
+            'company_id': self.company.id,
+        })
+        far = self.env['fleet.vehicle.document'].create({
+            'vehicle_id': vehicle.id,
+            'document_type_id': self.doc_type_visite.id,
+            'expiry_date': today + timedelta(days=90),
+            'company_id': self.company.id,
+        })
+
+        # Stored values as computed 5 days ago
+        self.env.flush_all()
+        self.env.cr.execute("""
+            UPDATE fleet_vehicle_document SET state = 'valid', alert_level = 'green', days_to_expire = 33
+             WHERE id = %s
+        """, [crossing.id])
+        self.env.cr.execute("""
+            UPDATE fleet_vehicle_document SET state = 'expiring_soon', alert_level = 'orange', days_to_expire = 4
+             WHERE id = %s
+        """, [expired.id])
+        self.env.cr.execute("UPDATE fleet_vehicle_document SET days_to_expire = 95 WHERE id = %s", [far.id])
+        self.env.invalidate_all()
+        self.env['ir.config_parameter'].sudo().set_param(
+            'fleet.document_rollover_date', str(today - timedelta(days=5))
+        )
+
+        self.assertTrue(self.env['fleet.vehicle.document'].cron_date_rollover())
+
+        self.assertEqual((crossing.state, crossing.alert_level, crossing.days_to_expire), ('expiring_soon', 'orange', 28))
+        self.assertEqual((expired.state, expired.alert_level, expired.days_to_expire), ('expired', 'red', -1))
+        self.assertEqual((far.state, far.days_to_expire), ('valid', 90))
+        self.assertEqual(vehicle.administrative_state, 'critical')
+        self.assertTrue(vehicle.has_expired_document)
+
+        # Already run today: nothing to do
+        self.assertFalse(self.env['fleet.vehicle.document'].cron_date_rollover())
@@ -9,11 +9,17 @@
 #############################################################################
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from odoo.tools import split_every
+from collections import defaultdict
 from dateutil.relativedelta import relativedelta
 import logging
+import time
 
 _logger = logging.getLogger(__name__)
 
+# Taille des lots de create() lors de la génération mensuelle
+GENERATION_BATCH_SIZE = 1000
+
 
 class EmployeeCreditLimit(models.Model):
     _name = 'employee.credit.limit'
@@ -152,6 +158,7 @@ class EmployeeCreditLimit(models.Model):
 
     def action_generate_credits_with_lines(self):
         """Action unifiée pour créer les crédits et générer toutes les lignes (optimisée et sécurisée)."""
+        started = time.monotonic()
         today = fields.Date.today()
         start_date = today.replace(day=1)
         end_date = (start_date + relativedelta(months=1)) - relativedelta(days=1)
@@ -165,9 +172,6 @@ class EmployeeCreditLimit(models.Model):
         month_name = months_fr[start_date.month]
         year = start_date.year
 
-        Credit = self.env['employee.credit.limit']
-        existing_credits = Credit.browse()
-
         for record in self:
             if not record.partner_company_id:
                 raise UserError(_(
@@ -176,52 +180,99 @@ class EmployeeCreditLimit(models.Model):
             if record.amount <= 0:
                 raise UserError(_(
                     "Impossible de générer le crédit pour '%s' : le champ 'Montant du crédit' doit avoir une valeur positive."
-                ) % (record.name or record.id)) 
+                ) % (record.name or record.id))
 
-            company = record.partner_company_id
-            credit_name = f"CREDIT/{month_name}/{year}/{company.name.upper()}"
+        # Crédits déjà générés ce mois-ci, chargés en une seule requête
+        names = {
+            record.id: f"CREDIT/{month_name}/{year}/{record.partner_company_id.name.upper()}"
+            for record in self
+        }
+        taken_names = set(self.search([
+            ('name', 'in', list(names.values())),
+            ('id', 'not in', self.ids),
+        ]).mapped('name'))
 
-            existing_credit = Credit.search([('name', '=', credit_name)], limit=1)
-            if existing_credit:
-                existing_credits |= existing_credit
+        to_generate = self.browse()
+        existing_count = 0
+        for record in self:
+            if names[record.id] in taken_names:
+                existing_count += 1
                 continue
-            record.write(
-                {'name': credit_name,
-                 'partner_company_id': company.id,
-                 'amount': record.amount,
-                 'start': start_date,
-                 'end': end_date,
-                }
-            )
-            record._create_lines_for_credit(record)
+            taken_names.add(names[record.id])
+            if record.name != names[record.id]:
+                record.name = names[record.id]
+            to_generate |= record
+        to_generate.write({'start': start_date, 'end': end_date})
+
+        stats = to_generate._sync_lines()
+        _logger.info(
+            "Employee credit generation %s/%s: %d credit(s) generated, %d already existing, "
+            "%d line(s) created, %d updated, %d removed in %.1fs",
+            start_date.month, year, len(to_generate), existing_count,
+            stats['lines_created'], stats['lines_updated'], stats['lines_removed'],
+            time.monotonic() - started,
+        )
         return {
             'type': 'ir.actions.client',
             'tag': 'reload',
         }
 
-    def _create_lines_for_credit(self, food_credit):
-        """Créer les lignes pour un crédit spécifique."""
-        if food_credit.line_ids:
-            food_credit.line_ids.unlink()
-
-        partners = self.env['res.partner'].search([
-            ('parent_id', '=', food_credit.partner_company_id.id),
+    def _sync_lines(self):
+        """Aligne les lignes des crédits sur les employés actifs de leur société.
+
+        Employés et lignes existantes sont chargés en une requête chacun ; seules
+        les lignes manquantes sont créées (par lots), les lignes divergentes mises
+        à jour et celles des anciens employés supprimées si elles sont inutilisées.
+        """
+        Line = self.env['employee.credit.limit.line']
+        stats = {'lines_created': 0, 'lines_updated': 0, 'lines_removed': 0}
+        if not self:
+            return stats
+
+        employees = defaultdict(list)
+        for partner in self.env['res.partner'].search([
+            ('parent_id', 'in', self.partner_company_id.ids),
             ('active', '=', True),
-        ])
-        if not partners:
-            return 0
-
-        vals_list = [{
-            'partner_id': partner.id,
-            'amount': food_credit.amount,
-            'start': food_credit.start,
-            'end': food_credit.end,
-            'limit_id': food_credit.id,
-            'partner_company_id': food_credit.partner_company_id.id,
-        } for partner in partners]
-
-        self.env['employee.credit.limit.line'].create(vals_list)
-        return len(vals_list)
+        ]):
+            employees[partner.parent_id.id].append(partner.id)
+
+        lines_by_credit = defaultdict(dict)
+        obsolete_lines = Line
+        for line in Line.search([('limit_id', 'in', self.ids)]):
+            if line.partner_id.id in lines_by_credit[line.limit_id.id]:
+                obsolete_lines |= line
+            else:
+                lines_by_credit[line.limit_id.id][line.partner_id.id] = line
+
+        create_vals = []
+        updates = defaultdict(lambda: Line)
+        for credit in self:
+            values = {
+                'amount': credit.amount,
+                'start': credit.start,
+                'end': credit.end,
+                'partner_company_id': credit.partner_company_id.id,
+            }
+            existing_lines = lines_by_credit[credit.id]
+            for partner_id in employees[credit.partner_company_id.id]:
+                line = existing_lines.pop(partner_id, None)
+                if not line:
+                    create_vals.append(dict(values, partner_id=partner_id, limit_id=credit.id))
+                elif (line.amount, line.start, line.end, line.partner_company_id.id) != tuple(values.values()):
+                    updates[tuple(values.items())] |= line
+            for line in existing_lines.values():
+                obsolete_lines |= line
+
+        for values, lines in updates.items():
+            lines.write(dict(values))
+            stats['lines_updated'] += len(lines)
+        obsolete_lines = obsolete_lines.filtered(lambda line: not line.amount_used)
+        stats['lines_removed'] = len(obsolete_lines)
+        obsolete_lines.unlink()
+        for vals_list in split_every(GENERATION_BATCH_SIZE, create_vals, list):
+            Line.create(vals_list)
+        stats['lines_created'] = len(create_vals)
+        return stats
 
 
 class EmployeeCreditLimitLine(models.Model):
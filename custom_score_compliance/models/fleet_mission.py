@@ -146,7 +146,7 @@ class FleetMission(models.Model):
             return
         
         # Check vehicle compliance
-        if self.vehicle_id and self.vehicle_id.has_expired_critical_docs:
+        if self.vehicle_id and not self.vehicle_id.check_mission_allowed():
             reasons = self.vehicle_id.get_compliance_blocking_reasons()
             
             action_labels = {
@@ -14,9 +14,21 @@ Fields added:
 - compliance_status: Selection showing overall compliance status
 """
 
+import logging
 from datetime import date, timedelta
 
 from odoo import _, api, fields, models
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+# Champs stockés recalculés par _compute_document_compliance_status
+COMPLIANCE_FIELDS = (
+    'has_expired_critical_docs', 'has_expired_docs', 'has_expiring_soon_docs',
+    'expired_critical_doc_count', 'expired_doc_count', 'expiring_soon_doc_count',
+    'compliance_status',
+)
+COMPLIANCE_BATCH_SIZE = 1000
 
 
 class FleetVehicle(models.Model):
@@ -112,62 +124,77 @@ class FleetVehicle(models.Model):
         - compliance_status
         - compliance_message
         """
-        today = date.today()
-        
-        # Get alert days from config
-        ConfigParam = self.env['ir.config_parameter'].sudo()
-        alert_days = int(ConfigParam.get_param(
-            'custom_score_compliance.alert_days_before_expiry', '30'
-        ))
-        alert_date = today + timedelta(days=alert_days)
+        counts = self._read_document_compliance_counts()
         
         for vehicle in self:
-            # Get active documents (not cancelled/draft)
-            active_docs = vehicle.document_ids.filtered(
-                lambda d: d.state not in ('cancelled', 'draft')
-            )
-            
-            # Expired documents (any)
-            expired_docs = active_docs.filtered(
-                lambda d: d.expiry_date and d.expiry_date < today
-            )
-            
-            # Expired critical documents
-            expired_critical_docs = expired_docs.filtered('is_critical_document')
-            
-            # Expiring soon (within alert period, not yet expired)
-            expiring_soon_docs = active_docs.filtered(
-                lambda d: d.expiry_date and today <= d.expiry_date <= alert_date
-            )
+            expired, expired_critical, expiring_soon = counts.get(vehicle._origin.id, (0, 0, 0))
             
             # Set counts
-            vehicle.expired_doc_count = len(expired_docs)
-            vehicle.expired_critical_doc_count = len(expired_critical_docs)
-            vehicle.expiring_soon_doc_count = len(expiring_soon_docs)
+            vehicle.expired_doc_count = expired
+            vehicle.expired_critical_doc_count = expired_critical
+            vehicle.expiring_soon_doc_count = expiring_soon
             
             # Set boolean flags
-            vehicle.has_expired_docs = bool(expired_docs)
-            vehicle.has_expired_critical_docs = bool(expired_critical_docs)
-            vehicle.has_expiring_soon_docs = bool(expiring_soon_docs)
+            vehicle.has_expired_docs = bool(expired)
+            vehicle.has_expired_critical_docs = bool(expired_critical)
+            vehicle.has_expiring_soon_docs = bool(expiring_soon)
             
             # Determine compliance status
-            if expired_critical_docs:
+            if expired_critical:
                 vehicle.compliance_status = 'blocked'
                 vehicle.compliance_message = _(
                     "%d document(s) critique(s) expiré(s) - Missions bloquées"
-                ) % len(expired_critical_docs)
-            elif expired_docs or expiring_soon_docs:
+                ) % expired_critical
+            elif expired or expiring_soon:
                 vehicle.compliance_status = 'warning'
                 parts = []
-                if expired_docs:
-                    parts.append(_("%d document(s) expiré(s)") % len(expired_docs))
-                if expiring_soon_docs:
-                    parts.append(_("%d document(s) expirant bientôt") % len(expiring_soon_docs))
+                if expired:
+                    parts.append(_("%d document(s) expiré(s)") % expired)
+                if expiring_soon:
+                    parts.append(_("%d document(s) expirant bientôt") % expiring_soon)
                 vehicle.compliance_message = ", ".join(parts)
             else:
                 vehicle.compliance_status = 'ok'
                 vehicle.compliance_message = _("Tous les documents sont à jour")
     
+    @api.model
+    def _get_compliance_alert_days(self):
+        """Alert period (days before expiry) from the compliance settings."""
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'custom_score_compliance.alert_days_before_expiry', '30'
+        ))
+    
+    def _read_document_compliance_counts(self):
+        """Count expired, expired critical and expiring soon documents.
+        
+        One aggregated query for the whole recordset, served by the
+        expiry_date index. Documents are read from the database: unsaved
+        changes of an onchange are only reflected once saved.
+        
+        Returns:
+            dict: {vehicle_id: (expired, expired_critical, expiring_soon)}
+        """
+        vehicle_ids = tuple(self._origin.ids)
+        if not vehicle_ids:
+            return {}
+        today = date.today()
+        alert_date = today + timedelta(days=self._get_compliance_alert_days())
+        self.env['fleet.vehicle.document'].flush_model(
+            ['vehicle_id', 'expiry_date', 'state', 'is_critical_document']
+        )
+        self.env.cr.execute("""
+            SELECT vehicle_id,
+                   COUNT(*) FILTER (WHERE expiry_date < %(today)s),
+                   COUNT(*) FILTER (WHERE expiry_date < %(today)s AND is_critical_document),
+                   COUNT(*) FILTER (WHERE expiry_date >= %(today)s)
+              FROM fleet_vehicle_document
+             WHERE vehicle_id IN %(vehicle_ids)s
+               AND expiry_date <= %(alert_date)s
+               AND (state IS NULL OR state NOT IN ('cancelled', 'draft'))
+             GROUP BY vehicle_id
+        """, {'today': today, 'alert_date': alert_date, 'vehicle_ids': vehicle_ids})
+        return {row[0]: row[1:] for row in self.env.cr.fetchall()}
+    
     # =========================================================================
     # HELPER METHODS
     # =========================================================================
@@ -267,7 +294,7 @@ class FleetVehicle(models.Model):
         """
         self.ensure_one()
         
-        if not self.has_expired_critical_docs:
+        if self.compliance_status != 'blocked':
             return True
         
         if raise_error:
@@ -318,32 +345,70 @@ class FleetVehicle(models.Model):
     # CRON METHODS
     # =========================================================================
     
+    @api.model
+    def _get_compliance_boundary_vehicle_ids(self, last_run, today, alert_days):
+        """Vehicles whose documents crossed a compliance boundary.
+        
+        A document changes bucket when it expires (expiry_date < today) or
+        enters the alert window (expiry_date <= today + alert_days). Between
+        last_run and today this happens for expiry dates in
+        ]last_run - 1, today - 1] and ]last_run + alert_days, today + alert_days]:
+        two ranges on the indexed expiry_date column.
+        """
+        self.env['fleet.vehicle.document'].flush_model(['vehicle_id', 'expiry_date', 'state'])
+        self.env.cr.execute("""
+            SELECT DISTINCT doc.vehicle_id
+              FROM fleet_vehicle_document doc
+              JOIN fleet_vehicle vehicle ON vehicle.id = doc.vehicle_id
+             WHERE vehicle.active
+               AND (doc.state IS NULL OR doc.state NOT IN ('cancelled', 'draft'))
+               AND ((doc.expiry_date > %(last_run)s - 1 AND doc.expiry_date <= %(today)s - 1)
+                 OR (doc.expiry_date > %(last_run)s + %(alert_days)s
+                     AND doc.expiry_date <= %(today)s + %(alert_days)s))
+        """, {'last_run': last_run, 'today': today, 'alert_days': alert_days})
+        return [row[0] for row in self.env.cr.fetchall()]
+    
+    def _recompute_compliance_status(self):
+        """Recompute the stored compliance fields by batches."""
+        fields_to_compute = [self._fields[fname] for fname in COMPLIANCE_FIELDS]
+        for ids in split_every(COMPLIANCE_BATCH_SIZE, self.ids):
+            batch = self.browse(ids)
+            for field in fields_to_compute:
+                self.env.add_to_compute(field, batch)
+            self.env.flush_all()
+            self.env.invalidate_all()
+    
     @api.model
     def _cron_recompute_compliance_status(self):
-        """Cron: Recompute compliance status for all active vehicles.
+        """Cron: Recompute compliance status of the vehicles that need it.
         
         Called daily by scheduled action ir_cron_vehicle_compliance_recompute.
-        Forces recomputation of stored computed fields for dashboard/reports.
+        Only the vehicles whose documents crossed an expiry or alert boundary
+        since the last run are recomputed. The last run date and the alert
+        period it used are kept in configuration parameters; without them (or
+        when the alert period changed) all active vehicles are recomputed once.
         """
-        import logging
-        _logger = logging.getLogger(__name__)
-        
-        # Get all active vehicles
-        vehicles = self.search([('active', '=', True)])
+        ConfigParam = self.env['ir.config_parameter'].sudo()
+        today = date.today()
+        alert_days = self._get_compliance_alert_days()
+        last_run = fields.Date.to_date(
+            ConfigParam.get_param('custom_score_compliance.compliance_recompute_date')
+        )
+        last_alert_days = ConfigParam.get_param('custom_score_compliance.compliance_recompute_alert_days')
+        if last_alert_days != str(alert_days):
+            last_run = None
+        elif last_run and last_run >= today:
+            return False
         
-        if not vehicles:
-            _logger.info("SCORE Compliance: No active vehicles to recompute")
-            return
+        if last_run:
+            vehicles = self.browse(self._get_compliance_boundary_vehicle_ids(last_run, today, alert_days))
+        else:
+            vehicles = self.search([('active', '=', True)])
         
         _logger.info("SCORE Compliance: Recomputing compliance for %d vehicles", len(vehicles))
+        vehicles._recompute_compliance_status()
         
-        # Invalidate cache and recompute
-        vehicles.invalidate_recordset(['has_expired_critical_docs', 'has_expired_docs',
-                                       'has_expiring_soon_docs', 'compliance_status'])
-        
-        # Trigger recomputation by reading the fields
-        for vehicle in vehicles:
-            # Force recompute
-            _ = vehicle.compliance_status
-        
+        ConfigParam.set_param('custom_score_compliance.compliance_recompute_date', fields.Date.to_string(today))
+        ConfigParam.set_param('custom_score_compliance.compliance_recompute_alert_days', str(alert_days))
         _logger.info("SCORE Compliance: Compliance recomputation complete")
+        return True
@@ -435,6 +435,40 @@ class TestMissionDocumentBlocking(TransactionCase):
         mission.action_submit()
         self.assertEqual(mission.state, 'submitted')
 
+    def test_cron_recomputes_only_boundary_vehicles(self):
+        """Test that the cron only recomputes vehicles whose docs crossed a boundary."""
+        other_vehicle = self.vehicle.copy({'license_plate': 'TEST-COMPL-002'})
+        # Expired yesterday: crossed the expiry boundary since the last run
+        self._create_document(self.vehicle, self.doc_type_critical, date.today() - timedelta(days=1))
+        # Expired long ago: no boundary crossed since the last run
+        self._create_document(other_vehicle, self.doc_type_critical, date.today() - timedelta(days=60))
+        vehicles = self.vehicle | other_vehicle
+        self.assertEqual(set(vehicles.mapped('compliance_status')), {'blocked'})
+
+        # Simulate stale stored statuses, as left by the previous day
+        vehicles.flush_recordset()
+        self.env.cr.execute("""
+            UPDATE fleet_vehicle
+               SET compliance_status = 'ok', has_expired_critical_docs = false
+             WHERE id IN %s
+        """, [tuple(vehicles.ids)])
+        vehicles.invalidate_recordset()
+
+        ConfigParam = self.env['ir.config_parameter'].sudo()
+        ConfigParam.set_param('custom_score_compliance.alert_days_before_expiry', '30')
+        ConfigParam.set_param('custom_score_compliance.compliance_recompute_alert_days', '30')
+        ConfigParam.set_param(
+            'custom_score_compliance.compliance_recompute_date',
+            str(date.today() - timedelta(days=1)),
+        )
+
+        self.assertTrue(self.env['fleet.vehicle']._cron_recompute_compliance_status())
+        self.assertEqual(self.vehicle.compliance_status, 'blocked')
+        self.assertFalse(self.vehicle.check_mission_allowed())
+        self.assertEqual(other_vehicle.compliance_status, 'ok')
+        # Already run today: nothing to do
+        self.assertFalse(self.env['fleet.vehicle']._cron_recompute_compliance_status())
+
 
 @tagged('post_install', '-at_install', 'score_compliance', 'document_type_migration')
 class TestDocumentTypeMigration(TransactionCase):
@@ -196,6 +196,69 @@ class FleetVehicleScore(models.Model):
         
         return domain
     
+    def _get_driver_kpis(self, drivers, date_from=None, date_to=None):
+        """
+        Batched FR-010 KPIs for every (vehicle, driver) pair of self x drivers.
+        All metrics come from two grouped reads on fleet.mission (record
+        rules applied), whatever the number of vehicles and drivers.
+        Only completed missions are counted; km metrics exclude 0 km missions.
+        
+        :param drivers: res.partner recordset
+        :param date_from: optional period start (on date_start)
+        :param date_to: optional period end (on date_start)
+        :return: dict {(vehicle_id, driver_id): {
+                     'mission_count', 'total_km', 'total_days',
+                     'avg_km', 'missions_with_km_count'}}
+        """
+        kpis = {
+            (vehicle_id, driver_id): {
+                'mission_count': 0,
+                'total_km': 0.0,
+                'total_days': 0.0,
+                'avg_km': 0.0,
+                'missions_with_km_count': 0,
+            }
+            for vehicle_id in self.ids
+            for driver_id in drivers.ids
+        }
+        if not kpis:
+            return kpis
+        
+        Mission = self.env['fleet.mission']
+        domain = [
+            ('vehicle_id', 'in', self.ids),
+            ('driver_id', 'in', drivers.ids),
+            ('state', '=', 'done'),
+        ]
+        if date_from:
+            domain.append(('date_start', '>=', date_from))
+        if date_to:
+            domain.append(('date_start', '<=', date_to))
+        
+        for vehicle, driver, count, total_days in Mission._read_group(
+            domain, ['vehicle_id', 'driver_id'], ['__count', 'duration_days:sum'],
+        ):
+            kpis[vehicle.id, driver.id].update({
+                'mission_count': count,
+                'total_days': total_days or 0.0,
+            })
+        for vehicle, driver, km_count, total_km in Mission._read_group(
+            domain + [('distance_km', '>', 0)],
+            ['vehicle_id', 'driver_id'], ['__count', 'distance_km:sum'],
+        ):
+            total_km = total_km or 0.0
+            kpis[vehicle.id, driver.id].update({
+                'total_km': total_km,
+                'avg_km': total_km / km_count if km_count else 0.0,
+                'missions_with_km_count': km_count,
+            })
+        return kpis
+    
+    def _get_driver_kpi(self, driver, kpi, date_from=None, date_to=None):
+        """Single KPI of _get_driver_kpis for this vehicle and one driver."""
+        self.ensure_one()
+        return self._get_driver_kpis(driver, date_from, date_to)[self.id, driver.id][kpi]
+    
     def _get_driver_mission_count(self, driver, date_from=None, date_to=None):
         """
         Count completed missions for a driver on this vehicle.
@@ -206,10 +269,7 @@ class FleetVehicleScore(models.Model):
         :param date_to: optional period end
         :return: integer count
         """
-        self.ensure_one()
-        Mission = self.env['fleet.mission']
-        domain = self._get_driver_missions_domain(driver, date_from, date_to)
-        return Mission.search_count(domain)
+        return self._get_driver_kpi(driver, 'mission_count', date_from, date_to)
     
     def _get_driver_total_km(self, driver, date_from=None, date_to=None):
         """
@@ -221,13 +281,7 @@ class FleetVehicleScore(models.Model):
         :param date_to: optional period end
         :return: float total km
         """
-        self.ensure_one()
-        Mission = self.env['fleet.mission']
-        domain = self._get_driver_missions_domain(
-            driver, date_from, date_to, exclude_zero_km=True
-        )
-        missions = Mission.search(domain)
-        return sum(missions.mapped('distance_km'))
+        return self._get_driver_kpi(driver, 'total_km', date_from, date_to)
     
     def _get_driver_total_days(self, driver, date_from=None, date_to=None):
         """
@@ -239,11 +293,7 @@ class FleetVehicleScore(models.Model):
         :param date_to: optional period end
         :return: float total days
         """
-        self.ensure_one()
-        Mission = self.env['fleet.mission']
-        domain = self._get_driver_missions_domain(driver, date_from, date_to)
-        missions = Mission.search(domain)
-        return sum(missions.mapped('duration_days'))
+        return self._get_driver_kpi(driver, 'total_days', date_from, date_to)
     
     def _get_driver_avg_km(self, driver, date_from=None, date_to=None):
         """
@@ -255,18 +305,7 @@ class FleetVehicleScore(models.Model):
         :param date_to: optional period end
         :return: float average km (0 if no missions)
         """
-        self.ensure_one()
-        Mission = self.env['fleet.mission']
-        domain = self._get_driver_missions_domain(
-            driver, date_from, date_to, exclude_zero_km=True
-        )
-        missions = Mission.search(domain)
-        
-        if not missions:
-            return 0.0
-        
-        total_km = sum(missions.mapped('distance_km'))
-        return total_km / len(missions)
+        return self._get_driver_kpi(driver, 'avg_km', date_from, date_to)
     
     def _get_driver_missions_with_km_count(self, driver, date_from=None, date_to=None):
         """
@@ -277,12 +316,7 @@ class FleetVehicleScore(models.Model):
         :param date_to: optional period end
         :return: integer count
         """
-        self.ensure_one()
-        Mission = self.env['fleet.mission']
-        domain = self._get_driver_missions_domain(
-            driver, date_from, date_to, exclude_zero_km=True
-        )
-        return Mission.search_count(domain)
+        return self._get_driver_kpi(driver, 'missions_with_km_count', date_from, date_to)
     
     # ==========================================================================
     # Action Methods (Smart Buttons)
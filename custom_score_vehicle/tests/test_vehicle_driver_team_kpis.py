@@ -288,3 +288,56 @@ class TestVehicleDriverTeamKpis(TransactionCase):
                 hasattr(vehicle, method),
                 f"Vehicle should have {method} method"
             )
+
+    # ==========================================================================
+    # Batched KPI API
+    # ==========================================================================
+
+    def test_batched_kpis_match_helpers(self):
+        """Batched KPIs should return the same values as the per-pair helpers."""
+        self._create_mission(self.driver_1, state='done', distance_km=100, duration_days=2)
+        self._create_mission(self.driver_1, state='done', distance_km=0, duration_days=1)
+        self._create_mission(self.driver_2, state='done', distance_km=300, duration_days=4)
+        self._create_mission(self.driver_2, state='cancelled', distance_km=50)
+        drivers = self.driver_1 | self.driver_2
+
+        kpis = self.test_vehicle._get_driver_kpis(drivers)
+
+        self.assertEqual(kpis[self.test_vehicle.id, self.driver_1.id], {
+            'mission_count': 2,
+            'total_km': 100,
+            'total_days': 3,
+            'avg_km': 100,
+            'missions_with_km_count': 1,
+        })
+        for driver in drivers:
+            pair = kpis[self.test_vehicle.id, driver.id]
+            self.assertEqual(pair['mission_count'], self.test_vehicle._get_driver_mission_count(driver))
+            self.assertEqual(pair['total_km'], self.test_vehicle._get_driver_total_km(driver))
+            self.assertEqual(pair['total_days'], self.test_vehicle._get_driver_total_days(driver))
+            self.assertEqual(pair['avg_km'], self.test_vehicle._get_driver_avg_km(driver))
+
+    def test_batched_kpis_query_count_is_constant(self):
+        """The number of queries should not grow with vehicles and drivers."""
+        vehicles = self.test_vehicle
+        for index in range(5):
+            vehicles |= self.Vehicle.create({
+                'model_id': self.vehicle_model.id,
+                'license_plate': f'TEST-KPI-B{index}',
+            })
+        drivers = self.Partner.create([
+            {'name': f'Test Driver KPI Batch {index}'} for index in range(10)
+        ])
+        self._create_mission(drivers[0], state='done', distance_km=100)
+
+        def count_queries(vehicle_set, driver_set):
+            self.env.invalidate_all()
+            start = self.cr.sql_log_count
+            vehicle_set._get_driver_kpis(driver_set)
+            return self.cr.sql_log_count - start
+
+        self.assertEqual(
+            count_queries(self.test_vehicle, drivers[0]),
+            count_queries(vehicles, drivers),
+            "Batched KPIs should use a constant number of queries"
+        )
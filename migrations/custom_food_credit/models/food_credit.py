@@ -8,14 +8,25 @@
 #
 #############################################################################
 import logging
+import time
+from collections import defaultdict
 from datetime import datetime
 
 from dateutil.relativedelta import relativedelta
 from odoo import _, api, fields, models
 from odoo.exceptions import UserError
+from odoo.tools import split_every
 
 _logger = logging.getLogger(__name__)
 
+MONTHS_FR = {
+    1: 'JANVIER', 2: 'FÉVRIER', 3: 'MARS', 4: 'AVRIL',
+    5: 'MAI', 6: 'JUIN', 7: 'JUILLET', 8: 'AOÛT',
+    9: 'SEPTEMBRE', 10: 'OCTOBRE', 11: 'NOVEMBRE', 12: 'DÉCEMBRE'
+}
+# Taille des lots de create() lors de la génération mensuelle
+GENERATION_BATCH_SIZE = 1000
+
 
 class FoodCredit(models.Model):
     _name = 'food.credit'
@@ -101,15 +112,6 @@ class FoodCredit(models.Model):
         start_date = today.replace(day=1)
         end_date = (start_date + relativedelta(months=1)) - relativedelta(days=1)
         
-        months_fr = {
-            1: 'JANVIER', 2: 'FÉVRIER', 3: 'MARS', 4: 'AVRIL',
-            5: 'MAI', 6: 'JUIN', 7: 'JUILLET', 8: 'AOÛT',
-            9: 'SEPTEMBRE', 10: 'OCTOBRE', 11: 'NOVEMBRE', 12: 'DÉCEMBRE'
-        }
-        
-        month_name = months_fr[today.month]
-        year = today.year
-        
         # Rechercher toutes les sociétés avec un montant de crédit alimentaire
         companies = self.env['res.partner'].search([
             ('is_company', '=', True),
@@ -117,99 +119,168 @@ class FoodCredit(models.Model):
             ('is_food', '=', True)
         ])
         
-        created_credits = []
-        existing_credits = []
-        total_lines_created = 0
-        
-        for company in companies:
-            name = f"CREDIT/{month_name}/{year}/{company.name.upper()}"
-            
-            # Vérifier si le crédit existe déjà
-            existing_credit = self.env['food.credit'].search([
-                ('name', '=', name)
-            ], limit=1)
-            
-            if existing_credit:
-                existing_credits.append(existing_credit)
-                continue
-            
-            # Créer le crédit
-            food_credit = self.env['food.credit'].create({
-                'name': name,
-                'partner_company_id': company.id,
-                'amount': company.amount_food,
-                'start': start_date.date(),
-                'end': end_date.date(),
-            })
-            
-            # Générer les lignes pour ce crédit
-            lines_count = self._create_lines_for_credit(food_credit)
-            total_lines_created += lines_count
-            
-            created_credits.append(food_credit)
-        
-        # Préparer le message de retour
-        message_parts = []
-        if created_credits:
-            message_parts.append(f"{len(created_credits)} crédit(s) créé(s)")
-        if existing_credits:
-            message_parts.append(f"{len(existing_credits)} crédit(s) existaient déjà")
-        if total_lines_created:
-            message_parts.append(f"{total_lines_created} ligne(s) générée(s)")
-        
-        message = " - ".join(message_parts)
+        stats = self._generate_monthly_credits(companies, start_date.date(), end_date.date())
         
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': 'Génération des crédits terminée',
-                'message': message,
-                'type': 'success' if created_credits else 'info',
+                'message': self._format_generation_message(stats),
+                'type': 'success' if stats['credits_created'] else 'info',
             }
         }
-    
-    def _create_lines_for_credit(self, food_credit):
-        """Créer les lignes pour un crédit spécifique"""
-        # Supprimer les lignes existantes (au cas où)
-        food_credit.line_ids.unlink()
-        
-        # Rechercher les partenaires enfants de la société
-        partners = self.env['res.partner'].search([
-            ('parent_id', '=', food_credit.partner_company_id.id),
-            ('active', '=', True)  # Seulement les partenaires actifs
-        ])
-        
-        lines_created = 0
-        for partner in partners:
-            self.env['food.credit.line'].create({
-                'partner_id': partner.id,
-                'amount': food_credit.partner_company_id.amount_food,
-                'start': food_credit.start,
-                'end': food_credit.end,
-                'food_id': food_credit.id,
-                'partner_company_id': food_credit.partner_company_id.id,
-            })
-            lines_created += 1
-        
-        return lines_created
+
+    @api.model
+    def _generate_monthly_credits(self, companies, start_date, end_date, overwrite=False):
+        """Moteur de génération des crédits mensuels.
+
+        Les crédits existants du mois sont préchargés en une requête, les
+        nouveaux crédits créés par lots, puis les lignes de tous les crédits
+        concernés synchronisées par _sync_lines.
+
+        Args:
+            companies: sociétés clientes (res.partner)
+            start_date, end_date: bornes du mois
+            overwrite: mettre à jour les crédits existants et leurs lignes
+
+        Returns:
+            dict des compteurs de crédits et de lignes, et durée en secondes
+        """
+        started = time.monotonic()
+        month_name = MONTHS_FR[start_date.month]
+        names = {
+            company.id: f"CREDIT/{month_name}/{start_date.year}/{company.name.upper()}"
+            for company in companies
+        }
+        existing_credits = {}
+        for credit in self.search([('name', 'in', list(names.values()))]):
+            existing_credits.setdefault(credit.name, credit)
+
+        stats = {'credits_created': 0, 'credits_updated': 0, 'credits_existing': 0}
+        create_vals = []
+        updates = defaultdict(lambda: self.browse())
+        for company in companies:
+            credit = existing_credits.get(names[company.id])
+            if not credit:
+                create_vals.append({
+                    'name': names[company.id],
+                    'partner_company_id': company.id,
+                    'amount': company.amount_food,
+                    'start': start_date,
+                    'end': end_date,
+                })
+            elif overwrite:
+                updates[company.amount_food] |= credit
+            else:
+                stats['credits_existing'] += 1
+
+        credits = self.browse()
+        for amount, to_update in updates.items():
+            to_update.write({'amount': amount, 'start': start_date, 'end': end_date})
+            credits |= to_update
+            stats['credits_updated'] += len(to_update)
+        for vals_list in split_every(GENERATION_BATCH_SIZE, create_vals, list):
+            credits |= self.create(vals_list)
+        stats['credits_created'] = len(create_vals)
+
+        stats.update(credits._sync_lines())
+        stats['elapsed'] = time.monotonic() - started
+        _logger.info("Food credit generation %s/%s: %s", start_date.month, start_date.year, stats)
+        return stats
+
+    def _sync_lines(self):
+        """Aligne les lignes des crédits sur les employés actifs de leur société.
+
+        Employés et lignes existantes sont chargés en une requête chacun. Les
+        lignes manquantes sont créées par lots, les lignes divergentes mises à
+        jour et celles des anciens employés supprimées si elles n'ont pas été
+        consommées.
+
+        Returns:
+            dict des lignes créées, mises à jour et supprimées
+        """
+        Line = self.env['food.credit.line']
+        stats = {'lines_created': 0, 'lines_updated': 0, 'lines_removed': 0}
+        if not self:
+            return stats
+
+        employees = defaultdict(list)
+        for partner in self.env['res.partner'].search([
+            ('parent_id', 'in', self.partner_company_id.ids),
+            ('active', '=', True),  # Seulement les partenaires actifs
+        ]):
+            employees[partner.parent_id.id].append(partner.id)
+
+        lines_by_credit = defaultdict(dict)
+        obsolete_lines = Line
+        for line in Line.search([('food_id', 'in', self.ids)]):
+            if line.partner_id.id in lines_by_credit[line.food_id.id]:
+                obsolete_lines |= line
+            else:
+                lines_by_credit[line.food_id.id][line.partner_id.id] = line
+
+        create_vals = []
+        updates = defaultdict(lambda: Line)
+        for credit in self:
+            company = credit.partner_company_id
+            values = {
+                'amount': company.amount_food,
+                'start': credit.start,
+                'end': credit.end,
+                'partner_company_id': company.id,
+            }
+            existing_lines = lines_by_credit[credit.id]
+            for partner_id in employees[company.id]:
+                line = existing_lines.pop(partner_id, None)
+                if not line:
+                    create_vals.append(dict(values, partner_id=partner_id, food_id=credit.id))
+                elif (line.amount, line.start, line.end, line.partner_company_id.id) != tuple(values.values()):
+                    updates[tuple(values.items())] |= line
+            for line in existing_lines.values():
+                obsolete_lines |= line
+
+        for values, lines in updates.items():
+            lines.write(dict(values))
+            stats['lines_updated'] += len(lines)
+        obsolete_lines = obsolete_lines.filtered(lambda line: not line.amount_used)
+        stats['lines_removed'] = len(obsolete_lines)
+        obsolete_lines.unlink()
+        for vals_list in split_every(GENERATION_BATCH_SIZE, create_vals, list):
+            Line.create(vals_list)
+        stats['lines_created'] = len(create_vals)
+        return stats
+
+    @api.model
+    def _format_generation_message(self, stats):
+        message_parts = []
+        if stats.get('credits_created'):
+            message_parts.append(f"{stats['credits_created']} crédit(s) créé(s)")
+        if stats.get('credits_updated'):
+            message_parts.append(f"{stats['credits_updated']} crédit(s) mis à jour")
+        if stats.get('credits_existing'):
+            message_parts.append(f"{stats['credits_existing']} crédit(s) existaient déjà")
+        if stats.get('lines_created'):
+            message_parts.append(f"{stats['lines_created']} ligne(s) générée(s)")
+        if stats.get('lines_updated'):
+            message_parts.append(f"{stats['lines_updated']} ligne(s) mise(s) à jour")
+        if stats.get('lines_removed'):
+            message_parts.append(f"{stats['lines_removed']} ligne(s) supprimée(s)")
+        message = " - ".join(message_parts) or "Aucune action effectuée"
+        return f"{message} ({stats.get('elapsed', 0.0):.1f} s)"
 
     def action_regenerate_selected_credits(self):
         """Régénérer les lignes pour les crédits sélectionnés"""
-        total_lines = 0
-        for record in self:
-            # Supprimer les anciennes lignes
-            record.line_ids.unlink()
-            # Créer les nouvelles lignes
-            lines_count = self._create_lines_for_credit(record)
-            total_lines += lines_count
+        started = time.monotonic()
+        stats = self._sync_lines()
+        stats['elapsed'] = time.monotonic() - started
         
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': 'Régénération terminée',
-                'message': f'Lignes régénérées pour {len(self)} crédit(s) - {total_lines} ligne(s) créée(s)',
+                'message': f'Lignes régénérées pour {len(self)} crédit(s) - {self._format_generation_message(stats)}',
                 'type': 'success',
             }
         }
@@ -223,6 +294,7 @@ class FoodCreditLine(models.Model):
     partner_id = fields.Many2one(
         'res.partner',
         'Client',
+        index=True,
         ondelete='cascade',  # Auto-delete line if partner is deleted
     ) 
     partner_name = fields.Char(related='partner_id.name', string='Nom du client', store=True)
@@ -241,14 +313,90 @@ class FoodCreditLine(models.Model):
     state = fields.Selection(related='food_id.state', string='État', store=True)
     invoice_text = fields.Text('Factures')
     move_ids = fields.Many2many('account.move', string='Facture associée', readonly=True)
+    operation_ids = fields.One2many(
+        'food.credit.operation',
+        'line_id',
+        string='Operations du credit alimentaire')
 
 
     def append_invoice_line(self, text):
         if text:
             self.invoice_text = (self.invoice_text or "") + f"{text}\n"
 
+    def _get_invoice_text(self):
+        """Texte de facturation: historique libre + operations POS structurees"""
+        self.ensure_one()
+        lines = [
+            f"POS: {operation.operation_date} - {operation.name} - {operation.amount_operation:.2f} FCFA"
+            for operation in self.operation_ids.sorted('operation_date')
+        ]
+        return (self.invoice_text or "") + "".join(f"{line}\n" for line in lines)
+
+    @api.model
+    def _lock_active_lines(self, partner_ids, date_from, date_to):
+        """Verrouille en une requete les lignes en cours des clients sur la periode.
+
+        Les lignes sont verrouillees par ordre d'id pour que deux caisses
+        concurrentes attendent l'une sur l'autre au lieu de valider toutes
+        les deux le meme solde.
+        """
+        if not partner_ids:
+            return self.browse()
+        self.flush_model(['partner_id', 'start', 'end', 'state', 'amount', 'amount_used'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM food_credit_line
+             WHERE partner_id IN %s
+               AND state = 'in_progress'
+               AND start <= %s
+               AND "end" >= %s
+             ORDER BY id
+               FOR UPDATE
+        """, [tuple(partner_ids), date_to, date_from])
+        lines = self.browse(row[0] for row in self.env.cr.fetchall())
+        # Relire les montants consommes apres obtention du verrou
+        lines.invalidate_recordset(['amount_used'])
+        return lines
+
+    def _apply_consumption(self, operation_vals_list):
+        """Impute un lot d'operations sur des lignes deja verrouillees.
+
+        Une seule mise a jour incrementale pour toutes les lignes, puis une
+        ligne food.credit.operation par paiement.
+        """
+        totals = defaultdict(float)
+        for vals in operation_vals_list:
+            totals[vals['line_id']] += vals['amount_operation']
+        if not totals:
+            return self.env['food.credit.operation']
+        values = ", ".join(["(%s::int, %s::float)"] * len(totals))
+        self.env.cr.execute(f"""
+            UPDATE food_credit_line AS l
+               SET amount_used = COALESCE(l.amount_used, 0) + v.delta,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES {values}) AS v(id, delta)
+             WHERE l.id = v.id
+        """, [self.env.uid] + [value for item in totals.items() for value in item])
+        lines = self.browse(list(totals))
+        lines.invalidate_recordset(['amount_used'])
+        lines.modified(['amount_used'])
+        return self.env['food.credit.operation'].create(operation_vals_list)
+
 
     @api.onchange('amount', 'amount_used')
     def compute_solde(self):
         for record in self:
-            record.solde = record.amount - record.amount_used
\ No newline at end of file
+            record.solde = record.amount - record.amount_used
+
+
+class FoodCreditOperation(models.Model):
+    _name = 'food.credit.operation'
+    _description = 'Operation de credit alimentaire'
+    _order = 'operation_date desc, id desc'
+
+    name = fields.Char(string='Nom', required=True, copy=False)
+    amount_operation = fields.Float(string="Montant", default=0.0)
+    operation_date = fields.Datetime("Date de l'operation")
+    line_id = fields.Many2one('food.credit.line', string='Credit alimentaire', required=True, index=True, ondelete='cascade')
+    pos_payment_id = fields.Many2one('pos.payment', string='Paiement POS', index=True, ondelete='set null')
\ No newline at end of file
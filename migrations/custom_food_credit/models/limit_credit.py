@@ -9,6 +9,7 @@
 #############################################################################
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from collections import defaultdict
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
@@ -75,6 +76,45 @@ class LimitCredit(models.Model):
         for record in self:
             record.amount_limit_solde = record.amount_limit - record.amount_limit_consumed
 
+    @api.model
+    def _lock_for_partners(self, partner_ids):
+        """Verrouille en une requete les limites de credit des clients (par ordre d'id)"""
+        if not partner_ids:
+            return self.browse()
+        self.flush_model(['partner_id', 'amount_limit_consumed'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM limit_credit
+             WHERE partner_id IN %s
+             ORDER BY id
+               FOR UPDATE
+        """, [tuple(partner_ids)])
+        limits = self.browse(row[0] for row in self.env.cr.fetchall())
+        # Relire le consomme apres obtention du verrou
+        limits.invalidate_recordset(['amount_limit_consumed'])
+        return limits
+
+    def _apply_consumption(self, operation_vals_list):
+        """Impute un lot d'operations sur des limites deja verrouillees"""
+        totals = defaultdict(float)
+        for vals in operation_vals_list:
+            totals[vals['limit_id']] += vals['amount_operation']
+        if not totals:
+            return self.env['limit.credit.operation']
+        values = ", ".join(["(%s::int, %s::float)"] * len(totals))
+        self.env.cr.execute(f"""
+            UPDATE limit_credit AS l
+               SET amount_limit_consumed = COALESCE(l.amount_limit_consumed, 0) + v.delta,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES {values}) AS v(id, delta)
+             WHERE l.id = v.id
+        """, [self.env.uid] + [value for item in totals.items() for value in item])
+        limits = self.browse(list(totals))
+        limits.invalidate_recordset(['amount_limit_consumed'])
+        limits.modified(['amount_limit_consumed'])
+        return self.env['limit.credit.operation'].create(operation_vals_list)
+
 
     def open_limit_credit_form(self):
         """Ouvre la vue forme de la limite de credit sélectionné"""
@@ -100,4 +140,5 @@ class LimitCreditOperation(models.Model):
     name = fields.Char(string='Nom', required=True, copy=False)
     amount_operation = fields.Float(string="Montant", default=0.0)
     operation_date = fields.Datetime("Date de l'operation")
-    limit_id = fields.Many2one('limit.credit', string='Limite de credit')
\ No newline at end of file
+    limit_id = fields.Many2one('limit.credit', string='Limite de credit')
+    pos_payment_id = fields.Many2one('pos.payment', string='Paiement POS', index=True, ondelete='set null')
\ No newline at end of file
@@ -1,131 +1,133 @@
 # Approche simplifiée - Dans votre modèle pos.payment
 
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
 class PosPayment(models.Model):
     _inherit = 'pos.payment'
 
-    def _check_food_credit_before_payment(self):
+    def _check_food_credit_partner(self):
         """
-        Méthode simple appelée avant chaque paiement alimentaire
+        Vérifications de base du client pour un paiement alimentaire
         """
-        if not self.payment_method_id.is_food:
-            return True
-            
-        order = self.pos_order_id
-        partner = order.partner_id
-        
-        # Vérifications de base
+        partner = self.pos_order_id.partner_id
         if not partner:
             raise UserError("Un client doit être sélectionné pour le crédit alimentaire.")
             
         if not partner.parent_id or not partner.parent_id.is_food:
             raise UserError("Ce client n'a pas accès au crédit alimentaire.")
         
-        # Trouver le crédit alimentaire actif
-        food_credit = self.env['food.credit.line'].search([
-            ('partner_id', '=', partner.id),
-            ('start', '<=', order.date_order),
-            ('end', '>=', order.date_order),
-            ('state', '=', 'in_progress')
-        ], limit=1)
-        
-        if not food_credit:
-            raise UserError("Aucun crédit alimentaire valide pour ce client.")
-        
-        # Vérifier le solde
-        solde_disponible = food_credit.amount - food_credit.amount_used
-        if self.amount > solde_disponible:
-            raise UserError(f"Crédit insuffisant ! Disponible: {solde_disponible:.2f} FCFA")
-        
         return True
     
-    def _check_limit_credit_before_payment(self):
+    def _check_limit_credit_partner(self):
         """
-        Méthode simple appelée avant chaque paiement alimentaire
+        Vérifications de base du client pour un paiement en compte client
         """
-        if not self.payment_method_id.is_limit:
-            return True
-            
-        order = self.pos_order_id
-        partner = order.partner_id
-        
-        # Vérifications de base
+        partner = self.pos_order_id.partner_id
         if not partner:
             raise UserError("Un client doit être sélectionné pour le Compte client.")
             
         if not partner.is_limit:
             raise UserError("Ce client n'a pas accès au Compte client.")
-    
-        limit_credit = self.env['limit.credit'].search([
-            ('partner_id', '=', partner.id),
-        ], limit=1)
-        
-        if not limit_credit:
-            raise UserError("Aucune limite de crédit valide pour ce client.")
-        
-        # Vérifier le solde
-        solde_disponible = limit_credit.amount_limit - limit_credit.amount_limit_consumed
-        if self.amount > solde_disponible:
-            raise UserError(f"Crédit insuffisant ! Disponible: {solde_disponible:.2f} FCFA")
         
         return True
 
     @api.model_create_multi
     def create(self, vals_list):
         """
-        Surcharge de create pour vérifier avant création du paiement
+        Surcharge de create pour vérifier et imputer les crédits de tout le lot
         """
         payments = super().create(vals_list)
-        
-        for payment in payments:
-            if payment.payment_method_id.is_food:
-                payment._check_food_credit_before_payment()
-                payment._update_food_credit()
-
-            if payment.payment_method_id.is_limit:
-                payment._check_limit_credit_before_payment()
-                payment._update_limit_credit()
-                
+        payments._consume_food_credit()
+        payments._consume_limit_credit()
         return payments
 
-    def _update_food_credit(self):
+    def _consume_food_credit(self):
         """
-        Met à jour le crédit alimentaire utilisé
+        Vérifie et impute en une fois les paiements alimentaires du lot.
+
+        Les lignes de crédit concernées sont verrouillées en une requête, les
+        soldes sont contrôlés paiement par paiement sur les valeurs relues sous
+        verrou, puis une seule mise à jour est appliquée.
         """
-        if not self.payment_method_id.is_food:
-            return
-            
-        food_credit = self.env['food.credit.line'].search([
-            ('partner_id', '=', self.pos_order_id.partner_id.id),
-            ('start', '<=', self.pos_order_id.date_order),
-            ('end', '>=', self.pos_order_id.date_order),
-            ('state', '=', 'in_progress')
-        ], limit=1)
-        
-        if food_credit:
-            food_credit.amount_used += self.amount
-            food_credit.append_invoice_line(
-                    f"POS: {self.payment_date} - {self.pos_order_id.pos_reference} - {self.amount:.2f} FCFA"
-                )
-            
-    def _update_limit_credit(self):
+        payments = self.filtered(lambda p: p.payment_method_id.is_food)
+        if not payments:
+            return self.env['food.credit.operation']
+        for payment in payments:
+            payment._check_food_credit_partner()
+
+        dates = payments.mapped('pos_order_id.date_order')
+        lines = self.env['food.credit.line']._lock_active_lines(
+            payments.pos_order_id.partner_id.ids, min(dates), max(dates))
+        lines_by_partner = defaultdict(list)
+        for line in lines:
+            lines_by_partner[line.partner_id.id].append(line)
+        remaining = {line.id: line.amount - line.amount_used for line in lines}
+
+        operation_vals_list = []
+        for payment in payments:
+            order = payment.pos_order_id
+            food_credit = next((
+                line for line in lines_by_partner[order.partner_id.id]
+                if line.start <= order.date_order <= line.end
+            ), None)
+            if not food_credit:
+                raise UserError("Aucun crédit alimentaire valide pour ce client.")
+
+            solde_disponible = remaining[food_credit.id]
+            if payment.amount > solde_disponible:
+                raise UserError(f"Crédit insuffisant ! Disponible: {solde_disponible:.2f} FCFA")
+            remaining[food_credit.id] -= payment.amount
+
+            operation_vals_list.append({
+                'line_id': food_credit.id,
+                'pos_payment_id': payment.id,
+                'name': order.pos_reference,
+                'amount_operation': payment.amount,
+                'operation_date': payment.payment_date,
+            })
+
+        return lines._apply_consumption(operation_vals_list)
+
+    def _consume_limit_credit(self):
         """
-        Met à jour la limite crédit utilisé
+        Vérifie et impute en une fois les paiements en compte client du lot
         """
-        if not self.payment_method_id.is_limit:
-            return
-            
-        limit_credit = self.env['limit.credit'].search([
-            ('partner_id', '=', self.pos_order_id.partner_id.id),
-        ], limit=1)
-        
-        if limit_credit:
-            limit_credit.amount_limit_consumed += self.amount
-            self.env['limit.credit.operation'].create({
-                    'limit_id': limit_credit.id,
-                    'name': "POS - %s" % self.pos_order_id.pos_reference,
-                    'amount_operation': self.amount,
-                    'operation_date': fields.Datetime.now(),
-                })
+        payments = self.filtered(lambda p: p.payment_method_id.is_limit)
+        if not payments:
+            return self.env['limit.credit.operation']
+        for payment in payments:
+            payment._check_limit_credit_partner()
+
+        limits = self.env['limit.credit']._lock_for_partners(payments.pos_order_id.partner_id.ids)
+        limit_by_partner = {}
+        for limit_credit in limits:
+            limit_by_partner.setdefault(limit_credit.partner_id.id, limit_credit)
+        remaining = {
+            limit_credit.id: limit_credit.amount_limit - limit_credit.amount_limit_consumed
+            for limit_credit in limits
+        }
+
+        operation_vals_list = []
+        for payment in payments:
+            order = payment.pos_order_id
+            limit_credit = limit_by_partner.get(order.partner_id.id)
+            if not limit_credit:
+                raise UserError("Aucune limite de crédit valide pour ce client.")
+
+            solde_disponible = remaining[limit_credit.id]
+            if payment.amount > solde_disponible:
+                raise UserError(f"Crédit insuffisant ! Disponible: {solde_disponible:.2f} FCFA")
+            remaining[limit_credit.id] -= payment.amount
+
+            operation_vals_list.append({
+                'limit_id': limit_credit.id,
+                'pos_payment_id': payment.id,
+                'name': "POS - %s" % order.pos_reference,
+                'amount_operation': payment.amount,
+                'operation_date': payment.payment_date,
+            })
+
+        return limits._apply_consumption(operation_vals_list)
@@ -34,27 +34,57 @@ class ResPartnerInherit(models.Model):
     @api.depends('food_id', 'parent_id', 'parent_id.is_food')
     def _compute_food_credit_balance(self):
         """Compute the current food credit balance for a partner from active food.credit.line"""
-        now = datetime.now()
-        FoodCreditLine = self.env['food.credit.line'].sudo()
-        
+        balances = self._get_food_credit_balances()
         for partner in self:
-            balance = 0.0
-            # Check if partner has an active food credit line
-            # Partners with food credit are employees of a company that has is_food=True
-            if partner.parent_id and partner.parent_id.is_food:
-                # Find active food credit line for this partner
-                food_line = FoodCreditLine.search([
-                    ('partner_id', '=', partner.id),
-                    ('state', '=', 'in_progress'),
-                    ('start', '<=', now),
-                    ('end', '>=', now),
-                ], limit=1, order='id desc')
-                
-                if food_line:
-                    balance = food_line.solde
-            
-            partner.food_credit_balance = balance
-    
+            partner.food_credit_balance = balances.get(partner.id, 0.0)
+
+    def _get_food_credit_balances(self, at=None):
+        """Balance of the active food credit line of every partner of the recordset.
+
+        Only employees of a company with is_food=True have a balance. When
+        several lines are active, the most recent one is used. One query for
+        the whole recordset (DISTINCT ON the partner, latest line first).
+
+        Returns:
+            dict: {partner_id: balance} for the partners with an active line
+        """
+        partner_ids = [partner_id for partner_id in self.ids if partner_id]
+        if not partner_ids:
+            return {}
+        at = at or datetime.now()
+        self.env['res.partner'].flush_model(['parent_id', 'is_food'])
+        self.env['food.credit.line'].flush_model(['partner_id', 'state', 'start', 'end', 'amount', 'amount_used'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (line.partner_id)
+                   line.partner_id,
+                   COALESCE(line.amount, 0) - COALESCE(line.amount_used, 0)
+              FROM food_credit_line line
+              JOIN res_partner partner ON partner.id = line.partner_id
+              JOIN res_partner parent ON parent.id = partner.parent_id
+             WHERE line.partner_id IN %s
+               AND parent.is_food
+               AND line.state = 'in_progress'
+               AND line.start <= %s
+               AND line."end" >= %s
+             ORDER BY line.partner_id, line.id DESC
+        """, [tuple(partner_ids), at, at])
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def get_food_credit_balances(self, partner_ids):
+        """POS endpoint: current food credit balance of some partners.
+
+        Called by the POS after a food credit payment to refresh the loaded
+        partners without reloading them all.
+
+        Returns:
+            dict: {partner_id: balance}, 0.0 for partners without active line
+        """
+        partners = self.browse(partner_ids).exists()
+        partners.check_access('read')
+        balances = partners.sudo()._get_food_credit_balances()
+        return {partner.id: balances.get(partner.id, 0.0) for partner in partners}
+
     @api.model
     def _load_pos_data_fields(self, config):
         """Extend POS data loading to include food credit fields"""
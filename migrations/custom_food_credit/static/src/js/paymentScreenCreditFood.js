@@ -67,5 +67,25 @@ patch(PaymentScreen.prototype, {
         
         // Continuer normalement - la vérification détaillée se fait côté serveur
         return super.addNewPaymentLine(paymentMethod);
-    }
+    },
+
+    async _finalizeValidation() {
+        const order = this.currentOrder;
+        const partner = order.partner_id;
+        const paidWithFood = order.payment_ids.some((line) => line.payment_method_id.is_food);
+        await super._finalizeValidation(...arguments);
+        if (partner && paidWithFood) {
+            // Rafraîchir uniquement le solde du client, sans recharger tous les partenaires
+            try {
+                const balances = await this.pos.data.call("res.partner", "get_food_credit_balances", [
+                    [partner.id],
+                ]);
+                if (partner.id in balances) {
+                    partner.food_credit_balance = balances[partner.id];
+                }
+            } catch (error) {
+                console.warn("Impossible de rafraîchir le solde du crédit alimentaire", error);
+            }
+        }
+    },
 });
\ No newline at end of file
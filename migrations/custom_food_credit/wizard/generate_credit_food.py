@@ -44,55 +44,13 @@ class FoodCreditGenerationWizard(models.TransientModel):
         start_date = datetime(year_int, month_int, 1)
         end_date = (start_date + relativedelta(months=1)) - relativedelta(days=1)
         
-        months_fr = {
-            1: 'JANVIER', 2: 'FÉVRIER', 3: 'MARS', 4: 'AVRIL',
-            5: 'MAI', 6: 'JUIN', 7: 'JUILLET', 8: 'AOÛT',
-            9: 'SEPTEMBRE', 10: 'OCTOBRE', 11: 'NOVEMBRE', 12: 'DÉCEMBRE'
-        }
-        month_name = months_fr[month_int]
-        
-        created_credits = []
-        updated_credits = []
-        total_lines = 0
-        
-        for company in self.company_ids:
-            name = f"CREDIT/{month_name}/{year_int}/{company.name.upper()}"
-            
-            existing_credit = food_credit_obj.search([('name', '=', name)], limit=1)
-            
-            if existing_credit and not self.overwrite_existing:
-                continue
-            elif existing_credit and self.overwrite_existing:
-                # Mettre à jour le crédit existant
-                existing_credit.write({
-                    'amount': company.amount_food,
-                    'start': start_date.date(),
-                    'end': end_date.date(),
-                })
-                lines_count = food_credit_obj._create_lines_for_credit(existing_credit)
-                updated_credits.append(existing_credit)
-                total_lines += lines_count
-            else:
-                # Créer nouveau crédit
-                food_credit = food_credit_obj.create({
-                    'name': name,
-                    'partner_company_id': company.id,
-                    'amount': company.amount_food,
-                    'start': start_date.date(),
-                    'end': end_date.date(),
-                })
-                lines_count = food_credit_obj._create_lines_for_credit(food_credit)
-                created_credits.append(food_credit)
-                total_lines += lines_count
-        
-        # Message de retour
-        message_parts = []
-        if created_credits:
-            message_parts.append(f"{len(created_credits)} crédit(s) créé(s)")
-        if updated_credits:
-            message_parts.append(f"{len(updated_credits)} crédit(s) mis à jour")
-        if total_lines:
-            message_parts.append(f"{total_lines} ligne(s) générée(s)")
+        stats = food_credit_obj._generate_monthly_credits(
+            self.company_ids,
+            start_date.date(),
+            end_date.date(),
+            overwrite=self.overwrite_existing,
+        )
+        _logger.info("Génération des crédits: %s", food_credit_obj._format_generation_message(stats))
         
         return {'type': 'ir.actions.act_window_close'}
         # return {
@@ -100,7 +58,7 @@ class FoodCreditGenerationWizard(models.TransientModel):
         #     'tag': 'display_notification',
         #     'params': {
         #         'title': 'Génération terminée',
-        #         'message': " - ".join(message_parts) if message_parts else "Aucune action effectuée",
+        #         'message': food_credit_obj._format_generation_message(stats),
         #         'type': 'success',
         #     }
         # }
\ No newline at end of file
@@ -1,7 +1,15 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from collections import defaultdict
 from datetime import datetime
 import calendar
+import logging
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Nombre de crédits facturés par lot (un commit par lot)
+INVOICE_CHUNK_SIZE = 50
 
 
 class FoodCreditInvoiceWizard(models.TransientModel):
@@ -45,6 +53,19 @@ class FoodCreditInvoiceWizard(models.TransientModel):
         default=fields.Date.context_today,
         required=True
     )
+    plan = fields.Json(
+        string='Plan de facturation',
+        readonly=True,
+        copy=False,
+        help="Montants à facturer calculés une fois et partagés entre l'aperçu et la génération"
+    )
+    plan_cursor = fields.Integer(
+        string='Crédits traités',
+        readonly=True,
+        copy=False,
+        default=0,
+        help="Position de reprise dans le plan de facturation"
+    )
     
     @api.model
     def default_get(self, fields_list):
@@ -130,8 +151,199 @@ class FoodCreditInvoiceWizard(models.TransientModel):
                 record.date_end.second != 59):
                 raise ValidationError("La date de fin doit être le dernier jour du mois à 23:59:59")
     
+    # -------------------------------------------------------------------------
+    # PLAN DE FACTURATION
+    # -------------------------------------------------------------------------
+
+    def _get_plan_key(self):
+        """Paramètres dont dépend le plan: crédits sélectionnés et période"""
+        return [
+            sorted(self.food_ids.ids),
+            fields.Datetime.to_string(self.date_start),
+            fields.Datetime.to_string(self.date_end),
+        ]
+
+    def _get_plan_version(self):
+        """Version des données du plan: dernière modification des crédits
+        sélectionnés et de leurs lignes"""
+        if not self.food_ids:
+            return False
+        self.env['food.credit'].flush_model(['write_date'])
+        self.env['food.credit.line'].flush_model(['food_id', 'write_date'])
+        self.env.cr.execute("""
+            SELECT GREATEST(MAX(c.write_date), MAX(l.write_date))
+              FROM food_credit c
+              LEFT JOIN food_credit_line l ON l.food_id = c.id
+             WHERE c.id IN %s
+        """, [tuple(self.food_ids.ids)])
+        version = self.env.cr.fetchone()[0]
+        return fields.Datetime.to_string(version) if version else False
+
+    def _get_invoice_plan(self):
+        """Retourne le plan de facturation, calculé une seule fois par wizard.
+
+        L'aperçu et la génération partagent le plan stocké sur le wizard; il
+        est recalculé (et le curseur remis à zéro) si la sélection ou la
+        période ont changé, ou si les crédits ont été modifiés avant le début
+        de la génération. Une génération entamée garde son plan pour pouvoir
+        reprendre; chaque lot revérifie les factures existantes.
+        """
+        self.ensure_one()
+        key = self._get_plan_key()
+        version = self._get_plan_version()
+        if (not self.plan or self.plan.get('key') != key
+                or (not self.plan_cursor and self.plan.get('version') != version)):
+            plan = self._compute_invoice_plan()
+            plan['key'] = key
+            plan['version'] = version
+            self.write({'plan': plan, 'plan_cursor': 0})
+        return self.plan
+
+    def _compute_invoice_plan(self):
+        """Calcule les montants à facturer de tous les crédits en une requête.
+
+        Returns:
+            dict: {'credit_count': nombre de crédits de la période,
+                   'entries': [{'credit_id', 'credit_name', 'partner_id',
+                                'partner_name', 'amount', 'line_count'}],
+                   'errors': [messages des crédits écartés]}
+        """
+        plan = {'credit_count': 0, 'entries': [], 'errors': []}
+        if not self.food_ids:
+            return plan
+
+        self.env['food.credit'].flush_model(['name', 'partner_company_id', 'amount_used', 'write_date'])
+        self.env['food.credit.line'].flush_model(['food_id', 'amount_used'])
+        self.env.cr.execute("""
+            SELECT c.id, c.name, c.partner_company_id, COALESCE(c.amount_used, 0),
+                   COUNT(l.id),
+                   COUNT(l.id) FILTER (WHERE l.amount_used > 0),
+                   COALESCE(SUM(l.amount_used) FILTER (WHERE l.amount_used > 0), 0)
+              FROM food_credit c
+              LEFT JOIN food_credit_line l ON l.food_id = c.id
+             WHERE c.id IN %s
+               AND c.write_date BETWEEN %s AND %s
+             GROUP BY c.id
+             ORDER BY c.id
+        """, [tuple(self.food_ids.ids), self.date_start, self.date_end])
+        rows = self.env.cr.fetchall()
+        plan['credit_count'] = len(rows)
+
+        existing_invoices = self._get_existing_invoices([row[1] for row in rows if row[1]])
+        partners = self.env['res.partner'].browse(row[2] for row in rows if row[2])
+        partner_names = dict(zip(partners.ids, partners.mapped('name')))
+
+        for credit_id, name, partner_id, credit_amount, line_count, invoiced_line_count, amount in rows:
+            label = name or credit_id
+            if not partner_id:
+                plan['errors'].append(f"Crédit {label}: Aucun client défini")
+            elif credit_amount <= 0:
+                plan['errors'].append(f"Crédit {label}: Montant utilisé invalide ({credit_amount})")
+            elif not line_count:
+                plan['errors'].append(f"Crédit {label}: Aucune ligne de crédit trouvée")
+            elif (name, partner_id) in existing_invoices:
+                plan['errors'].append(f"Crédit {label}: Facture déjà existante ({existing_invoices[name, partner_id]})")
+            elif not invoiced_line_count:
+                plan['errors'].append(f"Crédit {label}: Aucune ligne avec montant > 0 trouvée")
+            else:
+                plan['entries'].append({
+                    'credit_id': credit_id,
+                    'credit_name': name or f'Crédit {credit_id}',
+                    'partner_id': partner_id,
+                    'partner_name': partner_names.get(partner_id),
+                    'amount': amount,
+                    'line_count': invoiced_line_count,
+                })
+        return plan
+
+    def _get_existing_invoices(self, refs):
+        """Factures non annulées déjà liées aux crédits, par (ref, client)"""
+        if not refs:
+            return {}
+        moves = self.env['account.move'].search([
+            ('ref', 'in', refs),
+            ('state', '!=', 'cancel')
+        ])
+        existing = {}
+        for move in moves:
+            existing.setdefault((move.ref, move.partner_id.id), move.name)
+        return existing
+
+    # -------------------------------------------------------------------------
+    # GÉNÉRATION
+    # -------------------------------------------------------------------------
+
+    def _create_invoice_chunk(self, entries):
+        """Crée les factures d'un lot d'entrées du plan.
+
+        Les lignes de crédit du lot sont lues en une requête et les factures
+        créées en un seul create(vals_list).
+
+        Returns:
+            tuple: (factures créées, erreurs)
+        """
+        credits = self.env['food.credit'].browse(entry['credit_id'] for entry in entries)
+        # Une facture a pu être créée depuis le calcul du plan (reprise, autre utilisateur)
+        existing_invoices = self._get_existing_invoices([entry['credit_name'] for entry in entries])
+
+        lines_by_credit = defaultdict(list)
+        for line in self.env['food.credit.line'].search([
+            ('food_id', 'in', credits.ids),
+            ('amount_used', '>', 0),  # Seulement les lignes avec un montant
+        ]):
+            lines_by_credit[line.food_id.id].append(line)
+
+        account_id = (self.product_id.property_account_income_id.id or
+                      self.product_id.categ_id.property_account_income_categ_id.id)
+        errors = []
+        invoice_vals_list = []
+        invoiced_credits = self.env['food.credit']
+        for entry, credit in zip(entries, credits):
+            existing_invoice = existing_invoices.get((entry['credit_name'], entry['partner_id']))
+            if existing_invoice:
+                errors.append(f"Crédit {entry['credit_name']}: Facture déjà existante ({existing_invoice})")
+                continue
+            if not lines_by_credit[credit.id]:
+                errors.append(f"Crédit {entry['credit_name']}: Aucune ligne avec montant > 0 trouvée")
+                continue
+
+            invoice_vals_list.append({
+                'move_type': 'out_invoice',
+                'partner_id': entry['partner_id'],
+                'journal_id': self.journal_id.id,
+                'invoice_date': self.invoice_date,
+                'ref': credit.name,
+                'invoice_line_ids': [(0, 0, {
+                    'product_id': self.product_id.id,
+                    'name': f'Crédit Alimentaire - {line.partner_name}',
+                    'quantity': 1,
+                    'invoice_text': line._get_invoice_text(),
+                    'price_unit': line.amount_used,
+                    'account_id': account_id,
+                }) for line in lines_by_credit[credit.id]],
+                'food_id': credit.id,  # Lien vers le crédit alimentaire
+            })
+            invoiced_credits |= credit
+
+        invoices = self.env['account.move'].create(invoice_vals_list)
+        # Lier les factures aux crédits alimentaires via move_id
+        for credit, invoice in zip(invoiced_credits, invoices):
+            credit.write({'move_id': invoice.id, 'invoiced': True})
+        return invoices, errors
+
+    def _commit_chunk(self):
+        """Valide le lot traité pour que la progression survive à un échec ultérieur"""
+        if getattr(threading.current_thread(), 'testing', False):
+            return
+        self.env.cr.commit()
+
     def action_generate_invoices(self):
-        """Générer les factures pour les crédits alimentaires sélectionnés"""
+        """Générer les factures pour les crédits alimentaires sélectionnés.
+
+        Le plan est parcouru par lots de INVOICE_CHUNK_SIZE crédits, chaque lot
+        étant validé avec la position du curseur: après une erreur, relancer la
+        génération reprend au premier lot non traité.
+        """
         if not self.food_ids:
             raise UserError("Veuillez sélectionner au moins un crédit alimentaire.")
         
@@ -141,93 +353,25 @@ class FoodCreditInvoiceWizard(models.TransientModel):
         if not self.journal_id:
             raise UserError("Veuillez sélectionner un journal de vente.")
         
-        # Filtrer les crédits selon la période sélectionnée
-        filtered_credits = self.food_ids.filtered(
-            lambda c: c.write_date >= self.date_start and c.write_date <= self.date_end
-        )
-        
-        if not filtered_credits:
+        plan = self._get_invoice_plan()
+        if not plan['credit_count']:
             raise UserError("Aucun crédit alimentaire trouvé dans la période sélectionnée.")
         
+        entries = plan['entries']
         created_invoices = self.env['account.move']
-        invoice_vals_list = []
-        errors = []
-        
-        for credit in filtered_credits:
-            try:
-                # Validations
-                if not credit.partner_company_id:
-                    errors.append(f"Crédit {credit.name or credit.id}: Aucun client défini")
-                    continue
-                    
-                if credit.amount_used <= 0:
-                    errors.append(f"Crédit {credit.name or credit.id}: Montant utilisé invalide ({credit.amount_used})")
-                    continue
-                
-                if not credit.line_ids:
-                    errors.append(f"Crédit {credit.name or credit.id}: Aucune ligne de crédit trouvée")
-                    continue
-                
-                # Vérifier si une facture existe déjà pour ce crédit
-                existing_invoice = self.env['account.move'].search([
-                    ('ref', '=', credit.name),
-                    ('partner_id', '=', credit.partner_company_id.id),
-                    ('state', '!=', 'cancel')
-                ], limit=1)
-                
-                if existing_invoice:
-                    errors.append(f"Crédit {credit.name or credit.id}: Facture déjà existante ({existing_invoice.name})")
-                    continue
-                
-                # Préparer les lignes de facture à partir des line_ids
-                invoice_line_vals_list = []
-                for line in credit.line_ids:
-                    if line.amount_used > 0:  # Seulement les lignes avec un montant
-                        invoice_line_vals = {
-                            'product_id': self.product_id.id,
-                            'name': f'Crédit Alimentaire - {line.partner_name}',
-                            'quantity': 1,
-                            'invoice_text': line.invoice_text,
-                            'price_unit': line.amount_used,
-                            'account_id': self.product_id.property_account_income_id.id or 
-                                        self.product_id.categ_id.property_account_income_categ_id.id,
-                        }
-                        invoice_line_vals_list.append((0, 0, invoice_line_vals))
-                
-                # Vérifier qu'il y a des lignes à facturer
-                if not invoice_line_vals_list:
-                    errors.append(f"Crédit {credit.name or credit.id}: Aucune ligne avec montant > 0 trouvée")
-                    continue
-                
-                # Préparer les valeurs de la facture
-                invoice_vals = {
-                    'move_type': 'out_invoice',
-                    'partner_id': credit.partner_company_id.id,
-                    'journal_id': self.journal_id.id,
-                    'invoice_date': self.invoice_date,
-                    'ref': credit.name,
-                    'invoice_line_ids': invoice_line_vals_list,
-                    'food_id': credit.id,  # Lien vers le crédit alimentaire
-                }
-                
-                invoice_vals_list.append(invoice_vals)
-                
-            except Exception as e:
-                errors.append(f"Crédit {credit.name or credit.id}: {str(e)}")
+        errors = list(plan['errors'])
         
-        # Créer les factures
-        if invoice_vals_list:
+        while self.plan_cursor < len(entries):
+            chunk = entries[self.plan_cursor:self.plan_cursor + INVOICE_CHUNK_SIZE]
             try:
-                created_invoices = self.env['account.move'].create(invoice_vals_list)
-                
-                # Lier les factures aux crédits alimentaires via move_id
-
-                for i, credit in enumerate([c for c in filtered_credits if not any(str(c.id) in error for error in errors)]):
-                    if i < len(created_invoices):
-                        credit.write({'move_id': created_invoices[i].id, 'invoiced': True})
-                
+                invoices, chunk_errors = self._create_invoice_chunk(chunk)
             except Exception as e:
                 raise UserError(f"Erreur lors de la création des factures: {str(e)}")
+            created_invoices |= invoices
+            errors += chunk_errors
+            self.plan_cursor += len(chunk)
+            self._commit_chunk()
+            _logger.info("Food credit invoicing: %d/%d credits processed", self.plan_cursor, len(entries))
         
         # Préparer le message de résultat
         message_parts = []
@@ -244,72 +388,38 @@ class FoodCreditInvoiceWizard(models.TransientModel):
             raise UserError("Aucune facture à créer.")
         
         # Afficher le message de résultat
-        if message_parts:
-            message = "\n".join(message_parts)
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': 'Génération des factures',
-                    'message': message,
-                    'type': 'success' if created_invoices else 'warning',
-                    'sticky': True,
-                }
+        message = "\n".join(message_parts)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Génération des factures',
+                'message': message,
+                'type': 'success' if created_invoices else 'warning',
+                'sticky': True,
             }
-        
-        if created_invoices:
-            return {'type': 'ir.actions.act_window_close'}
-            # return {
-            #     'type': 'ir.actions.act_window_close',
-            #     'name': 'Factures Créées',
-            #     'res_model': 'account.move',
-            #     'view_mode': 'tree,form',
-            #     'domain': [('id', 'in', created_invoices.ids)],
-            #     'context': {
-            #         'default_move_type': 'out_invoice',
-            #         'create': False,
-            #     },
-            #     'target': 'current',
-            # }
+        }
     
     def action_preview_invoices(self):
-        """Prévisualiser les factures qui seront créées"""
+        """Prévisualiser les factures qui seront créées (à partir du plan partagé)"""
         if not self.food_ids:
             raise UserError("Veuillez sélectionner au moins un crédit alimentaire.")
         
-        # Filtrer les crédits selon la période
-        filtered_credits = self.food_ids.filtered(
-            lambda c: c.write_date >= self.date_start and c.write_date <= self.date_end
-        )
-        
-        preview_data = []
-        total_amount = 0
-        total_lines = 0
-        
-        for credit in filtered_credits:
-            if credit.partner_company_id and credit.amount_used > 0 and credit.line_ids:
-                # Compter les lignes avec montant > 0
-                valid_lines = credit.line_ids.filtered(lambda l: l.amount_used > 0)
-                line_count = len(valid_lines)
-                
-                if line_count > 0:
-                    preview_data.append({
-                        'partner_name': credit.partner_company_id.name,
-                        'amount_used': credit.amount_used,
-                        'credit_name': credit.name or f'Crédit {credit.id}',
-                        'line_count': line_count
-                    })
-                    total_amount += credit.amount_used
-                    total_lines += line_count
+        plan = self._get_invoice_plan()
+        preview_data = plan['entries'][self.plan_cursor:]
+        total_amount = sum(data['amount'] for data in preview_data)
+        total_lines = sum(data['line_count'] for data in preview_data)
         
         message = f"Aperçu de la génération:\n\n"
         message += f"Nombre de factures à créer: {len(preview_data)}\n"
         message += f"Nombre total de lignes: {total_lines}\n"
         message += f"Montant total: {total_amount:.2f}\n\n"
+        if plan['errors']:
+            message += f"Crédits écartés: {len(plan['errors'])}\n\n"
         message += "Détail des factures:\n"
         
         for data in preview_data[:10]:  # Limiter à 10 pour l'affichage
-            message += f"• {data['partner_name']}: {data['amount_used']:.2f} ({data['line_count']} lignes)\n"
+            message += f"• {data['partner_name']}: {data['amount']:.2f} ({data['line_count']} lignes)\n"
         
         if len(preview_data) > 10:
             message += f"• ... et {len(preview_data) - 10} autres factures"
@@ -323,4 +433,4 @@ class FoodCreditInvoiceWizard(models.TransientModel):
                 'type': 'info',
                 'sticky': True,
             }
-        }
\ No newline at end of file
+        }
@@ -4,6 +4,16 @@ from odoo import api, fields, models
 
 _logger = logging.getLogger(__name__)
 
+# Closing report categories and the payment method flags that select them
+CLOTURE_PAYMENT_FLAGS = {
+    'ventes_en_compte': ('is_limit',),
+    'especes': ('is_cash_count',),
+    'cheques': ('is_cheque',),
+    'cartes': ('is_bank_card',),
+    'avoir': ('is_loyalty', 'is_food'),
+    'titres': ('is_titre_paiement',),
+}
+
 class PosOrder(models.Model):
     _inherit = "pos.order"
 
@@ -345,42 +355,46 @@ class PosSession(models.Model):
         - Order 2: Gift card B ($500) used $200 → remaining $300
         → Total écart = $1678 + $300 = $1978
         
-        NOTE: We track unique gift cards to avoid double-counting if the same card is used multiple times.
+        NOTE: Each gift card is counted once per session, even if used on several orders.
         """
+        ecarts = self._get_ecart_reglement_by_session()
         for session in self:
-            total_ecart = 0.0
-            used_card_ids = set()  # Track unique gift cards to avoid double-counting
-            
-            for order in session.order_ids:
-                # Get all reward lines that have a coupon_id (check for gift cards)
-                for line in order.lines:
-                    if not line.is_reward_line:
-                        continue
-                    # Safely access coupon_id - it's a Many2one, so single or empty
-                    card = line.coupon_id
-                    if not card:
-                        continue
-                    # Skip if we already counted this card
-                    if card.id in used_card_ids:
-                        continue
-                    # Safely check if this is a gift card program
-                    try:
-                        program = card.program_id
-                        if not program or program.program_type != 'gift_card':
-                            continue
-                    except Exception:
-                        # In case of any access issues during batch processing, skip
-                        continue
-                    
-                    # Mark this card as processed
-                    used_card_ids.add(card.id)
-                    
-                    # Add the remaining balance of this gift card
-                    remaining_balance = card.points
-                    if remaining_balance > 0:
-                        total_ecart += remaining_balance
-            
-            session.ecart_reglement = total_ecart
+            session.ecart_reglement = ecarts.get(session.id, 0.0)
+
+    def _get_ecart_reglement_by_session(self):
+        """Remaining balance of the distinct gift cards used by each session.
+
+        One query for the whole recordset: the reward lines give the distinct
+        (session, card) pairs, then the positive balances of the gift cards
+        are summed per session.
+
+        Returns:
+            dict: {session_id: ecart}
+        """
+        session_ids = [session_id for session_id in self.ids if session_id]
+        if not session_ids:
+            return {}
+        self.env['pos.order'].flush_model(['session_id'])
+        self.env['pos.order.line'].flush_model(['order_id', 'is_reward_line', 'coupon_id'])
+        self.env['loyalty.card'].flush_model(['program_id', 'points'])
+        self.env['loyalty.program'].flush_model(['program_type'])
+        self.env.cr.execute("""
+            SELECT used.session_id, SUM(card.points)
+              FROM (
+                    SELECT DISTINCT o.session_id, l.coupon_id
+                      FROM pos_order_line l
+                      JOIN pos_order o ON o.id = l.order_id
+                     WHERE o.session_id IN %s
+                       AND l.is_reward_line
+                       AND l.coupon_id IS NOT NULL
+                   ) used
+              JOIN loyalty_card card ON card.id = used.coupon_id
+              JOIN loyalty_program program ON program.id = card.program_id
+             WHERE program.program_type = 'gift_card'
+               AND card.points > 0
+             GROUP BY used.session_id
+        """, [tuple(session_ids)])
+        return {session_id: float(total or 0.0) for session_id, total in self.env.cr.fetchall()}
 
     def _loader_params_product_product(self):
         result = super()._loader_params_product_product()
@@ -488,32 +502,106 @@ class PosSession(models.Model):
             'saved_value': self.prelevement_especes_amount,
         }
 
+    def _get_cloture_payment_totals(self):
+        """
+        Count and total of the session payments for each closing category.
+
+        Payments are grouped by payment method in one query, then each
+        method is dispatched to the categories of CLOTURE_PAYMENT_FLAGS it
+        belongs to (a method may count in several categories, as before).
+        Flags defined by optional modules (is_limit, is_food, is_loyalty) are
+        considered unset when the module is not installed.
+        """
+        self.ensure_one()
+        totals = {category: {'count': 0, 'total': 0.0} for category in CLOTURE_PAYMENT_FLAGS}
+        groups = self.env['pos.payment'].read_group(
+            [('session_id', '=', self.id)],
+            ['amount:sum'],
+            ['payment_method_id'],
+            lazy=False,
+        )
+        PaymentMethod = self.env['pos.payment.method']
+        for group in groups:
+            if not group['payment_method_id']:
+                continue
+            method = PaymentMethod.browse(group['payment_method_id'][0])
+            for category, flags in CLOTURE_PAYMENT_FLAGS.items():
+                if any(flag in method._fields and method[flag] for flag in flags):
+                    totals[category]['count'] += group['__count']
+                    totals[category]['total'] += group['amount'] or 0.0
+        return totals
+
+    def _get_cloture_tax_breakdown(self):
+        """
+        VAT breakdown of the session order lines, by tax rate, in one query.
+
+        The rate of a line is the sum of its tax rates (0% without tax),
+        rounded to 2 digits; combo child lines are skipped to avoid double
+        counting.
+
+        Returns:
+            list: [{'tax_percent', 'ca_ht', 'tva', 'total'}] sorted by rate
+        """
+        self.ensure_one()
+        OrderLine = self.env['pos.order.line']
+        tax_field = OrderLine._fields['tax_ids']
+        self.env['pos.order'].flush_model(['session_id'])
+        OrderLine.flush_model(['order_id', 'combo_parent_id', 'price_subtotal', 'price_subtotal_incl', 'tax_ids'])
+        self.env['account.tax'].flush_model(['amount'])
+        self.env.cr.execute(f"""
+            SELECT line_tax.tax_percent,
+                   SUM(line_tax.price_subtotal),
+                   SUM(line_tax.price_subtotal_incl)
+              FROM (
+                    SELECT l.id,
+                           l.price_subtotal,
+                           l.price_subtotal_incl,
+                           ROUND(COALESCE(SUM(t.amount), 0)::numeric, 2) AS tax_percent
+                      FROM pos_order_line l
+                      JOIN pos_order o ON o.id = l.order_id
+                 LEFT JOIN "{tax_field.relation}" rel ON rel."{tax_field.column1}" = l.id
+                 LEFT JOIN account_tax t ON t.id = rel."{tax_field.column2}"
+                     WHERE o.session_id = %s
+                       AND l.combo_parent_id IS NULL
+                  GROUP BY l.id
+                   ) line_tax
+             GROUP BY line_tax.tax_percent
+             ORDER BY line_tax.tax_percent
+        """, [self.id])
+        repartition_tva = []
+        for tax_percent, ca_ht, total in self.env.cr.fetchall():
+            ca_ht = float(ca_ht or 0.0)
+            total = float(total or 0.0)
+            repartition_tva.append({
+                'tax_percent': float(tax_percent),
+                'ca_ht': ca_ht,
+                'tva': total - ca_ht,
+                'total': total,
+            })
+        return repartition_tva
+
     def _get_cloture_caisse_data(self):
         """
         Get data for the "Cloture de caisse" report.
         Section 1: Ventes en compte (Glovo/Yango payments)
         Section 2: Fond de caisse initial (opening drawer contents)
         Section 3: Encaissements comptants (cash receipts by payment type)
+        Section 4: Prélèvements (user's counted amounts)
+        Section 6: Ecart de caisse (cash gap)
+        Section 7: Répartition de la TVA (tax breakdown)
+
+        Payments come from one query grouped by payment method
+        (_get_cloture_payment_totals), the VAT from one query grouped by tax
+        rate (_get_cloture_tax_breakdown) and the gift card gap from the
+        distinct card query of _get_ecart_reglement_by_session.
         """
         self.ensure_one()
-        
-        # ============================================
-        # SECTION 1: Ventes en compte (En cours / Compte client)
-        # ============================================
-        # Using is_limit field from custom_food_credit module
-        ventes_en_compte_payments = self.env['pos.payment'].search([
-            ('session_id', '=', self.id),
-            ('payment_method_id.is_limit', '=', True),
-        ])
-        
-        ventes_en_compte = {
-            'count': len(ventes_en_compte_payments),
-            'total': sum(ventes_en_compte_payments.mapped('amount')),
-        }
-        
-        # ============================================
+        payments = self._get_cloture_payment_totals()
+
+        # SECTION 1: Ventes en compte (is_limit, from custom_food_credit)
+        ventes_en_compte = payments['ventes_en_compte']
+
         # SECTION 2: Fond de caisse initial
-        # ============================================
         # Espèces: Initial cash amount when POS was opened
         # Chèques, Cartes, Titres: Always 0 (not part of initial drawer)
         fond_de_caisse_initial = {
@@ -522,65 +610,19 @@ class PosSession(models.Model):
             'cartes': 0.0,
             'titres_paiements': 0.0,
         }
-        
-        # ============================================
+
         # SECTION 3: Encaissements comptants
-        # ============================================
-        # Get all payments for this session
-        all_payments = self.env['pos.payment'].search([
-            ('session_id', '=', self.id),
-        ])
-        
-        # Espèces (Cash) - using is_cash_count
-        especes_payments = all_payments.filtered(lambda p: p.payment_method_id.is_cash_count)
-        especes = {
-            'count': len(especes_payments),
-            'total': sum(especes_payments.mapped('amount')),
-        }
-        
-        # Chèques - using is_cheque
-        cheques_payments = all_payments.filtered(lambda p: p.payment_method_id.is_cheque)
-        cheques = {
-            'count': len(cheques_payments),
-            'total': sum(cheques_payments.mapped('amount')),
-        }
-        
-        # Cartes (Bank cards) - using is_bank_card
-        cartes_payments = all_payments.filtered(lambda p: p.payment_method_id.is_bank_card)
-        cartes = {
-            'count': len(cartes_payments),
-            'total': sum(cartes_payments.mapped('amount')),
-        }
-        
-        # Avoir (Credit/Loyalty) - using is_loyalty OR is_food
-        avoir_payments = all_payments.filtered(
-            lambda p: p.payment_method_id.is_loyalty or p.payment_method_id.is_food
-        )
-        avoir = {
-            'count': len(avoir_payments),
-            'total': sum(avoir_payments.mapped('amount')),
-        }
-        
-        # Écart de règlement (gift card unused balance)
-        # This is the ecart_reglement computed field
+        especes = payments['especes']
+        cheques = payments['cheques']
+        cartes = payments['cartes']
+        avoir = payments['avoir']
+        titres = payments['titres']
+        # Écart de règlement (gift card unused balance), informational only
         ecart_regl = {
-            'count': 0,  # No count for this, it's a computed value
-            'total': self.ecart_reglement or 0.0,
+            'count': 0,
+            'total': self._get_ecart_reglement_by_session().get(self.id, 0.0),
         }
-        
-        # Titre de paiements - using is_titre_paiement
-        titres_payments = all_payments.filtered(lambda p: p.payment_method_id.is_titre_paiement)
-        titres = {
-            'count': len(titres_payments),
-            'total': sum(titres_payments.mapped('amount')),
-        }
-        
-        # Total encaissements comptants (excluding ecart_regl as it's informational)
-        total_encaissements = {
-            'count': especes['count'] + cheques['count'] + cartes['count'] + avoir['count'] + titres['count'],
-            'total': especes['total'] + cheques['total'] + cartes['total'] + avoir['total'] + titres['total'],
-        }
-        
+        counted = (especes, cheques, cartes, avoir, titres)
         encaissements_comptants = {
             'especes': especes,
             'cheques': cheques,
@@ -588,213 +630,41 @@ class PosSession(models.Model):
             'avoir': avoir,
             'ecart_regl': ecart_regl,
             'titres': titres,
-            'total': total_encaissements,
+            'total': {
+                'count': sum(section['count'] for section in counted),
+                'total': sum(section['total'] for section in counted),
+            },
         }
-        
-        # ============================================
-        # SECTION 4: Prélèvements (user's counted amounts)
-        # ============================================
+
+        # SECTION 4: Prélèvements
         # Espèces: What user entered as cash count at closing (Nbre=1 by default)
-        # Use our dedicated field to avoid Monetary conversion issues
-        # Use our dedicated field to avoid Monetary conversion issues
-        prelevements_especes = {
-            'count': 1,
-            'total': self.prelevement_especes_amount or 0.0,
-            'total': self.prelevement_especes_amount or 0.0,
-        }
-        
         # Chèques, Cartes, Titres: Same as encaissements (not recounted physically)
-        prelevements_cheques = cheques.copy()
-        prelevements_cartes = cartes.copy()
-        prelevements_titres = titres.copy()
-        
-        # Total prélèvements
-        total_prelevements = {
-            'count': prelevements_especes['count'] + prelevements_cheques['count'] + prelevements_cartes['count'] + prelevements_titres['count'],
-            'total': prelevements_especes['total'] + prelevements_cheques['total'] + prelevements_cartes['total'] + prelevements_titres['total'],
-        }
-        
         prelevements = {
-            'especes': prelevements_especes,
-            'cheques': prelevements_cheques,
-            'cartes': prelevements_cartes,
-            'titres': prelevements_titres,
-            'total': total_prelevements,
+            'especes': {'count': 1, 'total': self.prelevement_especes_amount or 0.0},
+            'cheques': cheques.copy(),
+            'cartes': cartes.copy(),
+            'titres': titres.copy(),
         }
-        
-        # ============================================
-        # SECTION 6: Ecart de caisse (Cash Gap)
-        # ============================================
-        # Gap = Counted (prelevement) - Transactions (encaissements)
-        # Positive gap = "en trop" (more cash counted than transactions)
-        # Negative gap = "en moins" (less cash counted than transactions)
-        
-        # Espèces: user's counted cash (prélèvement) - total cash transactions (encaissements)
-        ecart_especes = prelevements_especes['total'] - especes['total']
-        
-        # Chèques: prelevement vs encaissement (normally 0)
-        ecart_cheques = prelevements_cheques['total'] - cheques['total']
-        
-        # Cartes: prelevement vs encaissement (normally 0)
-        ecart_cartes = prelevements_cartes['total'] - cartes['total']
-        
-        # Titres de paiements: prelevement vs encaissement (normally 0)
-        ecart_titres = prelevements_titres['total'] - titres['total']
-        
-        ecart_caisse = {
-            'especes': ecart_especes,
-            'cheques': ecart_cheques,
-            'cartes': ecart_cartes,
-            'titres': ecart_titres,
+        prelevements['total'] = {
+            'count': sum(section['count'] for section in prelevements.values()),
+            'total': sum(section['total'] for section in prelevements.values()),
         }
-        
-        # ============================================
-        # SECTION 7: Répartition de la TVA (Tax breakdown)
-        # ============================================
-        # Group order lines by tax percentage and calculate:
-        # - CA HT (Chiffre d'Affaires Hors Taxes) = price_subtotal
-        # - TVA (Tax amount) = price_subtotal_incl - price_subtotal
-        # - TOTAL = price_subtotal_incl
-        
-        # Get all order lines from this session's orders
-        all_order_lines = self.order_ids.mapped('lines')
-        
-        # Dictionary to group by tax percentage
-        # Key: tax percentage (float), Value: {ca_ht, tva, total}
-        tax_breakdown = {}
-        
-        for line in all_order_lines:
-            # Skip combo child lines to avoid double counting
-            if line.combo_parent_id:
-                continue
-                
-            # Get the tax percentage (assuming single tax per line)
-            # If no tax, it's 0%
-            if line.tax_ids:
-                # Sum all tax percentages if multiple taxes (rare case)
-                tax_percent = sum(line.tax_ids.mapped('amount'))
-            else:
-                tax_percent = 0.0
-            
-            # Round to avoid floating point issues (e.g., 18.0 not 18.000001)
-            tax_percent = round(tax_percent, 2)
-            
-            # Calculate amounts
-            ca_ht = line.price_subtotal
-            total = line.price_subtotal_incl
-            tva = total - ca_ht
-            
-            # Add to breakdown
-            if tax_percent not in tax_breakdown:
-                tax_breakdown[tax_percent] = {'ca_ht': 0.0, 'tva': 0.0, 'total': 0.0}
-            
-            tax_breakdown[tax_percent]['ca_ht'] += ca_ht
-            tax_breakdown[tax_percent]['tva'] += tva
-            tax_breakdown[tax_percent]['total'] += total
-        
-        # Convert to sorted list of dicts for template iteration
-        # Sort by tax percentage ascending (0%, 9%, 18%, ...)
-        repartition_tva = []
-        for tax_percent in sorted(tax_breakdown.keys()):
-            data = tax_breakdown[tax_percent]
-            repartition_tva.append({
-                'tax_percent': tax_percent,
-                'ca_ht': data['ca_ht'],
-                'tva': data['tva'],
-                'total': data['total'],
-            })
-        
-        # ============================================
+
         # SECTION 6: Ecart de caisse (Cash Gap)
-        # ============================================
         # Gap = Counted (prelevement) - Transactions (encaissements)
-        # Positive gap = "en trop" (more cash counted than transactions)
-        # Negative gap = "en moins" (less cash counted than transactions)
-        
-        # Espèces: user's counted cash (prélèvement) - total cash transactions (encaissements)
-        ecart_especes = prelevements_especes['total'] - especes['total']
-        
-        # Chèques: prelevement vs encaissement (normally 0)
-        ecart_cheques = prelevements_cheques['total'] - cheques['total']
-        
-        # Cartes: prelevement vs encaissement (normally 0)
-        ecart_cartes = prelevements_cartes['total'] - cartes['total']
-        
-        # Titres de paiements: prelevement vs encaissement (normally 0)
-        ecart_titres = prelevements_titres['total'] - titres['total']
-        
+        # Positive gap = "en trop", negative gap = "en moins"
         ecart_caisse = {
-            'especes': ecart_especes,
-            'cheques': ecart_cheques,
-            'cartes': ecart_cartes,
-            'titres': ecart_titres,
+            key: prelevements[key]['total'] - encaissements_comptants[key]['total']
+            for key in ('especes', 'cheques', 'cartes', 'titres')
         }
-        
-        # ============================================
-        # SECTION 7: Répartition de la TVA (Tax breakdown)
-        # ============================================
-        # Group order lines by tax percentage and calculate:
-        # - CA HT (Chiffre d'Affaires Hors Taxes) = price_subtotal
-        # - TVA (Tax amount) = price_subtotal_incl - price_subtotal
-        # - TOTAL = price_subtotal_incl
-        
-        # Get all order lines from this session's orders
-        all_order_lines = self.order_ids.mapped('lines')
-        
-        # Dictionary to group by tax percentage
-        # Key: tax percentage (float), Value: {ca_ht, tva, total}
-        tax_breakdown = {}
-        
-        for line in all_order_lines:
-            # Skip combo child lines to avoid double counting
-            if line.combo_parent_id:
-                continue
-                
-            # Get the tax percentage (assuming single tax per line)
-            # If no tax, it's 0%
-            if line.tax_ids:
-                # Sum all tax percentages if multiple taxes (rare case)
-                tax_percent = sum(line.tax_ids.mapped('amount'))
-            else:
-                tax_percent = 0.0
-            
-            # Round to avoid floating point issues (e.g., 18.0 not 18.000001)
-            tax_percent = round(tax_percent, 2)
-            
-            # Calculate amounts
-            ca_ht = line.price_subtotal
-            total = line.price_subtotal_incl
-            tva = total - ca_ht
-            
-            # Add to breakdown
-            if tax_percent not in tax_breakdown:
-                tax_breakdown[tax_percent] = {'ca_ht': 0.0, 'tva': 0.0, 'total': 0.0}
-            
-            tax_breakdown[tax_percent]['ca_ht'] += ca_ht
-            tax_breakdown[tax_percent]['tva'] += tva
-            tax_breakdown[tax_percent]['total'] += total
-        
-        # Convert to sorted list of dicts for template iteration
-        # Sort by tax percentage ascending (0%, 9%, 18%, ...)
-        repartition_tva = []
-        for tax_percent in sorted(tax_breakdown.keys()):
-            data = tax_breakdown[tax_percent]
-            repartition_tva.append({
-                'tax_percent': tax_percent,
-                'ca_ht': data['ca_ht'],
-                'tva': data['tva'],
-                'total': data['total'],
-            })
-        
+
         return {
             'ventes_en_compte': ventes_en_compte,
             'fond_de_caisse_initial': fond_de_caisse_initial,
             'encaissements_comptants': encaissements_comptants,
             'prelevements': prelevements,
             'ecart_caisse': ecart_caisse,
-            'repartition_tva': repartition_tva,
-            'ecart_caisse': ecart_caisse,
-            'repartition_tva': repartition_tva,
+            'repartition_tva': self._get_cloture_tax_breakdown(),
         }
 
     def action_print_cloture_caisse(self):
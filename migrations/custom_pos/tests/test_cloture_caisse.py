@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestClotureCaisse(TransactionCase):
+    """The grouped closing engine must match the former per-record computation."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        cash_journal = cls.env['account.journal'].create({
+            'name': 'Caisse test clôture',
+            'type': 'cash',
+            'code': 'CLTC',
+        })
+        bank_journal = cls.env['account.journal'].create({
+            'name': 'Banque test clôture',
+            'type': 'bank',
+            'code': 'CLTB',
+        })
+        PaymentMethod = cls.env['pos.payment.method']
+        cls.cash_method = PaymentMethod.create({'name': 'Espèces', 'journal_id': cash_journal.id})
+        cls.card_method = PaymentMethod.create({
+            'name': 'Carte', 'journal_id': bank_journal.id, 'is_bank_card': True,
+        })
+        cls.cheque_method = PaymentMethod.create({
+            'name': 'Chèque', 'journal_id': bank_journal.id, 'is_cheque': True,
+        })
+        cls.titre_method = PaymentMethod.create({
+            'name': 'Wave', 'journal_id': bank_journal.id, 'is_titre_paiement': True,
+        })
+        methods = cls.cash_method | cls.card_method | cls.cheque_method | cls.titre_method
+        cls.config = cls.env['pos.config'].create({
+            'name': 'Caisse clôture',
+            'payment_method_ids': [(6, 0, methods.ids)],
+        })
+        cls.session = cls.env['pos.session'].create({
+            'config_id': cls.config.id,
+            'user_id': cls.env.uid,
+        })
+        cls.tax_18 = cls.env['account.tax'].create({
+            'name': 'TVA 18% clôture', 'amount': 18.0, 'amount_type': 'percent', 'type_tax_use': 'sale',
+        })
+        cls.tax_9 = cls.env['account.tax'].create({
+            'name': 'TVA 9% clôture', 'amount': 9.0, 'amount_type': 'percent', 'type_tax_use': 'sale',
+        })
+        cls.product = cls.env['product.product'].create({
+            'name': 'Produit clôture', 'available_in_pos': True, 'list_price': 100.0,
+        })
+        program = cls.env['loyalty.program'].create({
+            'name': 'Cartes cadeaux clôture',
+            'program_type': 'gift_card',
+        })
+        cls.gift_card = cls.env['loyalty.card'].create({'program_id': program.id, 'points': 300.0})
+
+        lines_specs = [
+            (cls.tax_18, 100.0, 118.0),
+            (cls.tax_9, 50.0, 54.5),
+            (cls.tax_18 | cls.tax_9, 10.0, 12.7),
+            (cls.env['account.tax'], 20.0, 20.0),
+        ]
+        payments_specs = [cls.cash_method, cls.card_method, cls.cheque_method, cls.titre_method, cls.cash_method]
+        for index, method in enumerate(payments_specs):
+            tax, subtotal, subtotal_incl = lines_specs[index % len(lines_specs)]
+            line_vals = [(0, 0, {
+                'product_id': cls.product.id,
+                'full_product_name': cls.product.name,
+                'qty': 1,
+                'price_unit': subtotal,
+                'price_subtotal': subtotal,
+                'price_subtotal_incl': subtotal_incl,
+                'tax_ids': [(6, 0, tax.ids)],
+            })]
+            if index < 2:
+                # The same gift card used on two orders is counted once
+                line_vals.append((0, 0, {
+                    'product_id': cls.product.id,
+                    'full_product_name': 'Carte cadeau',
+                    'qty': 1,
+                    'price_unit': -5.0,
+                    'price_subtotal': -5.0,
+                    'price_subtotal_incl': -5.0,
+                    'is_reward_line': True,
+                    'coupon_id': cls.gift_card.id,
+                }))
+            order = cls.env['pos.order'].create({
+                'session_id': cls.session.id,
+                'company_id': cls.company.id,
+                'lines': line_vals,
+                'amount_tax': subtotal_incl - subtotal,
+                'amount_total': subtotal_incl,
+                'amount_paid': subtotal_incl,
+                'amount_return': 0.0,
+            })
+            cls.env['pos.payment'].create({
+                'pos_order_id': order.id,
+                'payment_method_id': method.id,
+                'amount': subtotal_incl,
+            })
+        cls.session.prelevement_especes_amount = 150.0
+
+    def _legacy_cloture_data(self, session):
+        """Reference computation: per-payment and per-line loops of the former implementation."""
+        payments = self.env['pos.payment'].search([('session_id', '=', session.id)])
+
+        def section(predicate):
+            selected = payments.filtered(lambda p: predicate(p.payment_method_id))
+            return {'count': len(selected), 'total': sum(selected.mapped('amount'))}
+
+        def flag(method, name):
+            return name in method._fields and method[name]
+
+        especes = section(lambda m: m.is_cash_count)
+        cheques = section(lambda m: m.is_cheque)
+        cartes = section(lambda m: m.is_bank_card)
+        avoir = section(lambda m: flag(m, 'is_loyalty') or flag(m, 'is_food'))
+        titres = section(lambda m: m.is_titre_paiement)
+
+        ecart = 0.0
+        used_card_ids = set()
+        for line in session.order_ids.lines:
+            card = line.coupon_id
+            if not line.is_reward_line or not card or card.id in used_card_ids:
+                continue
+            if card.program_id.program_type != 'gift_card':
+                continue
+            used_card_ids.add(card.id)
+            if card.points > 0:
+                ecart += card.points
+
+        tax_breakdown = {}
+        for line in session.order_ids.lines:
+            if line.combo_parent_id:
+                continue
+            tax_percent = round(sum(line.tax_ids.mapped('amount')), 2)
+            data = tax_breakdown.setdefault(tax_percent, {'ca_ht': 0.0, 'tva': 0.0, 'total': 0.0})
+            data['ca_ht'] += line.price_subtotal
+            data['tva'] += line.price_subtotal_incl - line.price_subtotal
+            data['total'] += line.price_subtotal_incl
+
+        return {
+            'ventes_en_compte': section(lambda m: flag(m, 'is_limit')),
+            'especes': especes,
+            'cheques': cheques,
+            'cartes': cartes,
+            'avoir': avoir,
+            'titres': titres,
+            'ecart_regl': ecart,
+            'repartition_tva': [
+                dict(tax_percent=tax_percent, **tax_breakdown[tax_percent])
+                for tax_percent in sorted(tax_breakdown)
+            ],
+        }
+
+    def test_cloture_data_matches_legacy_computation(self):
+        expected = self._legacy_cloture_data(self.session)
+        data = self.session._get_cloture_caisse_data()
+        encaissements = data['encaissements_comptants']
+
+        self.assertEqual(data['ventes_en_compte'], expected['ventes_en_compte'])
+        for key in ('especes', 'cheques', 'cartes', 'avoir', 'titres'):
+            self.assertEqual(encaissements[key]['count'], expected[key]['count'], key)
+            self.assertAlmostEqual(encaissements[key]['total'], expected[key]['total'], places=2, msg=key)
+        self.assertEqual(encaissements['especes']['count'], 2)
+        self.assertAlmostEqual(encaissements['ecart_regl']['total'], expected['ecart_regl'], places=2)
+        self.assertAlmostEqual(encaissements['ecart_regl']['total'], 300.0, places=2)
+        self.assertAlmostEqual(self.session.ecart_reglement, 300.0, places=2)
+
+        self.assertEqual(
+            [line['tax_percent'] for line in data['repartition_tva']],
+            [line['tax_percent'] for line in expected['repartition_tva']],
+        )
+        for line, expected_line in zip(data['repartition_tva'], expected['repartition_tva']):
+            for key in ('ca_ht', 'tva', 'total'):
+                self.assertAlmostEqual(line[key], expected_line[key], places=2)
+
+        self.assertAlmostEqual(
+            data['ecart_caisse']['especes'], 150.0 - expected['especes']['total'], places=2,
+        )
+        self.assertEqual(data['prelevements']['total']['count'], 1 + 1 + 1 + 1)
+
+    def _count_queries(self):
+        self.env.invalidate_all()
+        start = self.cr.sql_log_count
+        self.session._get_cloture_caisse_data()
+        return self.cr.sql_log_count - start
+
+    def test_cloture_data_query_count(self):
+        """The number of queries does not grow with the number of orders."""
+        self.session._get_cloture_caisse_data()
+        queries = self._count_queries()
+        for _index in range(5):
+            order = self.env['pos.order'].create({
+                'session_id': self.session.id,
+                'company_id': self.company.id,
+                'lines': [(0, 0, {
+                    'product_id': self.product.id,
+                    'full_product_name': self.product.name,
+                    'qty': 1,
+                    'price_unit': 100.0,
+                    'price_subtotal': 100.0,
+                    'price_subtotal_incl': 118.0,
+                    'tax_ids': [(6, 0, self.tax_18.ids)],
+                })],
+                'amount_tax': 18.0,
+                'amount_total': 118.0,
+                'amount_paid': 118.0,
+                'amount_return': 0.0,
+            })
+            self.env['pos.payment'].create({
+                'pos_order_id': order.id,
+                'payment_method_id': self.card_method.id,
+                'amount': 118.0,
+            })
+        self.env.flush_all()
+        self.assertEqual(self._count_queries(), queries)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import time
+from datetime import date, datetime, timedelta
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSaleStatReport(TransactionCase):
+    """The grouped comparison engine on a year of confirmed orders."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        Category = cls.env['res.partner.category']
+        cls.category_a = Category.create({'name': 'Stat A'})
+        cls.category_b = Category.create({'name': 'Stat B'})
+        Partner = cls.env['res.partner']
+        cls.partners = Partner.create([
+            {'name': 'Client stat 1', 'customer_rank': 1, 'category_id': [(6, 0, cls.category_a.ids)]},
+            {'name': 'Client stat 2', 'customer_rank': 1, 'category_id': [(6, 0, cls.category_b.ids)]},
+            {'name': 'Client stat 3', 'customer_rank': 1,
+             'category_id': [(6, 0, (cls.category_a | cls.category_b).ids)]},
+            {'name': 'Client stat 4', 'customer_rank': 1},
+        ])
+        cls.product = cls.env['product.product'].with_context(skip_create_check=True).create({
+            'name': 'Produit stat',
+            'list_price': 100.0,
+        })
+
+        # Une commande confirmée par client et par jour sur un an
+        cls.year_start = date(date.today().year - 1, 1, 1)
+        cls.year_end = date(date.today().year - 1, 12, 31)
+        vals_list = []
+        day = cls.year_start
+        while day <= cls.year_end:
+            for index, partner in enumerate(cls.partners):
+                vals_list.append({
+                    'partner_id': partner.id,
+                    'company_id': cls.company.id,
+                    'date_order': datetime.combine(day, datetime.min.time()) + timedelta(hours=10),
+                    'state': 'sale',
+                    'order_line': [(0, 0, {
+                        'product_id': cls.product.id,
+                        'product_uom_qty': 1,
+                        'price_unit': 100.0 + index * 10,
+                        'tax_ids': [(6, 0, [])],
+                    })],
+                })
+            day += timedelta(days=1)
+        cls.orders = cls.env['sale.order'].create(vals_list)
+
+    def _create_wizard(self, date_start_period1, date_end_period1, date_start_period2, date_end_period2, **vals):
+        return self.env['sale.stat.report.wizard'].create(dict(
+            vals,
+            date_start_period1=date_start_period1,
+            date_end_period1=date_end_period1,
+            date_start_period2=date_start_period2,
+            date_end_period2=date_end_period2,
+            company_id=self.company.id,
+            # Limité aux clients du test (données de démo éventuelles)
+            partner_ids=[(6, 0, self.partners.ids)],
+        ))
+
+    def _count_queries(self, wizard):
+        self.env.invalidate_all()
+        start = self.cr.sql_log_count
+        wizard.get_sale_data_by_category()
+        return self.cr.sql_log_count - start
+
+    def test_01_year_totals_by_category(self):
+        """Counts and revenue per category and period match the orders."""
+        wizard = self._create_wizard(
+            self.year_start, date(self.year_start.year, 6, 30),
+            date(self.year_start.year, 7, 1), self.year_end,
+        )
+        data = wizard.get_sale_data_by_category()
+
+        self.assertEqual(list(data), ['Sans Catégorie', 'Stat A', 'Stat B'])
+        days_p1 = (date(self.year_start.year, 6, 30) - self.year_start).days + 1
+        days_p2 = (self.year_end - date(self.year_start.year, 7, 1)).days + 1
+        # Le client 3 a deux catégories: il compte dans chacune
+        stat_a = data['Stat A']
+        self.assertEqual(set(stat_a['clients']), set((self.partners[0] | self.partners[2]).ids))
+        self.assertEqual(stat_a['total_p1_qty'], 2 * days_p1)
+        self.assertEqual(stat_a['total_p2_qty'], 2 * days_p2)
+        self.assertAlmostEqual(stat_a['total_p1_ca'], (100.0 + 120.0) * days_p1)
+        client = stat_a['clients'][self.partners[0].id]
+        self.assertEqual(client['partner_name'], 'Client stat 1')
+        self.assertEqual(client['prog_qty'], days_p2 - days_p1)
+        self.assertAlmostEqual(client['ca_p2'], 100.0 * days_p2)
+        self.assertEqual(
+            set(data['Sans Catégorie']['clients']), {self.partners[3].id},
+        )
+        self.assertAlmostEqual(data['Sans Catégorie']['total_p2_ca'], 130.0 * days_p2)
+
+    def test_02_query_count_is_constant(self):
+        """The number of queries does not grow with the number of orders."""
+        one_week = self._create_wizard(
+            self.year_start, self.year_start + timedelta(days=6),
+            self.year_start + timedelta(days=7), self.year_start + timedelta(days=13),
+        )
+        full_year = self._create_wizard(
+            self.year_start, date(self.year_start.year, 6, 30),
+            date(self.year_start.year, 7, 1), self.year_end,
+        )
+        self.assertEqual(self._count_queries(one_week), self._count_queries(full_year))
+
+    def test_03_year_report_under_one_second(self):
+        """Benchmark: a year of orders is compared in less than a second."""
+        wizard = self._create_wizard(
+            self.year_start, date(self.year_start.year, 6, 30),
+            date(self.year_start.year, 7, 1), self.year_end,
+        )
+        self.env.invalidate_all()
+        started = time.perf_counter()
+        data = wizard.get_sale_data_by_category()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(sum(cat['total_p1_qty'] + cat['total_p2_qty'] for cat in data.values()),
+                         len(self.orders) + len(self.orders.filtered(
+                             lambda order: self.partners[2] == order.partner_id)))
+        self.assertLess(elapsed, 1.0, "Sale statistics of a year took %.3fs" % elapsed)
@@ -32,12 +32,92 @@ class ReportDailySalesWizard(models.TransientModel):
     def action_print_report(self):
         return self.env.ref('custom_reports.action_report_daily_sales').report_action(self)
 
+    def _get_daily_sales_query(self):
+        """Tables, états et expressions propres à la source (ventes ou POS)"""
+        if self.report_type == 'sale':
+            return {
+                'order_table': 'sale_order',
+                'line_table': 'sale_order_line',
+                'states': ('sale', 'done'),
+                'ca_ht': 'o.amount_untaxed',
+                'line_qty': 'l.product_uom_qty',
+                'line_filter': "AND l.state != 'cancel'",
+            }
+        return {
+            'order_table': 'pos_order',
+            'line_table': 'pos_order_line',
+            'states': ('paid', 'invoiced', 'done'),
+            'ca_ht': 'o.amount_total - COALESCE(o.amount_tax, 0)',
+            'line_qty': 'l.qty',
+            'line_filter': '',
+        }
+
+    def _fetch_daily_sales(self):
+        """Chiffres de tous les jours de la période en une seule requête.
+
+        Les agrégats commandes (CA, clients) et lignes (coût, remises,
+        quantités) sont groupés par jour puis joints à la série complète des
+        jours, de sorte que les jours sans vente apparaissent à zéro.
+
+        Returns:
+            list de tuples (jour, ca_ht, ca_ttc, nb_clients, cout, remises, qte)
+        """
+        source = self._get_daily_sales_query()
+        order_model = 'sale.order' if self.report_type == 'sale' else 'pos.order'
+        self.env[order_model].flush_model()
+        self.env[order_model.replace('.order', '.order.line')].flush_model()
+        self.env['product.product'].flush_model(['standard_price'])
+
+        self.env.cr.execute(f"""
+            WITH orders AS (
+                SELECT o.id,
+                       date_trunc('day', o.date_order)::date AS day,
+                       o.partner_id,
+                       {source['ca_ht']} AS ca_ht,
+                       o.amount_total AS ca_ttc
+                  FROM {source['order_table']} o
+                 WHERE o.date_order >= %(date_from)s
+                   AND o.date_order < %(date_to)s
+                   AND o.state IN %(states)s
+                   AND o.company_id = %(company_id)s
+            ), order_totals AS (
+                SELECT day,
+                       SUM(ca_ht) AS ca_ht,
+                       SUM(ca_ttc) AS ca_ttc,
+                       COUNT(DISTINCT partner_id) AS nb_clients
+                  FROM orders
+                 GROUP BY day
+            ), line_totals AS (
+                SELECT o.day,
+                       SUM({source['line_qty']} * COALESCE((pp.standard_price ->> %(company_key)s)::float, 0)) AS cout,
+                       SUM(l.price_unit * {source['line_qty']} * COALESCE(l.discount, 0) / 100.0) AS remises,
+                       SUM({source['line_qty']}) AS qte
+                  FROM {source['line_table']} l
+                  JOIN orders o ON o.id = l.order_id
+                  LEFT JOIN product_product pp ON pp.id = l.product_id
+                 WHERE TRUE {source['line_filter']}
+                 GROUP BY o.day
+            )
+            SELECT d.day::date,
+                   COALESCE(ot.ca_ht, 0)::float, COALESCE(ot.ca_ttc, 0)::float, COALESCE(ot.nb_clients, 0),
+                   COALESCE(lt.cout, 0)::float, COALESCE(lt.remises, 0)::float, COALESCE(lt.qte, 0)::float
+              FROM generate_series(%(day_from)s::date, %(day_to)s::date, interval '1 day') AS d(day)
+              LEFT JOIN order_totals ot ON ot.day = d.day::date
+              LEFT JOIN line_totals lt ON lt.day = d.day::date
+             ORDER BY d.day
+        """, {
+            'date_from': fields.Datetime.to_datetime(self.date_from),
+            'date_to': fields.Datetime.to_datetime(self.date_to + timedelta(days=1)),
+            'day_from': self.date_from,
+            'day_to': self.date_to,
+            'states': source['states'],
+            'company_id': self.company_id.id,
+            'company_key': str(self.company_id.id),
+        })
+        return self.env.cr.fetchall()
+
     def get_daily_sales(self):
         """Récupère les ventes journalières avec jours en français"""
-        data = []
-        current_date = self.date_from
-        delta = timedelta(days=1)
-
         # ✅ Forcer le format de date français
         try:
             locale.setlocale(locale.LC_TIME, 'fr_FR.UTF-8')
@@ -47,92 +127,25 @@ class ReportDailySalesWizard(models.TransientModel):
             except locale.Error:
                 pass  # Si aucune locale française n'est disponible
 
-        while current_date <= self.date_to:
-            jour = current_date.strftime('%a').capitalize()  # ex: 'Lun', 'Mar', 'Mer'
-            next_day = current_date + delta
-
-            if self.report_type == 'sale':
-                orders = self.env['sale.order'].search([
-                    ('date_order', '>=', fields.Datetime.to_datetime(current_date)),
-                    ('date_order', '<', fields.Datetime.to_datetime(next_day)),
-                    ('state', 'in', ['sale', 'done']),
-                    ('company_id', '=', self.company_id.id),
-                ])
-                order_lines = self.env['sale.order.line'].search([
-                    ('order_id', 'in', orders.ids),
-                    ('state', '!=', 'cancel')
-                ])
-
-                ca_ht = sum(order.amount_untaxed for order in orders)
-                ca_ttc = sum(order.amount_total for order in orders)
-
-                # ✅ CORRECTION : Calcul de la marge réelle (prix de vente - coût d'achat)
-                cout_total = sum(
-                    line.product_uom_qty * line.product_id.standard_price
-                    for line in order_lines
-                )
-                marge = ca_ht - cout_total  # Marge = CA HT - Coût d'achat
-
-                remises = sum(
-                    (l.price_unit * l.product_uom_qty * (l.discount or 0.0) / 100.0)
-                    for l in order_lines
-                )
-                nb_clients = len(set(orders.mapped('partner_id.id')))
-
-            else:  # POS
-                orders = self.env['pos.order'].search([
-                    ('date_order', '>=', fields.Datetime.to_datetime(current_date)),
-                    ('date_order', '<', fields.Datetime.to_datetime(next_day)),
-                    ('state', 'in', ['paid', 'invoiced', 'done']),
-                    ('company_id', '=', self.company_id.id),
-                ])
-                order_lines = self.env['pos.order.line'].search([
-                    ('order_id', 'in', orders.ids)
-                ])
-
-                # ✅ CORRECTION : Récupérer le CA HT depuis les commandes POS
-                ca_ht = sum(order.amount_tax == 0 and order.amount_total or
-                            (order.amount_total - order.amount_tax) for order in orders)
-                ca_ttc = sum(order.amount_total for order in orders)
-
-                # ✅ CORRECTION : Calcul de la marge réelle pour POS
-                cout_total = sum(
-                    line.qty * line.product_id.standard_price
-                    for line in order_lines
-                )
-                marge = ca_ht - cout_total
-
-                remises = sum(
-                    (l.price_unit * l.qty * (l.discount or 0.0) / 100.0)
-                    for l in order_lines
-                )
-                nb_clients = len(set(orders.mapped('partner_id.id')))
-
-            panier_valeur = ca_ttc / nb_clients if nb_clients else 0
-            panier_qte = (
-                sum(order_lines.mapped('product_uom_qty' if self.report_type == 'sale' else 'qty'))
-                / nb_clients if nb_clients else 0
-            )
-            # ✅ CORRECTION : Le % de marge est calculé sur le CA HT, pas le CA TTC
-            pct_marge = (marge / ca_ht * 100.0) if ca_ht else 0.0
-
+        data = []
+        for day, ca_ht, ca_ttc, nb_clients, cout_total, remises, qte in self._fetch_daily_sales():
+            # Marge = CA HT - Coût d'achat; le % de marge est calculé sur le CA HT
+            marge = ca_ht - cout_total
             data.append({
-                'jour': jour,
-                'date': current_date,
+                'jour': day.strftime('%a').capitalize(),  # ex: 'Lun', 'Mar', 'Mer'
+                'date': day,
                 'ca_ht': ca_ht,
                 'ca_ttc': ca_ttc,
                 'marge': marge,
-                'pct_marge': pct_marge,
+                'pct_marge': (marge / ca_ht * 100.0) if ca_ht else 0.0,
                 'nb_clients': nb_clients,
-                'panier_valeur': panier_valeur,
-                'panier_qte': panier_qte,
+                'panier_valeur': ca_ttc / nb_clients if nb_clients else 0,
+                'panier_qte': qte / nb_clients if nb_clients else 0,
                 'remises': remises,
                 'meteo': '',
                 'obs': '',
             })
 
-            current_date = next_day
-
         return data
 
     def get_totaux(self, lignes):
@@ -39,140 +39,125 @@ class SaleStatReportWizard(models.TransientModel):
             if record.date_start_period2 > record.date_end_period2:
                 raise UserError("La date de début de la période 2 doit être avant la date de fin.")
 
-    def get_sale_data_by_category(self):
-        """Retourne un dictionnaire des ventes groupées par catégorie client."""
-        self.ensure_one()
+    def _fetch_sale_stats(self):
+        """Nombre de commandes, CA HT et marge par (client, catégorie, période).
 
-        SaleOrder = self.env['sale.order']
+        Une seule requête sur sale_order jointe à la relation client/catégorie;
+        une commande présente dans les deux périodes compte dans chacune.
 
-        # Domaine de base
-        domain_base = [
-            ('state', 'in', ['sale', 'done']),
-            ('company_id', '=', self.company_id.id),
-        ]
+        Returns:
+            list de tuples (partner_id, category_id ou None, période, nb, ca, marge)
+        """
+        SaleOrder = self.env['sale.order']
+        category_field = self.env['res.partner']._fields['category_id']
+        has_margin = 'margin' in SaleOrder._fields and SaleOrder._fields['margin'].store
+        margin_expr = "COALESCE(o.margin, 0)" if has_margin else "0"
+
+        params = {
+            'company_id': self.company_id.id,
+            'states': ('sale', 'done'),
+            'start_p1': fields.Datetime.to_datetime(self.date_start_period1),
+            'end_p1': fields.Datetime.to_datetime(self.date_end_period1).replace(hour=23, minute=59, second=59),
+            'start_p2': fields.Datetime.to_datetime(self.date_start_period2),
+            'end_p2': fields.Datetime.to_datetime(self.date_end_period2).replace(hour=23, minute=59, second=59),
+        }
+        partner_clause = ""
+        if self.partner_ids:
+            partner_clause = "AND o.partner_id IN %(partner_ids)s"
+            params['partner_ids'] = tuple(self.partner_ids.ids)
+        category_clause = ""
+        if self.category_ids:
+            # Les catégories hors filtre sont ignorées (client alors "Sans Catégorie")
+            category_clause = f"AND rel.{category_field.column2} IN %(category_ids)s"
+            params['category_ids'] = tuple(self.category_ids.ids)
+
+        SaleOrder.flush_model(['partner_id', 'state', 'company_id', 'date_order', 'amount_untaxed']
+                              + (['margin'] if has_margin else []))
+        self.env['res.partner'].flush_model(['category_id'])
+        self.env.cr.execute(f"""
+            SELECT o.partner_id,
+                   rel.{category_field.column2},
+                   p.period,
+                   COUNT(*),
+                   SUM(o.amount_untaxed)::float,
+                   SUM({margin_expr})::float
+              FROM sale_order o
+              JOIN (VALUES (1, %(start_p1)s::timestamp, %(end_p1)s::timestamp),
+                           (2, %(start_p2)s::timestamp, %(end_p2)s::timestamp)) AS p(period, date_from, date_to)
+                ON o.date_order >= p.date_from AND o.date_order <= p.date_to
+              LEFT JOIN {category_field.relation} rel
+                ON rel.{category_field.column1} = o.partner_id {category_clause}
+             WHERE o.state IN %(states)s
+               AND o.company_id = %(company_id)s
+               {partner_clause}
+             GROUP BY o.partner_id, rel.{category_field.column2}, p.period
+        """, params)
+        return self.env.cr.fetchall()
+
+    @staticmethod
+    def _new_category_data(category_id, category_name):
+        return {
+            'category_id': category_id,
+            'category_name': category_name,
+            'clients': {},
+            'total_p1_qty': 0,
+            'total_p1_ca': 0.0,
+            'total_p1_margin': 0.0,
+            'total_p2_qty': 0,
+            'total_p2_ca': 0.0,
+            'total_p2_margin': 0.0,
+        }
+
+    @staticmethod
+    def _new_client_data(partner):
+        return {
+            'partner_name': partner.name,
+            'partner_ref': partner.ref or '',
+            'customer_id': partner.customer_id or '',
+            'qty_p1': 0,
+            'ca_p1': 0.0,
+            'margin_p1': 0.0,
+            'margin_pct_p1': 0.0,
+            'qty_p2': 0,
+            'ca_p2': 0.0,
+            'margin_p2': 0.0,
+            'margin_pct_p2': 0.0,
+            'prog_qty': 0,
+            'prog_ca': 0.0,
+            'prog_margin': 0.0,
+            'prog_ca_pct': 0.0,
+            'prog_margin_pct': 0.0,
+        }
 
+    def get_sale_data_by_category(self):
+        """Retourne un dictionnaire des ventes groupées par catégorie client."""
+        self.ensure_one()
 
-        if self.partner_ids:
-            domain_base.append(('partner_id', 'in', self.partner_ids.ids))
-
-        # Domaines période 1 & 2
-        domain_p1 = domain_base + [
-            ('date_order', '>=', fields.Datetime.to_datetime(self.date_start_period1)),
-            ('date_order', '<=',
-             fields.Datetime.to_datetime(self.date_end_period1).replace(hour=23, minute=59, second=59)),
-        ]
-        domain_p2 = domain_base + [
-            ('date_order', '>=', fields.Datetime.to_datetime(self.date_start_period2)),
-            ('date_order', '<=',
-             fields.Datetime.to_datetime(self.date_end_period2).replace(hour=23, minute=59, second=59)),
-        ]
-
-        orders_p1 = SaleOrder.search(domain_p1)
-        print("orders_p1", orders_p1)
-        orders_p2 = SaleOrder.search(domain_p2)
-        print("orders_p2", orders_p2)
+        rows = self._fetch_sale_stats()
+        partners = {partner.id: partner for partner in self.env['res.partner'].browse({row[0] for row in rows})}
+        categories = self.env['res.partner.category'].browse({row[1] for row in rows if row[1]})
+        category_names = {category.id: category.name for category in categories}
 
         # Structure de données par catégorie
         categories_data = {}
-
-        def add_order(order, period):
-            partner = order.partner_id
-            categories = partner.category_id
-
-            # Si filtrage par catégories activé
-            if self.category_ids:
-                categories = categories.filtered(lambda c: c.id in self.category_ids.ids)
-
+        for partner_id, category_id, period, order_count, amount, margin in rows:
             # Si pas de catégorie, créer "Sans Catégorie"
-            if not categories:
-                cat_key = 'Sans Catégorie'
-                cat_id = 0
-            else:
-                # Pour chaque catégorie du client
-                for categ in categories:
-                    process_category(categ, partner, order, period)
-                return
-
-            # Traitement pour "Sans Catégorie"
+            cat_key = category_names[category_id] if category_id else 'Sans Catégorie'
             if cat_key not in categories_data:
-                categories_data[cat_key] = {
-                    'category_id': cat_id,
-                    'category_name': cat_key,
-                    'clients': {},
-                    'total_p1_qty': 0,
-                    'total_p1_ca': 0.0,
-                    'total_p1_margin': 0.0,
-                    'total_p2_qty': 0,
-                    'total_p2_ca': 0.0,
-                    'total_p2_margin': 0.0,
-                }
-
-            add_partner_data(categories_data[cat_key], partner, order, period)
-
-        def process_category(categ, partner, order, period):
-            cat_key = categ.name
+                categories_data[cat_key] = self._new_category_data(category_id or 0, cat_key)
+            cat_data = categories_data[cat_key]
 
-            if cat_key not in categories_data:
-                categories_data[cat_key] = {
-                    'category_id': categ.id,
-                    'category_name': cat_key,
-                    'clients': {},
-                    'total_p1_qty': 0,
-                    'total_p1_ca': 0.0,
-                    'total_p1_margin': 0.0,
-                    'total_p2_qty': 0,
-                    'total_p2_ca': 0.0,
-                    'total_p2_margin': 0.0,
-                }
-
-            add_partner_data(categories_data[cat_key], partner, order, period)
-
-        def add_partner_data(cat_data, partner, order, period):
-            if partner.id not in cat_data['clients']:
-                cat_data['clients'][partner.id] = {
-                    'partner_name': partner.name,
-                    'partner_ref': partner.ref or '',
-                    'customer_id': partner.customer_id or '',
-                    'qty_p1': 0,
-                    'ca_p1': 0.0,
-                    'margin_p1': 0.0,
-                    'margin_pct_p1': 0.0,
-                    'qty_p2': 0,
-                    'ca_p2': 0.0,
-                    'margin_p2': 0.0,
-                    'margin_pct_p2': 0.0,
-                    'prog_qty': 0,
-                    'prog_ca': 0.0,
-                    'prog_margin': 0.0,
-                    'prog_ca_pct': 0.0,
-                    'prog_margin_pct': 0.0,
-                }
-
-            data = cat_data['clients'][partner.id]
-            margin = getattr(order, 'margin', 0.0)
-
-            if period == 1:
-                data['qty_p1'] += 1
-                data['ca_p1'] += order.amount_untaxed
-                data['margin_p1'] += margin
-
-                cat_data['total_p1_qty'] += 1
-                cat_data['total_p1_ca'] += order.amount_untaxed
-                cat_data['total_p1_margin'] += margin
-            else:
-                data['qty_p2'] += 1
-                data['ca_p2'] += order.amount_untaxed
-                data['margin_p2'] += margin
-
-                cat_data['total_p2_qty'] += 1
-                cat_data['total_p2_ca'] += order.amount_untaxed
-                cat_data['total_p2_margin'] += margin
-
-        # Traiter toutes les commandes
-        for o in orders_p1:
-            add_order(o, 1)
-        for o in orders_p2:
-            add_order(o, 2)
+            if partner_id not in cat_data['clients']:
+                cat_data['clients'][partner_id] = self._new_client_data(partners[partner_id])
+            data = cat_data['clients'][partner_id]
+
+            data[f'qty_p{period}'] += order_count
+            data[f'ca_p{period}'] += amount
+            data[f'margin_p{period}'] += margin
+
+            cat_data[f'total_p{period}_qty'] += order_count
+            cat_data[f'total_p{period}_ca'] += amount
+            cat_data[f'total_p{period}_margin'] += margin
 
         # Calcul des marges % et progressions
         for cat_key, cat_data in categories_data.items():
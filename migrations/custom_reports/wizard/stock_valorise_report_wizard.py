@@ -1,4 +1,10 @@
 # -*- coding: utf-8 -*-
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+import pytz
+
 from odoo import models, fields, api
 from odoo.tools import float_round
 
@@ -84,62 +90,133 @@ class StockValoriseReport(models.TransientModel):
     # -------------------------------------------------------------------------
     # LOGIQUE DU RAPPORT
     # -------------------------------------------------------------------------
-    def _get_stock_by_category(self):
-        """Retourne les données de valorisation à partir de product_ids."""
-        self.ensure_one()
-        categories = {}
-
-        total_articles = 0
+    def _get_report_datetime_end(self):
+        """Fin (exclue) de la journée date_report, en UTC selon le fuseau de l'utilisateur."""
+        tz = pytz.timezone(self.env.user.tz or 'UTC')
+        day_end = datetime.combine(self.date_report + timedelta(days=1), time.min)
+        return tz.localize(day_end).astimezone(pytz.UTC).replace(tzinfo=None)
+
+    def _get_stock_qty_query(self):
+        """Sous-requête des quantités par produit dans l'emplacement (et ses enfants).
+
+        Stock actuel: quants. Date passée: solde des lignes de mouvement
+        terminées avant la fin de date_report.
+        """
+        path = self.location_id.parent_path + '%'
+        if self.date_report >= fields.Date.context_today(self):
+            self.env['stock.quant'].flush_model(['product_id', 'location_id', 'quantity'])
+            return """
+                SELECT q.product_id, SUM(q.quantity) AS qty
+                  FROM stock_quant q
+                  JOIN stock_location l ON l.id = q.location_id
+                 WHERE l.parent_path LIKE %(path)s
+                 GROUP BY q.product_id
+            """, {'path': path}
+
+        self.env['stock.move.line'].flush_model(
+            ['product_id', 'location_id', 'location_dest_id', 'quantity_product_uom', 'state', 'date'])
+        return """
+            SELECT ml.product_id,
+                   SUM(CASE WHEN dest.parent_path LIKE %(path)s THEN ml.quantity_product_uom ELSE 0 END)
+                 - SUM(CASE WHEN src.parent_path LIKE %(path)s THEN ml.quantity_product_uom ELSE 0 END) AS qty
+              FROM stock_move_line ml
+              JOIN stock_location src ON src.id = ml.location_id
+              JOIN stock_location dest ON dest.id = ml.location_dest_id
+             WHERE ml.state = 'done'
+               AND ml.date < %(date_end)s
+               AND (dest.parent_path LIKE %(path)s OR src.parent_path LIKE %(path)s)
+             GROUP BY ml.product_id
+        """, {'path': path, 'date_end': self._get_report_datetime_end()}
+
+    def _fetch_stock_rows(self):
+        """Quantités, coût et catégorie de tous les produits en stock, en une requête.
+
+        Returns:
+            list de tuples (categ_id, categ_name, categ_complete_name,
+            default_code, product_name, qty, pamp), triés par catégorie puis article
+        """
+        qty_query, params = self._get_stock_qty_query()
+        params.update({
+            'company_id': self.company_id.id,
+            'company_key': str(self.company_id.id),
+            'lang': self.env.lang or 'en_US',
+        })
+        categ_clause = ""
+        if self.category_ids:
+            categ_clause = "AND pt.categ_id IN %(categ_ids)s"
+            params['categ_ids'] = tuple(self.category_ids.ids)
+
+        self.env['product.product'].flush_model(['active', 'default_code', 'standard_price', 'product_tmpl_id'])
+        self.env['product.template'].flush_model(['name', 'categ_id', 'company_id'])
+        self.env['product.category'].flush_model(['name', 'complete_name'])
+        self.env.cr.execute(f"""
+            WITH stock AS ({qty_query})
+            SELECT pc.id, pc.name, pc.complete_name,
+                   pp.default_code,
+                   COALESCE(pt.name ->> %(lang)s, pt.name ->> 'en_US'),
+                   stock.qty::float,
+                   COALESCE((pp.standard_price ->> %(company_key)s)::float, 0)
+              FROM stock
+              JOIN product_product pp ON pp.id = stock.product_id
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+              JOIN product_category pc ON pc.id = pt.categ_id
+             WHERE stock.qty > 0
+               AND pp.active
+               AND (pt.company_id = %(company_id)s OR pt.company_id IS NULL)
+               {categ_clause}
+             ORDER BY pc.name, pc.id, pp.default_code, pp.id
+        """, params)
+        return self.env.cr.fetchall()
+
+    def _iter_stock_categories(self, rows, data):
+        """Produit les catégories une à une et cumule les totaux dans data."""
         total_qty = 0.0
         total_valorisation = 0.0
+        for categ_id, category_rows in groupby(rows, key=itemgetter(0)):
+            category = None
+            for __, categ_name, categ_complete_name, default_code, name, qty, pamp in category_rows:
+                if category is None:
+                    category = {
+                        'category': categ_name,
+                        'category_code': categ_complete_name or categ_name,
+                        'products': [],
+                        'total': 0.0,
+                    }
+                valorisation = float_round(qty * pamp, 2)
+                category['products'].append({
+                    'code_article': default_code or '',
+                    'default_code': default_code or '',
+                    'name': name,
+                    'category_code': categ_name,
+                    'qty': float_round(qty, 2),
+                    'pamp': float_round(pamp, 2),
+                    'valorisation': valorisation,
+                })
+                category['total'] += valorisation
+                data['total_articles'] += 1
+                total_qty += qty
+                total_valorisation += valorisation
+
+            data['total_qty'] = float_round(total_qty, 2)
+            data['total_valorisation'] = float_round(total_valorisation, 2)
+            data['pamp_moyen'] = float_round(total_valorisation / total_qty, 2) if total_qty else 0.0
+            yield category
+
+    def _get_stock_by_category(self):
+        """Retourne les données de valorisation à la date du rapport.
 
-        for product in self.product_ids:
-            categ = product.categ_id
-            categ_id = categ.id
-
-            # 🧠 Code article géré proprement
-            code_article = product.code_article or product.product_tmpl_id.code_article or ''
-
-            # Stock réel dans l'emplacement
-            qty = product.with_context(location=self.location_id.id).qty_available
-            if not qty or qty <= 0:
-                continue
-
-            pamp = product.standard_price or 0.0
-            valorisation = float_round(qty * pamp, 2)
-
-            if categ_id not in categories:
-                categories[categ_id] = {
-                    'category': categ.name,
-                    'category_code': categ.complete_name or categ.name,
-                    'products': [],
-                    'total': 0.0,
-                }
-
-            categories[categ_id]['products'].append({
-                'code_article': code_article,
-                'default_code': product.default_code or '',
-                'name': product.name,
-                'category_code': categ.name,
-                'qty': float_round(qty, 2),
-                'pamp': float_round(pamp, 2),
-                'valorisation': valorisation,
-            })
-
-            categories[categ_id]['total'] += valorisation
-            total_articles += 1
-            total_qty += qty
-            total_valorisation += valorisation
-
-        pamp_moyen = float_round(total_valorisation / total_qty, 2) if total_qty else 0.0
-
-        return {
-            'categories': sorted(categories.values(), key=lambda c: c['category']),
-            'total_articles': total_articles,
-            'total_qty': float_round(total_qty, 2),
-            'pamp_moyen': pamp_moyen,
-            'total_valorisation': float_round(total_valorisation, 2),
+        Les catégories sont produites au fil du rendu QWeb; les totaux
+        généraux sont complets une fois toutes les catégories parcourues.
+        """
+        self.ensure_one()
+        data = {
+            'total_articles': 0,
+            'total_qty': 0.0,
+            'pamp_moyen': 0.0,
+            'total_valorisation': 0.0,
         }
+        data['categories'] = self._iter_stock_categories(self._fetch_stock_rows(), data)
+        return data
 
     # -------------------------------------------------------------------------
     # ACTION DE RAPPORT
@@ -25,6 +25,7 @@
         'data/code_category_inventory_data.xml',
         'data/data_sequence.xml',
         'data/product_pricelist_data.xml',
+        'data/pack_sync_cron.xml',
         'views/product_template_views.xml',
         'views/teams_inventory_views.xml',
         'views/res_company_views.xml',
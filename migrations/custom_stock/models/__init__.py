@@ -16,6 +16,7 @@ from . import (
     physical_inventory,
     picking_inter_company,
     pos_order,
+    product_pack_sync_event,
     product_template,
     res_company,
     sale_order,
@@ -11,11 +11,9 @@ class PosOrder(models.Model):
         """Override pour gérer la synchronisation carton/unité après création des pickings"""
         res = super()._create_order_picking()
 
-        # Traiter la synchronisation carton après création du picking
-        for order in self:
-            for line in order.lines:
-                if line.qty > 0:  # Seulement pour les ventes (pas les retours)
-                    line._process_pack_synchronization()
+        # Journaliser les ventes pack/unité; le cron applique les décréments
+        lines = self.lines.filtered(lambda l: l.product_id and l.qty > 0)  # Seulement les ventes (pas les retours)
+        lines._create_pack_sync_events()
 
         return res
 
@@ -23,34 +21,46 @@ class PosOrder(models.Model):
 class PosOrderLine(models.Model):
     _inherit = 'pos.order.line'
 
-    def _process_pack_synchronization(self):
-        """Traite la synchronisation pack/unité pour cette ligne de commande"""
-        if not self.product_id or self.qty <= 0:
-            return
-
-        # Cas 1: Vente d'unités → décrémenter cartons quand complet
-        pack_template = self._get_pack_parent()
-        if pack_template:
-            self._update_pack_counter(pack_template)
-            return
-
-        # Cas 2: Vente de cartons → décrémenter unités correspondantes
-        carton_template = self._get_carton_template()
-        if carton_template:
-            self._decrement_units_for_carton_sale(carton_template)
-
-    def _get_pack_parent(self):
-        """Trouve le template pack parent pour ce produit (si c'est une unité)"""
-        pack_template = self.env['product.template'].search([
-            ('is_pack_parent', '=', True),
-            ('pack_child_product_id', '=', self.product_id.id)
-        ], limit=1)
-
-        if not pack_template or pack_template.pack_qty <= 0:
-            _logger.debug(f"[PACK SYNC] Aucun carton parent trouvé pour {self.product_id.name}")
-            return False
+    def _create_pack_sync_events(self):
+        """Ajoute un événement de synchronisation pack/unité par ligne concernée.
+
+        Aucun verrou n'est pris sur product.template ou stock.quant: les
+        événements sont consommés par product.pack.sync.event.cron_process_pack_sync_events.
+        """
+        if not self:
+            return self.env['product.pack.sync.event']
+
+        pack_map = self.env['product.template']._get_pack_parent_map(self.product_id.ids)
+        locations = {}
+        vals_list = []
+        for line in self:
+            # Cas 1: Vente d'unités → décrémenter cartons quand complet
+            pack_template = pack_map.get(line.product_id.id)
+            kind = 'units'
+            if not pack_template:
+                # Cas 2: Vente de cartons → décrémenter unités correspondantes
+                pack_template = line._get_carton_template()
+                kind = 'cartons'
+            if not pack_template:
+                continue
+
+            if line.company_id.id not in locations:
+                locations[line.company_id.id] = line._get_stock_location()
+            stock_location = locations[line.company_id.id]
+            if not stock_location:
+                continue
+
+            vals_list.append({
+                'pack_tmpl_id': pack_template.id,
+                'kind': kind,
+                'qty': line.qty,
+                'location_id': stock_location.id,
+                'company_id': line.company_id.id,
+                'pos_order_line_id': line.id,
+            })
 
-        return pack_template
+        _logger.debug(f"[PACK SYNC] {len(vals_list)} événement(s) de synchronisation créés")
+        return self.env['product.pack.sync.event'].sudo().create(vals_list)
 
     def _get_carton_template(self):
         """Vérifie si ce produit est un carton (template pack parent)"""
@@ -65,102 +75,6 @@ class PosOrderLine(models.Model):
         _logger.debug(f"[PACK SYNC] {self.product_id.name} n'est pas un carton")
         return False
 
-    def _update_pack_counter(self, pack_template):
-        """Met à jour le compteur d'unités et traite les cartons complets"""
-        _logger.info(
-            f"[PACK SYNC UNITÉS] Produit: {self.product_id.name}, Carton: {pack_template.name}, Qty: {self.qty}")
-
-        # Mettre à jour le compteur d'unités vendues
-        new_pending = pack_template.pending_units + self.qty
-        pack_template.write({'pending_units': new_pending})
-
-        # Calculer le nombre de cartons complets à décrémenter
-        full_cartons = int(new_pending // pack_template.pack_qty)
-
-        if full_cartons <= 0:
-            _logger.info(f"[PACK SYNC UNITÉS] Cumul insuffisant: {new_pending}/{pack_template.pack_qty}")
-            return
-
-        # Mettre à jour les unités restantes
-        remaining_units = new_pending - (full_cartons * pack_template.pack_qty)
-        pack_template.write({'pending_units': remaining_units})
-
-        # Décrémenter le stock du carton
-        self._decrement_pack_stock(pack_template, full_cartons)
-
-        _logger.info(
-            f"[PACK SYNC UNITÉS] RÉSULTAT: {self.qty} unités vendues → {full_cartons} cartons décrémentés, {remaining_units} unités restantes")
-
-    def _decrement_units_for_carton_sale(self, carton_template):
-        """Décrémente le stock des unités quand on vend des cartons"""
-        units_to_remove = self.qty * carton_template.pack_qty
-        child_product = carton_template.pack_child_product_id
-
-        _logger.info(
-            f"[PACK SYNC CARTONS] Vente de {self.qty} cartons → décrément de {units_to_remove} unités {child_product.name}")
-
-        # Obtenir l'emplacement stock
-        stock_location = self._get_stock_location()
-        if not stock_location:
-            return
-
-        try:
-            # Décrémenter le stock des unités
-            self.env['stock.quant']._update_available_quantity(
-                child_product,
-                stock_location,
-                -units_to_remove,  # Quantité négative = sortie
-                package_id=False,
-                lot_id=False,
-                owner_id=False
-            )
-
-            # Invalider le cache pour forcer le recalcul
-            child_product.invalidate_recordset(['qty_available'])
-
-            _logger.info(f"[PACK SYNC CARTONS] Stock unités mis à jour. Nouveau stock: {child_product.qty_available}")
-
-        except Exception as e:
-            _logger.error(f"[PACK SYNC CARTONS] Erreur lors de la mise à jour du stock des unités: {str(e)}")
-            # En cas d'erreur, essayer avec un mouvement de stock
-            self._create_stock_move_fallback(child_product, stock_location, units_to_remove)
-
-    def _decrement_pack_stock(self, pack_template, cartons_qty):
-        """Décrémente le stock du produit carton"""
-        carton_product = pack_template.product_variant_id
-        if not carton_product:
-            _logger.error(f"[PACK SYNC UNITÉS] Pas de variante pour {pack_template.name}")
-            return
-
-        # Obtenir l'emplacement stock
-        stock_location = self._get_stock_location()
-        if not stock_location:
-            return
-
-        _logger.info(f"[PACK SYNC UNITÉS] Décrément de {cartons_qty} cartons pour {carton_product.name}")
-
-        try:
-            # Méthode principale: utiliser _update_available_quantity
-            self.env['stock.quant']._update_available_quantity(
-                carton_product,
-                stock_location,
-                -cartons_qty,  # Quantité négative = sortie
-                package_id=False,
-                lot_id=False,
-                owner_id=False
-            )
-
-            # Invalider le cache pour forcer le recalcul
-            carton_product.invalidate_recordset(['qty_available'])
-
-            _logger.info(
-                f"[PACK SYNC UNITÉS] Stock cartons mis à jour avec succès. Nouveau stock: {carton_product.qty_available}")
-
-        except Exception as e:
-            _logger.error(f"[PACK SYNC UNITÉS] Erreur lors de la mise à jour du stock: {str(e)}")
-            # En cas d'erreur, essayer avec un mouvement de stock
-            self._create_stock_move_fallback(carton_product, stock_location, cartons_qty)
-
     def _get_stock_location(self):
         """Obtient l'emplacement de stock approprié"""
         # Essayer d'abord avec l'entrepôt de la société
@@ -178,33 +92,6 @@ class PosOrderLine(models.Model):
             _logger.error("[PACK SYNC] Aucun emplacement stock trouvé")
             return False
 
-    def _create_stock_move_fallback(self, product, stock_location, qty):
-        """Méthode de fallback utilisant un mouvement de stock"""
-        try:
-            customer_location = self.env.ref('stock.stock_location_customers')
-
-            move_vals = {
-                'name': f'Décrément pack POS - {self.order_id.name}',
-                'product_id': product.id,
-                'product_uom': product.uom_id.id,
-                'product_uom_qty': qty,
-                'location_id': stock_location.id,
-                'location_dest_id': customer_location.id,
-                'origin': f'POS/{self.order_id.name}',
-                'company_id': self.company_id.id,
-            }
-
-            move = self.env['stock.move'].create(move_vals)
-            move._action_confirm()
-            move._action_assign()
-            move.quantity_done = qty
-            move._action_done()
-
-            _logger.info(f"[PACK SYNC] Stock mis à jour via mouvement de stock (fallback) pour {product.name}")
-
-        except Exception as e:
-            _logger.error(f"[PACK SYNC] Échec du fallback: {str(e)}")
-
 
 class StockMove(models.Model):
     _inherit = 'stock.move'
@@ -0,0 +1,206 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Nombre maximal d'événements consommés par passage du cron
+PACK_SYNC_BATCH_SIZE = 5000
+# Durée de conservation par défaut des événements traités (jours)
+PACK_SYNC_RETENTION_DAYS = 30
+
+
+class ProductPackSyncEvent(models.Model):
+    """Journal des ventes POS à répercuter sur les stocks carton/unité.
+
+    Les caisses ne font qu'ajouter des lignes (aucune écriture sur
+    product.template ni stock.quant pendant la synchronisation des ventes) ;
+    cron_process_pack_sync_events agrège ensuite les événements par pack et
+    applique les décréments avec une seule mise à jour verrouillée.
+    """
+    _name = 'product.pack.sync.event'
+    _description = 'Événement de synchronisation carton/unité'
+    _order = 'id'
+
+    pack_tmpl_id = fields.Many2one(
+        'product.template',
+        string="Article pack (carton)",
+        required=True,
+        index=True,
+        ondelete='cascade',
+    )
+    kind = fields.Selection([
+        ('units', 'Vente d\'unités'),
+        ('cartons', 'Vente de cartons'),
+    ], string="Type", required=True)
+    qty = fields.Float(string="Quantité vendue", required=True)
+    location_id = fields.Many2one('stock.location', string="Emplacement", required=True)
+    company_id = fields.Many2one('res.company', string="Société")
+    pos_order_line_id = fields.Many2one('pos.order.line', string="Ligne POS", ondelete='set null')
+    processed = fields.Boolean(string="Traité", default=False, index=True)
+
+    @api.model
+    def cron_process_pack_sync_events(self, limit=PACK_SYNC_BATCH_SIZE):
+        """Consomme les événements en attente.
+
+        Les événements sont réservés avec FOR UPDATE SKIP LOCKED, de sorte que
+        deux passages concurrents ne traitent jamais les mêmes lignes.
+        """
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT id, pack_tmpl_id, kind, qty, location_id
+              FROM product_pack_sync_event
+             WHERE NOT processed
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [limit])
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return True
+
+        units_by_template = defaultdict(float)
+        cartons_by_template = defaultdict(float)
+        # Emplacement du dernier événement de chaque pack (compteur commun au template)
+        units_location = {}
+        cartons_by_location = defaultdict(float)
+        for __, tmpl_id, kind, qty, location_id in rows:
+            if kind == 'units':
+                units_by_template[tmpl_id] += qty
+                units_location[tmpl_id] = location_id
+            else:
+                cartons_by_template[tmpl_id] += qty
+                cartons_by_location[tmpl_id, location_id] += qty
+
+        full_cartons = self._apply_pending_units(units_by_template)
+
+        Product = self.env['product.product']
+        Location = self.env['stock.location']
+        Template = self.env['product.template']
+        for tmpl_id, cartons in full_cartons.items():
+            template = Template.browse(tmpl_id)
+            if cartons <= 0 or not template.product_variant_id:
+                continue
+            self._decrement_stock(template.product_variant_id, Location.browse(units_location[tmpl_id]), cartons)
+        for (tmpl_id, location_id), cartons in cartons_by_location.items():
+            template = Template.browse(tmpl_id)
+            if template.pack_qty <= 0 or not template.pack_child_product_id:
+                continue
+            self._decrement_stock(
+                template.pack_child_product_id,
+                Location.browse(location_id),
+                cartons * template.pack_qty,
+            )
+
+        self.env.cr.execute(
+            "UPDATE product_pack_sync_event SET processed = true WHERE id IN %s",
+            [tuple(row[0] for row in rows)],
+        )
+        self.invalidate_model(['processed'])
+        Product.invalidate_model(['qty_available'])
+        _logger.info(
+            "[PACK SYNC] %d événements traités: %d pack(s) unités, %d pack(s) cartons",
+            len(rows), len(units_by_template), len(cartons_by_template),
+        )
+        return True
+
+    @api.autovacuum
+    def _gc_processed_events(self):
+        """Supprime les événements traités plus anciens que la durée de
+        conservation (paramètre custom_stock.pack_sync_event_retention_days),
+        pour que le journal ne grossisse pas indéfiniment."""
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'custom_stock.pack_sync_event_retention_days', PACK_SYNC_RETENTION_DAYS,
+        ))
+        if retention_days <= 0:
+            return
+        self.flush_model(['processed'])
+        self.env.cr.execute("""
+            DELETE FROM product_pack_sync_event
+             WHERE processed
+               AND create_date < %s
+        """, [fields.Datetime.now() - timedelta(days=retention_days)])
+        _logger.info("[PACK SYNC] %d événements traités purgés", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def _apply_pending_units(self, units_by_template):
+        """Ajoute les unités vendues aux compteurs et retire les cartons complets.
+
+        Une seule requête verrouille les templates (par ordre d'id) et met à
+        jour pending_units ; chaque template n'est écrit qu'une fois par
+        passage.
+
+        Returns:
+            dict {template_id: nombre de cartons complets à décrémenter}
+        """
+        if not units_by_template:
+            return {}
+        Template = self.env['product.template']
+        Template.flush_model(['pending_units', 'pack_qty'])
+        values = ", ".join(["(%s::int, %s::float)"] * len(units_by_template))
+        self.env.cr.execute(f"""
+            WITH locked AS (
+                SELECT t.id, COALESCE(t.pending_units, 0) + v.units AS total, t.pack_qty
+                  FROM product_template t
+                  JOIN (VALUES {values}) AS v(id, units) ON v.id = t.id
+                 WHERE t.pack_qty > 0
+                 ORDER BY t.id
+                   FOR UPDATE OF t
+            )
+            UPDATE product_template t
+               SET pending_units = l.total - FLOOR(l.total / l.pack_qty) * l.pack_qty
+              FROM locked l
+             WHERE t.id = l.id
+         RETURNING t.id, FLOOR(l.total / l.pack_qty)::int
+        """, [value for item in units_by_template.items() for value in item])
+        full_cartons = dict(self.env.cr.fetchall())
+        Template.browse(units_by_template).invalidate_recordset(['pending_units'])
+        return full_cartons
+
+    @api.model
+    def _decrement_stock(self, product, location, qty):
+        """Décrémente le stock d'un produit (une fois par produit/emplacement)"""
+        _logger.info(f"[PACK SYNC] Décrément de {qty} {product.display_name} ({location.display_name})")
+        try:
+            with self.env.cr.savepoint():
+                self.env['stock.quant']._update_available_quantity(
+                    product,
+                    location,
+                    -qty,  # Quantité négative = sortie
+                    package_id=False,
+                    lot_id=False,
+                    owner_id=False
+                )
+        except Exception as e:
+            _logger.error(f"[PACK SYNC] Erreur lors de la mise à jour du stock: {str(e)}")
+            # En cas d'erreur, essayer avec un mouvement de stock
+            self._create_stock_move_fallback(product, location, qty)
+
+    @api.model
+    def _create_stock_move_fallback(self, product, stock_location, qty):
+        """Méthode de fallback utilisant un mouvement de stock"""
+        customer_location = self.env.ref('stock.stock_location_customers')
+        try:
+            with self.env.cr.savepoint():
+                move = self.env['stock.move'].create({
+                    'name': 'Décrément pack POS',
+                    'product_id': product.id,
+                    'product_uom': product.uom_id.id,
+                    'product_uom_qty': qty,
+                    'location_id': stock_location.id,
+                    'location_dest_id': customer_location.id,
+                    'origin': 'POS/PACK SYNC',
+                    'company_id': stock_location.company_id.id or self.env.company.id,
+                })
+                move._action_confirm()
+                move._action_assign()
+                move.quantity = qty
+                move._action_done()
+
+            _logger.info(f"[PACK SYNC] Stock mis à jour via mouvement de stock (fallback) pour {product.name}")
+
+        except Exception as e:
+            _logger.error(f"[PACK SYNC] Échec du fallback: {str(e)}")
@@ -1,12 +1,18 @@
 import logging
 import re
+from collections import defaultdict, namedtuple
 
 from odoo import _, api, fields, models, tools
 from odoo.exceptions import AccessError, UserError, ValidationError
-from odoo.tools import format_amount
+from odoo.tools import format_amount, frozendict
 
 _logger = logging.getLogger(__name__)
 
+# Champs de product.template dont dépend l'index unité → pack
+PACK_INDEX_FIELDS = {'is_pack_parent', 'pack_child_product_id', 'pack_qty', 'company_id', 'active'}
+
+PackIndexEntry = namedtuple('PackIndexEntry', 'template_id company_id pack_qty')
+
 
 class ProductTemplateInherit(models.Model):
     _inherit = 'product.template'
@@ -294,6 +300,59 @@ class ProductTemplateInherit(models.Model):
             'target': 'current',
         }
 
+    @api.model
+    @tools.ormcache()
+    def _get_pack_index(self):
+        """Index unité → pack, construit une fois par worker.
+
+        Invalidé (pour tous les workers) par create/write/unlink dès qu'un
+        champ de PACK_INDEX_FIELDS d'un pack parent (actuel ou nouveau) change.
+
+        Returns:
+            frozendict {product_id unité: (PackIndexEntry, ...)} trié par id de template
+        """
+        index = defaultdict(list)
+        for template in self.sudo().search([
+            ('is_pack_parent', '=', True),
+            ('pack_child_product_id', '!=', False),
+            ('pack_qty', '>', 0),
+        ], order='id'):
+            index[template.pack_child_product_id.id].append(PackIndexEntry(
+                template.id,
+                template.company_id.id,
+                template.pack_qty,
+            ))
+        return frozendict({product_id: tuple(entries) for product_id, entries in index.items()})
+
+    @api.model
+    def _get_pack_entry(self, product_id, company_id=None):
+        """Entrée d'index du pack parent d'un produit unité (ou None).
+
+        Si company_id est donné, seuls les packs partagés ou de cette
+        société sont retenus.
+        """
+        for entry in self._get_pack_index().get(product_id, ()):
+            if company_id is None or entry.company_id in (False, company_id):
+                return entry
+        return None
+
+    @api.model
+    def _get_pack_parent_map(self, product_ids, company_id=None):
+        """Associe chaque produit unité à son template pack (carton).
+
+        Returns:
+            dict {product_id: product.template}
+        """
+        pack_map = {}
+        for product_id in product_ids:
+            entry = self._get_pack_entry(product_id, company_id)
+            if entry:
+                pack_map[product_id] = self.browse(entry.template_id)
+        return pack_map
+
+    def _clear_pack_index(self):
+        self.env.registry.clear_cache()
+
     def reset_pending_units_for_sales(self):
         """Méthode utilitaire pour remettre à zéro les compteurs (maintenance)"""
         self.ensure_one()
@@ -362,7 +421,27 @@ class ProductTemplateInherit(models.Model):
                     "Contactez votre administrateur système pour obtenir les droits nécessaires."
                 )
 
-        return super(ProductTemplateInherit, self).create(vals_list)
+        templates = super(ProductTemplateInherit, self).create(vals_list)
+        if any(vals.get('is_pack_parent') for vals in vals_list):
+            templates._clear_pack_index()
+        return templates
+
+    def write(self, vals):
+        # Évalué avant l'écriture: un template qui cesse d'être pack doit aussi vider l'index
+        clear_index = bool(PACK_INDEX_FIELDS.intersection(vals)) and (
+            bool(vals.get('is_pack_parent')) or any(self.mapped('is_pack_parent'))
+        )
+        res = super().write(vals)
+        if clear_index:
+            self._clear_pack_index()
+        return res
+
+    def unlink(self):
+        clear_index = any(self.mapped('is_pack_parent'))
+        res = super().unlink()
+        if clear_index:
+            self._clear_pack_index()
+        return res
 
     @api.model
     def check_access_rights(self, operation, raise_exception=True):
@@ -43,19 +43,15 @@ class SaleOrderLine(models.Model):
     @api.depends("product_id")
     def _compute_pack_parent(self):
         """Trouve le template pack parent pour ce produit unité"""
+        Template = self.env["product.template"]
         for line in self:
             line.pack_parent_id = False
             if not line.product_id:
                 continue
 
-            # Chercher si ce produit est un sous-produit d'un pack
-            tmpl_pack = self.env["product.template"].search([
-                ("is_pack_parent", "=", True),
-                ("pack_child_product_id", "=", line.product_id.id),
-                ("company_id", "in", [False, line.company_id.id]),
-            ], limit=1)
-
-            line.pack_parent_id = tmpl_pack
+            # Chercher si ce produit est un sous-produit d'un pack (index en cache)
+            entry = Template._get_pack_entry(line.product_id.id, line.company_id.id)
+            line.pack_parent_id = entry.template_id if entry else False
 
     @api.depends("product_uom_qty", "pack_parent_id", "pack_parent_id.pack_qty")
     def _compute_pack_carton_equiv(self):
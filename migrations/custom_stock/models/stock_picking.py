@@ -67,12 +67,10 @@ class StockPicking(models.Model):
         return False
 
     def _get_unit_pack_template(self, product):
-        """Récupère le template pack parent pour un produit unité"""
-        return self.env['product.template'].search([
-            ("is_pack_parent", "=", True),
-            ("pack_child_product_id", "=", product.id),
-            ("company_id", "in", [False, self.company_id.id]),
-        ], limit=1)
+        """Récupère le template pack parent pour un produit unité (index en cache)"""
+        Template = self.env['product.template']
+        entry = Template._get_pack_entry(product.id, self.company_id.id)
+        return Template.browse(entry.template_id) if entry else Template
 
     def _create_inventory_adjustment_for_units(self, carton_move, pack_template):
         """